@@ -0,0 +1,98 @@
+import argparse
+import glob
+import matplotlib
+import multiprocessing
+import os
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import main
+
+from mot.Detector import load_model
+from utils.Config import Config
+from utils.Table import save_table
+
+SUMMARY_FIELDS = ['config', 'source', 'output', 'frames', 'elapsed', 'fps', 'detections', 'tracks', 'rows', 'tracker_error', 'error']
+
+# YOLO model of the worker process, loaded once by the initializer
+MODEL = None
+
+def init_worker(data_dir: str):
+    global MODEL
+
+    matplotlib.use('Agg')
+    MODEL = load_model(data_dir)
+
+def run(config_file: str, source: str) -> dict:
+    if source is not None and not os.path.isfile(source):
+        return {'config': config_file, 'source': source, 'error': 'source not found'}
+
+    # a failed video is reported in the summary instead of stopping the batch, exit() included
+    try:
+        summary = main.main(config_file, headless=True, source=source, model=MODEL)
+    except SystemExit:
+        summary = {'source': source, 'error': 'stopped on an error, see the output'}
+    except Exception as e:
+        traceback.print_exc()
+        summary = {'source': source, 'error': f'{type(e).__name__}: {e}'}
+
+    return {'config': config_file, **summary}
+
+def jobs(config_files: list, sources: list) -> list:
+    # every source with every configuration, or each configuration with its own source
+    if len(sources) == 0:
+        return [(config_file, None) for config_file in config_files]
+
+    return [(config_file, source) for config_file in config_files for source in sources]
+
+def expand(patterns: list) -> list:
+    sources = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        sources.extend(matches if len(matches) > 0 else [pattern])
+
+    return sources
+
+def batch(config_files: list, sources: list, workers: int, summary_file: str):
+    config = Config()
+    config.load(config_files[0])
+
+    todo = jobs(config_files, expand(sources))
+    print(f"Batch: {len(todo)} videos - {workers} workers")
+
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(config.get('data_dir'),)) as executor:
+        futures = [executor.submit(run, config_file, source) for config_file, source in todo]
+
+        for future in as_completed(futures):
+            summary = future.result()
+
+            if summary.get('error') is not None:
+                print(f"Failed {summary['source'] or summary['config']}: {summary['error']}")
+            else:
+                print(f"Done {summary['source']}: {summary['frames']} frames - {summary['fps']:.2f} frames/s - {summary['tracks']} tracks")
+
+        # same order as the jobs, whatever order they ended in
+        summaries = [future.result() for future in futures]
+
+    elapsed = time.perf_counter() - start
+    save_table(summary_file, summaries, SUMMARY_FIELDS)
+
+    done = [summary for summary in summaries if summary.get('error') is None]
+    frames = sum(summary['frames'] for summary in done)
+    print(f"Processed {len(done)}/{len(summaries)} videos - {frames} frames in {elapsed:.2f} s - {frames / elapsed:.2f} frames/s - summary {summary_file}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Processes several videos or configurations on a pool of processes')
+    parser.add_argument('--config', type=str, nargs='+', default=['config.ini'], help='Configuration files, every source is run with each of them')
+    parser.add_argument('--sources', type=str, nargs='*', default=[], help='Videos or glob patterns, the source of each configuration when empty')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--summary', type=str, default='batch_summary.csv', help='Summary file, .csv or .json')
+
+    args = parser.parse_args()
+
+    batch(args.config, args.sources, args.workers, args.summary)
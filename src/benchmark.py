@@ -0,0 +1,271 @@
+import argparse
+import cv2
+import matplotlib
+import numpy as np
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from migrate import migrate, parse_pair
+from mot.Detections import Detections
+from mot.Matching import GridMatchingFunction, IOUMatchingFunction
+from mot.Metrics import Metric
+from motpy.tracker import SingleObjectTracker
+from utils.Config import Config
+from utils.DB import DB
+from utils.Profiler import Profiler
+from utils.Video import Video, VideoPrefetcher
+
+def legacy_read(video: Video, downscale: float = 1., skip: int = 0):
+    # Video.read before seek/grab skipping: every skipped frame is decoded
+    frame_nro = -1
+    while frame_nro < skip:
+        frame_nro += 1
+        ret, frame = video.cap.read()
+        if not ret:
+            return None
+
+    if downscale != 1.:
+        frame = cv2.resize(frame, fx=downscale, fy=downscale, dsize=None, interpolation=cv2.INTER_AREA)
+
+    return frame
+
+def run(name: str, read_frame: callable, limit: int):
+    frames = 0
+    start = time.perf_counter()
+
+    while frames < limit and read_frame() is not None:
+        frames += 1
+
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {frames:>6} frames {elapsed:>8.2f} s {frames / elapsed:>10.2f} frames/s")
+
+def benchmark_video(source: str, downscale: float, skip: int, prefetch: int, limit: int):
+    video = Video(source)
+
+    video.open()
+    run(f'legacy (skip={skip})', lambda: legacy_read(video, downscale, skip), limit)
+    video.release()
+
+    video.open()
+    run(f'grab (skip={skip})', lambda: video.read(soft=True, downscale=downscale, skip=skip), limit)
+    video.release()
+
+    video.open()
+    prefetcher = VideoPrefetcher(video, prefetch, downscale, skip)
+    prefetcher.start()
+    run(f'prefetch (size={prefetch})', prefetcher.read, limit)
+    prefetcher.stop()
+    video.release()
+
+def crowd(size: int, width: int = 1920, height: int = 1080, seed: int = 0):
+    # person sized detections spread over the frame and trackers slightly off them
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform((0, 0), (width - 30, height - 60), (size, 2))
+    boxes = np.hstack([corners, corners + (30, 60)])
+    trackers = [SingleObjectTracker() for _ in range(size)]
+
+    for tracker, box in zip(trackers, boxes + rng.normal(0, 3, boxes.shape)):
+        tracker.box = lambda box=box: box
+
+    return trackers, Detections(boxes, np.ones(size), np.zeros(size, dtype=int))
+
+def benchmark_matching(sizes: list, min_iou: float, cell_size: int, repeat: int):
+    functions = {
+        'iou': IOUMatchingFunction(min_iou, 0.93),
+        'grid (hungarian)': GridMatchingFunction(min_iou, 0.93, cell_size, 'hungarian'),
+        'grid (greedy)': GridMatchingFunction(min_iou, 0.93, cell_size, 'greedy'),
+    }
+
+    for size in sizes:
+        trackers, detections = crowd(size)
+        reference = None
+
+        for name, matching_fn in functions.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                matches = matching_fn(trackers, detections)
+            elapsed = (time.perf_counter() - start) / repeat * 1000.
+
+            matches = set(map(tuple, np.asarray(matches).reshape(-1, 2).tolist()))
+            reference = matches if reference is None else reference
+            print(f"{name:<24} {size:>6} objects {elapsed:>10.2f} ms {len(matches):>6} matches {len(matches ^ reference):>6} differ")
+
+def legacy_tracks(path: str, tracks: int, steps: int, seed: int = 0):
+    # tracks as the original schema stored them: stringified tuples and tick count timestamps
+    rng = np.random.default_rng(seed)
+    db = sqlite3.connect(path)
+    c = db.cursor()
+    c.execute("CREATE TABLE tracks (tracker TEXT, position TEXT, direction TEXT, cell INTEGER, frame INTEGER, roi TEXT, score REAL, 'timestamp' INTEGER)")
+    c.execute("CREATE TABLE metrics (metric TEXT, value TEXT, frame INTEGER, 'timestamp' DATETIME DEFAULT CURRENT_TIMESTAMP)")
+
+    ticks = cv2.getTickCount()
+    for track in range(tracks):
+        tracker = f'{rng.integers(2**63):032x}'
+        start = int(rng.integers(steps))
+        x, y = rng.integers(0, 1920), rng.integers(0, 1080)
+        rows = []
+
+        for frame in range(start, min(steps, start + int(rng.integers(10, 300)))):
+            dx, dy = int(rng.integers(-5, 6)), int(rng.integers(-5, 6))
+            x, y = int(x + dx), int(y + dy)
+            rows.append((tracker, str((x, y)), str((dx, dy)) if frame > start else 'None', (y // 40) * 48 + x // 40, frame, None, float(rng.random()), ticks + frame * 1000000))
+
+        c.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    db.commit()
+    db.close()
+
+def timed(name: str, query: callable, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        query()
+    return (time.perf_counter() - start) / repeat * 1000.
+
+def benchmark_db(database: str, tracks: int, steps: int, repeat: int):
+    directory = tempfile.mkdtemp()
+    legacy = os.path.join(directory, 'legacy.db')
+    typed = os.path.join(directory, 'typed.db')
+
+    # a copy of a recorded legacy database or a synthetic one
+    if database is not None:
+        shutil.copy(database, legacy)
+    else:
+        legacy_tracks(legacy, tracks, steps)
+
+    shutil.copy(legacy, typed)
+    migrate(typed, cv2.getTickFrequency())
+
+    c = sqlite3.connect(legacy).cursor()
+    db = DB(typed)
+
+    # the legacy schema keys tracks by uuid, the typed one by tracker id
+    trackers = db.connection.execute("SELECT id, uuid FROM trackers LIMIT 100").fetchall()
+
+    def legacy_points():
+        for _, tracker in trackers:
+            c.execute("SELECT position, direction, cell, frame FROM tracks WHERE tracker=? ORDER BY frame", (tracker,))
+            [(parse_pair(position), parse_pair(direction), cell, frame) for position, direction, cell, frame in c.fetchall()]
+
+    def typed_points():
+        for tracker, _ in trackers:
+            db.load_tracking_points(tracker)
+
+    queries = [
+        ('cell scores', lambda: c.execute("SELECT cell, avg(score) as score FROM tracks WHERE score > 0 GROUP BY cell").fetchall(), db.load_cell_scores),
+        ('cell qty', lambda: c.execute("SELECT cell, count(1) as qty FROM tracks GROUP BY cell").fetchall(), db.load_cell_qty),
+        ('tracking duration', lambda: c.execute("SELECT tracker, MIN(timestamp), MAX(timestamp), (MAX(timestamp) - MIN(timestamp)) FROM tracks GROUP BY tracker").fetchall(), db.load_tracking_duration),
+        (f'points of {len(trackers)} tracks', legacy_points, typed_points),
+    ]
+
+    print(f"{'size':<24} {os.path.getsize(legacy) / 2**20:>10.2f} MB {os.path.getsize(typed) / 2**20:>10.2f} MB")
+    for name, legacy_query, typed_query in queries:
+        print(f"{name:<24} {timed(name, legacy_query, repeat):>10.2f} ms {timed(name, typed_query, repeat):>10.2f} ms")
+
+    shutil.rmtree(directory)
+
+def legacy_plot(metric: Metric, window_size: int = 30):
+    # Metric.plot before the Agg buffer: pyplot global state and a PNG round trip
+    from io import BytesIO
+    from matplotlib import pyplot as plt
+
+    buffer = BytesIO()
+    # the stored points only, the backing arrays have room for more
+    steps, values, _ = metric.series(window_size)[0]
+    steps, values = steps.tolist(), values.tolist()
+    plt.plot(steps, values, label = 'Original')
+
+    if len(values) >= window_size:
+        plt.plot(steps[window_size - 1:], metric.calculate_moving_average(values, window_size), label = 'Moving Average')
+
+    plt.xlabel('Frame')
+    plt.ylabel(metric._name)
+    plt.savefig(buffer, format='png')
+    plt.clf()
+    buffer.seek(0)
+    return cv2.imdecode(np.asarray(bytearray(buffer.read()), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def benchmark_plot(points: int, repeat: int):
+    metric = Metric('FPS')
+    for step, value in enumerate(np.random.default_rng(0).normal(30, 5, points)):
+        metric.store(value, step)
+
+    for name, plot in [('pyplot + png', lambda: legacy_plot(metric)), ('agg buffer', metric.plot), ('opencv', metric.render)]:
+        print(f"{name:<24} {points:>8} points {timed(name, plot, repeat):>10.2f} ms")
+
+def benchmark_profiler(calls: int):
+    profiler = Profiler()
+
+    def bare():
+        for _ in range(calls):
+            pass
+
+    def stages():
+        for _ in range(calls):
+            with profiler.stage('benchmark'):
+                pass
+
+    base = timed('bare', bare, 1)
+    for enabled in (False, True):
+        profiler.enable(enabled)
+        elapsed = timed('stages', stages, 1)
+        print(f"{'enabled' if enabled else 'disabled':<24} {calls:>8} stages {(elapsed - base) * 1e6 / calls:>10.1f} ns/stage")
+
+    profiler.summary()
+
+if __name__ == "__main__":
+    # Set up command-line argument parser
+    parser = argparse.ArgumentParser(description='UNAV - Master en Big Data Science - Trabajo Final de Master - Benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    # Decode-only throughput of the video readers
+    parser_video = subparsers.add_parser('video', help='Video decoding throughput')
+    parser_video.add_argument('--config', type=str, default='config.ini', help='Configuration File')
+    parser_video.add_argument('--skip', type=int, default=0, help='Frames skipped between reads')
+    parser_video.add_argument('--prefetch', type=int, default=8, help='Prefetch ring size')
+    parser_video.add_argument('--limit', type=int, default=1000, help='Max frames to read')
+
+    # Matching time as the crowd grows
+    parser_matching = subparsers.add_parser('matching', help='Tracker/detection matching scaling')
+    parser_matching.add_argument('--config', type=str, default='config.ini', help='Configuration File')
+    parser_matching.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200, 400, 800, 1600], help='Crowd sizes')
+    parser_matching.add_argument('--repeat', type=int, default=5, help='Calls per measure')
+
+    # Legacy against typed tracks schema
+    parser_db = subparsers.add_parser('db', help='Tracks database size and query time, legacy against typed schema')
+    parser_db.add_argument('--config', type=str, default='config.ini', help='Configuration File')
+    parser_db.add_argument('--database', type=str, default=None, help='Legacy tracking.db, synthetic tracks when missing')
+    parser_db.add_argument('--tracks', type=int, default=1000, help='Synthetic tracks')
+    parser_db.add_argument('--steps', type=int, default=5000, help='Synthetic video frames')
+    parser_db.add_argument('--repeat', type=int, default=3, help='Calls per measure')
+
+    # Metric chart rendering
+    parser_plot = subparsers.add_parser('plot', help='Metric chart rendering time')
+    parser_plot.add_argument('--config', type=str, default='config.ini', help='Configuration File')
+    parser_plot.add_argument('--points', type=int, default=10000, help='Metric values')
+    parser_plot.add_argument('--repeat', type=int, default=5, help='Calls per measure')
+
+    # Profiler overhead per timed stage
+    parser_profiler = subparsers.add_parser('profiler', help='Profiler overhead')
+    parser_profiler.add_argument('--config', type=str, default='config.ini', help='Configuration File')
+    parser_profiler.add_argument('--calls', type=int, default=1000000, help='Timed stages')
+
+    # Parse command-line arguments
+    args = parser.parse_args()
+
+    config = Config()
+    config.load(args.config)
+
+    if args.benchmark == 'video':
+        benchmark_video(config.get('source'), config.get('video_downscale', float), args.skip, args.prefetch, args.limit)
+    elif args.benchmark == 'matching':
+        benchmark_matching(args.sizes, config.get('min_iou', float), config.get('cell_size', int), args.repeat)
+    elif args.benchmark == 'db':
+        benchmark_db(args.database, args.tracks, args.steps, args.repeat)
+    elif args.benchmark == 'plot':
+        matplotlib.use('Agg')
+        benchmark_plot(args.points, args.repeat)
+    elif args.benchmark == 'profiler':
+        benchmark_profiler(args.calls)
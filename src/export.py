@@ -0,0 +1,35 @@
+import argparse
+import glob
+import os
+
+from utils.Columnar import NPY, PARQUET, export_run, load_run
+from utils.Config import Config
+
+if __name__ == "__main__":
+    # Set up command-line argument parser
+    parser = argparse.ArgumentParser(description='UNAV - Master en Big Data Science - Trabajo Final de Master - Columnar export')
+
+    # Add command-line arguments
+    parser.add_argument('--config', type=str, default='config.ini', help='Configuration File')
+    parser.add_argument('--database', type=str, default='', help='Database File, the latest run of the configured source when missing')
+    parser.add_argument('--output', type=str, default='', help='Output directory, next to the database when missing')
+    parser.add_argument('--format', type=str, choices=[PARQUET, NPY], default=None, help='parquet when pyarrow is available, npy otherwise')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='Rows read from the database at a time')
+    parser.add_argument('--compress', action='store_true', help='Also pack the npy columns of each table into a compressed npz')
+
+    # Parse command-line arguments
+    args = parser.parse_args()
+
+    if args.database == '':
+        config = Config()
+        config.load(args.config)
+        list_of_files = glob.glob(config.get('data_dir') + '/' + os.path.basename(config.get('source')) + '*/tracking.db')
+        args.database = max(list_of_files, key=os.path.getctime)
+
+    if args.output == '':
+        args.output = os.path.join(os.path.dirname(args.database), 'export')
+
+    export_run(args.database, args.output, args.format, args.chunk_size, args.compress)
+
+    for table, columns in load_run(args.output).items():
+        print(f"{table}: {len(next(iter(columns.values()), []))} rows - {', '.join(columns)}")
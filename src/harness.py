@@ -0,0 +1,201 @@
+import argparse
+import multiprocessing
+import numpy as np
+import os
+import time
+import tracemalloc
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+
+from mot.DetectionCache import DetectionCache
+from mot.Detections import Detections
+from mot.Matching import assign_greedy, candidate_pairs, pairs_iou
+from mot.MultiObjectTracker import PRESETS, MultiObjectTracker
+from utils.Config import Config
+from utils.Table import print_table, save_table
+
+FIELDS = ['preset', 'tracker', 'scenario', 'steps', 'elapsed', 'track_steps', 'track_steps_per_s', 'peak_kb',
+          'tracks', 'id_switches', 'recall', 'error_mean', 'error_max', 'error_mse', 'failed']
+
+# ground truth to track assignment for id switches and recall
+TRUTH_MIN_IOU = 0.5
+
+def synthetic(objects: int, steps: int, seed: int = 0, width: int = 1280, height: int = 720, noise: float = 2., miss: float = 0.1, fps: float = 25.):
+    """ Person sized boxes entering, walking with some acceleration, bouncing on the borders and leaving, detected with noise and misses """
+    rng = np.random.default_rng(seed)
+    size = np.array([30., 60.])
+
+    starts = rng.integers(0, max(1, steps // 2), objects)
+    ends = np.minimum(steps, starts + rng.integers(steps // 4 + 1, steps + 1, objects))
+    positions = rng.uniform((0, 0), (width - size[0], height - size[1]), (objects, 2))
+    velocities = rng.normal(0, 3, (objects, 2))
+
+    detections, truth = [], []
+    for step in range(steps):
+        velocities += rng.normal(0, 0.2, velocities.shape)
+        positions += velocities
+
+        # bounce on the borders
+        low, high = positions < 0, positions > (width - size[0], height - size[1])
+        velocities[low | high] *= -1
+        positions = np.clip(positions, 0, (width - size[0], height - size[1]))
+
+        alive = np.flatnonzero((starts <= step) & (step < ends))
+        boxes = np.hstack([positions[alive], positions[alive] + size])
+        truth.append((alive, boxes))
+
+        seen = rng.random(len(alive)) >= miss
+        noisy = boxes[seen] + rng.normal(0, noise, (seen.sum(), 4))
+        detections.append(Detections(noisy.astype(np.float32), np.full(seen.sum(), 0.9, dtype=np.float32), np.zeros(seen.sum(), dtype=int)))
+
+    return {'name': f'synthetic-{objects}x{steps}-{seed}', 'fps': fps, 'detections': detections, 'truth': truth}
+
+def recorded(path: str, fps: float = 25.):
+    """ Detections of a video from a detection cache entry, without ground truth """
+    cache = DetectionCache(path)
+    if not cache.load():
+        raise FileNotFoundError(f"no detection cache in {path}")
+
+    detections = [cache.detections(step) if cache.detected(step) else None for step in range(cache.frames)]
+    return {'name': f'recorded-{os.path.basename(path.rstrip(os.sep))}', 'fps': cache.fps or fps, 'detections': detections, 'truth': None}
+
+def make_scenario(spec: dict) -> dict:
+    if spec['type'] == 'recorded':
+        return recorded(spec['path'])
+
+    return synthetic(spec['objects'], spec['steps'], spec['seed'])
+
+def truth_matches(truth_boxes: np.ndarray, tracks: list, cell_size: float):
+    # (ground truth index, track id) pairs over TRUTH_MIN_IOU
+    if len(truth_boxes) == 0 or len(tracks) == 0:
+        return []
+
+    track_boxes = np.array([track.box for track in tracks], dtype=float).reshape(-1, 4)
+    rows, cols = candidate_pairs(truth_boxes, track_boxes, cell_size)
+    matches = assign_greedy(rows, cols, pairs_iou(truth_boxes[rows], track_boxes[cols]), TRUTH_MIN_IOU)
+
+    return [(row, tracks[col].id) for row, col in matches]
+
+def run(preset: str, scenario: dict, overrides: dict = None, should_stop: callable = None, check_every: int = 50) -> dict:
+    """ One pass of a preset over a scenario, detections every detection_rate steps as in main
+
+    should_stop(partial result) is checked every check_every steps, the pass ends early when it returns True """
+    config = Config()
+    overrides = overrides if overrides is not None else {}
+    detection_rate = overrides.get('detection_rate', config.get('detection_rate', int))
+    cell_size = config.get('cell_size', int)
+
+    tracker = MultiObjectTracker.make(preset, scenario['fps'], overrides)
+    track_steps = 0
+    track_ids = set()
+    last_ids = {}
+    switches = 0
+    matched = 0
+    expected = 0
+    errors = []
+    stopped = False
+
+    def result(steps: int, elapsed: float) -> dict:
+        errors_array = np.array(errors, dtype=float).reshape(-1, 4)
+        return {
+            'preset': preset,
+            'tracker': tracker._tracker.tracker_clss.__name__,
+            'scenario': scenario['name'],
+            'steps': steps,
+            'elapsed': elapsed,
+            'track_steps': track_steps,
+            'track_steps_per_s': track_steps / elapsed if elapsed > 0 else None,
+            'tracks': len(track_ids),
+            'id_switches': switches if scenario['truth'] is not None else None,
+            'recall': matched / expected if scenario['truth'] is not None and expected > 0 else None,
+            'matched': matched,
+            'expected': expected,
+            'error_mean': float(errors_array[:, 1].mean()) if len(errors_array) > 0 else None,
+            'error_max': float(errors_array[:, 2].max()) if len(errors_array) > 0 else None,
+            'error_mse': float(errors_array[:, 3].mean()) if len(errors_array) > 0 else None,
+            'stopped': stopped,
+        }
+
+    start = time.perf_counter()
+    for step, detections in enumerate(scenario['detections']):
+        due = step % detection_rate == 0 and detections is not None
+        active_tracks, _ = tracker.step(detections=detections if due else [])
+
+        track_steps += len(active_tracks)
+        track_ids.update(track.id for track in active_tracks)
+
+        error = tracker.error()
+        if error is not None:
+            errors.append(error)
+
+        # id switches: a ground truth object followed by another track than the last one following it
+        if scenario['truth'] is not None:
+            ids, boxes = scenario['truth'][step]
+            expected += len(ids)
+
+            for row, track_id in truth_matches(boxes, active_tracks, cell_size):
+                matched += 1
+                if last_ids.get(ids[row], track_id) != track_id:
+                    switches += 1
+                last_ids[ids[row]] = track_id
+
+        if should_stop is not None and (step + 1) % check_every == 0 and step + 1 < len(scenario['detections']):
+            if should_stop(result(step + 1, time.perf_counter() - start)):
+                stopped = True
+                return result(step + 1, time.perf_counter() - start)
+
+    return result(len(scenario['detections']), time.perf_counter() - start)
+
+def peak_memory(preset: str, scenario: dict) -> int:
+    # traced on a pass of its own, tracing slows the timed pass down several times
+    tracemalloc.start()
+    try:
+        run(preset, scenario)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def init_worker(config_file: str):
+    config = Config()
+    config.load(config_file)
+
+def job(preset: str, spec: dict, memory: bool) -> dict:
+    try:
+        scenario = make_scenario(spec)
+        result = run(preset, scenario)
+        if memory:
+            result['peak_kb'] = peak_memory(preset, scenario) // 1024
+        return result
+    except Exception as e:
+        traceback.print_exc()
+        return {'preset': preset, 'scenario': spec.get('path', spec['type']), 'failed': f'{type(e).__name__}: {e}'}
+
+def harness(config_file: str, presets: list, objects: list, steps: int, seeds: int, caches: list, workers: int, memory: bool, output: str):
+    specs = [{'type': 'synthetic', 'objects': count, 'steps': steps, 'seed': seed} for count in objects for seed in range(seeds)]
+    specs += [{'type': 'recorded', 'path': path} for path in caches]
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(config_file,)) as executor:
+        futures = [executor.submit(job, preset, spec, memory) for spec in specs for preset in presets]
+        results = [future.result() for future in futures]
+
+    print_table(results, FIELDS)
+    if output is not None:
+        save_table(output, results, FIELDS)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Runs the tracker presets over synthetic scenarios and cached detections on a pool of processes')
+    parser.add_argument('--config', type=str, default='config.ini', help='Configuration File (detection_rate, min_iou, matching...)')
+    parser.add_argument('--presets', type=str, nargs='+', default=PRESETS, help='MultiObjectTracker.make types')
+    parser.add_argument('--objects', type=int, nargs='*', default=[10, 50], help='Objects per synthetic scenario')
+    parser.add_argument('--steps', type=int, default=300, help='Steps per synthetic scenario')
+    parser.add_argument('--seeds', type=int, default=1, help='Synthetic scenarios per object count')
+    parser.add_argument('--caches', type=str, nargs='*', default=[], help='Detection cache entries (directories) to replay')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced pass measuring peak memory')
+    parser.add_argument('--output', type=str, default='harness.csv', help='Results file, .csv or .json')
+
+    args = parser.parse_args()
+
+    harness(args.config, [preset.upper() for preset in args.presets], args.objects, args.steps, args.seeds, args.caches, args.workers, not args.no_memory, args.output)
@@ -1,61 +1,125 @@
 import argparse
+import matplotlib
 import shutil
 import cv2
-import queue
 import os
+import time
 
 from datetime import datetime
 
-from mot.Detector import YOLODetector
+import pipeline
+
+from mot.DetectionCache import DetectionCache
+from mot.Detector import DetectionBatcher, MotionGate, YOLODetector, model_path
+from mot.Detections import detections_boxes
 from mot.Roi import Roi
-from mot.MultiObjectTracker import MultiObjectTracker, track_from_motpy, previous_to_dict
-from mot.Metrics import MetricDetections, MetricFPS, MetricTrackerErrors, MetricTrackers, MetricTrackersDelta, frame_cell_scores, frame_cell_traffic, stats_tracking_duration
+from mot.Scheduler import DetectionScheduler
+from mot.TrackRecorder import TrackRecorder
+from mot.MultiObjectTracker import MultiObjectTracker
+from mot.Metrics import MetricDetections, MetricDetectionArea, MetricDetectionInterval, MetricFPS, MetricTrackerErrors, MetricTrackers, MetricTrackersDelta, MetricQueueDepth, MetricLatency, stats_tracking_duration
 
 from utils.Config import Config
-from utils.DB import DB
+from utils.DBWriter import DBWriter
 from utils.EventListener import EventListener
+from utils.EventQueue import EventQueue
+from utils.FrameSink import FrameSink
 from utils.Grid import Grid
-from utils.Screen import Screen
-from utils.Video import Video, VideoProcessor
-
-def main(config_file):
-    # Screen Layout
-    SCREEN_PRIMARY = Screen('Video', width=0.75)
-    SCREEN_STATS_1 = Screen('Stats 1', width=0.25, offset_x=0.75, height=0.27, resize=True, show=False)
-    SCREEN_STATS_2 = Screen('Stats 2', width=0.25, offset_x=0.75, height=0.27, resize=True, offset_y=0.001, show=False)
-    SCREEN_STATS_3 = Screen('Stats 3', width=0.25, offset_x=0.75, height=0.27, resize=True, offset_y=0.3, show=False)
-
-    # Metrics
-    METRIC_FPS = MetricFPS('FPS')
-    METRIC_DETECTIONS = MetricDetections('Detections')
-    METRIC_TRACKERS = MetricTrackers('Active Trackers')
-    METRIC_ERRORS = MetricTrackerErrors('Tracker Errors')
-    METRIC_TRACKERSDELTA = MetricTrackersDelta('Trackers Delta')
-
-    # Events
-    screen_events = queue.Queue()
-    tracker_events = queue.Queue()
-    track_events = queue.Queue()
+from utils.Motion import Motion
+from utils.Profiler import Profiler
+from utils.Video import Video, VideoPrefetcher, VideoProcessor
+
+def main(config_file, headless: bool = False, processes: bool = False, source: str = None, model = None) -> dict:
+    if headless:
+        # No windows: keep tkinter out of the process and render plots off-screen
+        matplotlib.use('Agg')
+    else:
+        from utils.Screen import Screen
+
+        # Screen Layout
+        SCREEN_PRIMARY = Screen('Video', width=0.75)
+        SCREEN_STATS_1 = Screen('Stats 1', width=0.25, offset_x=0.75, height=0.27, resize=True, show=False)
+        SCREEN_STATS_2 = Screen('Stats 2', width=0.25, offset_x=0.75, height=0.27, resize=True, offset_y=0.001, show=False)
+        SCREEN_STATS_3 = Screen('Stats 3', width=0.25, offset_x=0.75, height=0.27, resize=True, offset_y=0.3, show=False)
 
     # Load configurations
     config = Config()
     config.load(config_file)
 
-    # Output Directoy
+    # Batch runs process several sources with a same configuration file
+    if source is not None:
+        config.set('source', source)
+
+    # Output Directoy, a suffix keeps apart the runs of a source started on the same second
     DIRECTORY_NAME = os.path.basename(config.get('source')) + '_' + datetime.now().strftime("%Y%m%d_%H%M%S")
     DIRECTORY_BASE = os.path.join(os.path.dirname(config.get('source')), DIRECTORY_NAME)
-    os.makedirs(DIRECTORY_BASE, exist_ok=True)
+    suffix = 0
+    while True:
+        try:
+            os.makedirs(DIRECTORY_BASE + (f'_{suffix}' if suffix > 0 else ''))
+            break
+        except FileExistsError:
+            suffix += 1
+    DIRECTORY_BASE += f'_{suffix}' if suffix > 0 else ''
 
     # Files
     FILE_DATABASE = DIRECTORY_BASE + '/tracking.db'
-    FILE_FRAMES = DIRECTORY_BASE + '/frames'
-
-    # Directories
-    os.makedirs(FILE_FRAMES, exist_ok=True)
 
     # Backup files
     shutil.copy(config_file, DIRECTORY_BASE)
-    shutil.copy(config.get('source'), DIRECTORY_BASE)    
+    if config.get('copy_source', bool, section='output', default=True):
+        shutil.copy(config.get('source'), DIRECTORY_BASE)
+
+    # Decoder, detector and tracker on their own processes
+    if processes:
+        if not headless:
+            print("Error: processes pipeline runs in headless mode only.")
+            exit()
+
+        return pipeline.run(config_file, DIRECTORY_BASE, FILE_DATABASE)
+
+    # Database writer
+    def on_db_flush(depth, latency, step):
+        METRIC_DB_QUEUE.store(depth, step)
+        METRIC_DB_FLUSH.store(latency, step)
+
+    db_writer = DBWriter(FILE_DATABASE, config.get('batch_size', int, section='db', default=500), config.get('flush_interval', float, section='db', default=1.), on_db_flush)
+
+    # Metrics, bounded in memory and written to the database in blocks as they grow
+    metrics_maxlen = config.get('metrics_maxlen', int, default=10000)
+    METRIC_FPS = MetricFPS('FPS', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_DETECTIONS = MetricDetections('Detections', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_TRACKERS = MetricTrackers('Active Trackers', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_ERRORS = MetricTrackerErrors('Tracker Errors', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_TRACKERSDELTA = MetricTrackersDelta('Trackers Delta', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_DB_QUEUE = MetricQueueDepth('DB Queue', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_DB_FLUSH = MetricLatency('DB Flush', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_BATCH = MetricLatency('Detection Batch', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_BATCH_FRAME = MetricLatency('Detection Frame', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_SCREEN_QUEUE = MetricQueueDepth('Screen Queue', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_TRACKER_QUEUE = MetricQueueDepth('Tracker Queue', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_TRACK_QUEUE = MetricQueueDepth('Track Queue', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_EVENTS_DROPPED = MetricQueueDepth('Events Dropped', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_INTERVAL = MetricDetectionInterval('Detection Interval', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_AREA = MetricDetectionArea('Detection Area', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRICS = [METRIC_FPS, METRIC_DETECTIONS, METRIC_TRACKERS, METRIC_ERRORS, METRIC_TRACKERSDELTA, METRIC_DB_QUEUE, METRIC_DB_FLUSH, METRIC_BATCH, METRIC_BATCH_FRAME,
+               METRIC_SCREEN_QUEUE, METRIC_TRACKER_QUEUE, METRIC_TRACK_QUEUE, METRIC_EVENTS_DROPPED, METRIC_INTERVAL, METRIC_AREA]
+
+    # Events, bounded queues: block the producer, drop the oldest event or coalesce the events of a same key
+    # (a track for track events, the latest step for the others)
+    def merge_track_events(old, new):
+        # the coalesced event goes from the oldest previous state to the newest one
+        return {**new, 'previous': old['previous'], 'previous_cell': old['previous_cell']}
+
+    screen_events = EventQueue(config.get('screen_queue', int, section='events', default=8),
+                               config.get('screen_policy', section='events', default='drop_oldest'),
+                               key=lambda event: 'frame')
+    tracker_events = EventQueue(config.get('tracker_queue', int, section='events', default=256),
+                                config.get('tracker_policy', section='events', default='block'),
+                                key=lambda event: 'tracks')
+    track_events = EventQueue(config.get('track_queue', int, section='events', default=4096),
+                              config.get('track_policy', section='events', default='block'),
+                              key=lambda event: event['track'].id, merge=merge_track_events)
+    EVENT_QUEUES = [screen_events, tracker_events, track_events]
 
     # Tracking options
     detection_rate: int = config.get('detection_rate', int)
@@ -63,12 +127,34 @@ def main(config_file):
     show_detections: bool = config.get('show_detections', bool)
     show_trackers: bool = config.get('show_trackers', bool)
     use_roi: bool = config.get('use_roi', bool)
+    stats_refresh: int = config.get('stats_refresh', int, default=30)
+
+    # Detection interval, the fixed detection_rate or adapted after each detection
+    scheduler = DetectionScheduler.make(detection_rate)
+
+    # Detection only where the frame moves
+    gate: bool = config.get('enabled', bool, section='gate', default=False)
+
+    # Per stage latency
+    PROFILER = Profiler()
+    PROFILER.reset()
+    PROFILER.enable(config.get('profile', bool, default=False))
 
     # Load video
     video = Video(config.get('source'))
     video.open()
     frame = video.read(downscale=video_downscale)
 
+    # Annotated frames output
+    frame_sink = FrameSink.make(config.get('frames', section='output', default='images'), DIRECTORY_BASE, video.fps,
+                                every=config.get('frames_every', int, section='output', default=1),
+                                workers=config.get('frames_workers', int, section='output', default=1),
+                                maxsize=config.get('frames_queue', int, section='output', default=64),
+                                policy=config.get('frames_policy', section='output', default='drop'))
+    annotate = not headless or frame_sink.enabled
+
+    compact: bool = config.get('compact', bool, section='yolo', default=False)
+
     # Divide frame
     grid = Grid(config.get('cell_size', int))
     grid.divide(frame)
@@ -77,170 +163,308 @@ def main(config_file):
     # Roi selection
     if use_roi:
         roi = Roi(grid)
-        roi.define(frame)
-        #frame = roi.plot(frame)
+        roi.load(config.get('roi', default=''), config.get('roi_cells', default=''))
 
-    # Start tracking
-    detector = YOLODetector()
-    tracker = MultiObjectTracker.make(config.get('tracker'), video.fps)
+        if len(roi.selected_cells) == 0:
+            if headless:
+                print("Error: headless mode requires 'roi' or 'roi_cells' in the configuration.")
+                exit()
 
-    def on_track_event(event):
-        db = DB(FILE_DATABASE)
-        step = event['step']
-        track = track_from_motpy(event['track']) if event['track'] is not None else None
-        previous = track_from_motpy(event['previous']) if event['previous'] is not None else None
-        diff = track.diff(previous) if track is not None and previous is not None else None
-        timestamp = cv2.getTickCount()
+            roi.define(frame)
+        #frame = roi.plot(frame)
 
-        if track is None:
-            return
+    # Detection cache, replayed instead of running the detector when it holds every frame due for detection
+    cache = None
+    replay = False
+    if config.get('directory', section='cache', default='') != '':
+        # gated detections depend on every setting deciding where and when the gate detects
+        gate_key = None
+        if gate:
+            gate_key = {option: config.get(option, section='gate', default='') for option in ['threshold', 'margin', 'max_area', 'refresh']}
+            gate_key['scheduler'] = {option: config.get(option, section='scheduler', default='') for option in ['adaptive', 'min_interval', 'max_interval', 'latency_budget', 'error_threshold', 'motion_threshold']}
+            gate_key.update({
+                'motion_scale': config.get('motion_scale', float, default=0.25),
+                'cell_size': grid.cell_size,
+                'detection_rate': detection_rate,
+                'roi_cells': sorted(cell[3] for cell in roi.selected_cells) if use_roi else None,
+                'roi_bounds': roi.bounds if use_roi else None,
+            })
+
+        cache = DetectionCache.make(config.get('directory', section='cache'), config.get('source'), model_path(config.get('data_dir')),
+                               config.get('confidence_threshold', float, section='yolo'), video_downscale, gate_key)
+        # the adaptive scheduler may ask for any frame
+        replay = cache.load() and cache.covers(1 if scheduler.adaptive else detection_rate)
+        print(f"Detection cache: {'replay' if replay else 'miss'} - {cache.path}")
+
+    # Motion energy per cell, a signal of the adaptive scheduler and of the detection gate
+    motion = Motion(grid, config.get('motion_scale', float, default=0.25)) if scheduler.adaptive or (gate and not replay) else None
+
+    # Start tracking, the writer threads once the source and the roi are checked
+    db_writer.start()
+    frame_sink.start()
+    detector = YOLODetector(model) if not replay else None
+    if gate and not replay:
+        detector = MotionGate.make(detector, motion, roi.mask if use_roi else None, roi.bounds if use_roi else None)
+    tracker = MultiObjectTracker.make(config.get('tracker'), video.fps)
 
-        if not use_roi:
-            cell = grid.in_cell(track.center)
 
-            if cell is None:
-                return
+    # Tracks saved as they enter or move across cells, cell heatmaps accumulated on the way
+    recorder = TrackRecorder(grid, db_writer.save_track, roi if use_roi else None)
 
-            _, _, _, id, _ = cell
-            db.save_track(track._id, track.center, diff, id, step, None, track._score, timestamp)
-            return
-        
-        current_cell = roi.in_cell(track.center)
-        last_cell = roi.in_cell(previous.center) if previous is not None else None
-        
-        if current_cell is not None and last_cell is None:
-            roi._count += 1
-            _, _, _, id, _ = current_cell
-            db.save_track(track._id, track.center, diff, id, step, roi._id, track._score, timestamp)
-        elif current_cell is not None and last_cell is not None and current_cell != last_cell:
-            _, _, _, id, _ = current_cell
-            db.save_track(track._id, track.center, diff, id, step, roi._id, track._score, timestamp)
-        elif current_cell is None and last_cell is not None:
-            roi._count -= 1
-
-    track_events_processor = EventListener(on_track_event, track_events)
+    track_events_processor = EventListener(recorder.on_track_event, track_events,
+                                           config.get('track_workers', int, section='events', default=1),
+                                           config.get('batch_size', int, section='events', default=64))
     track_events_processor.start()
 
+    @PROFILER.timed('tracker event')
     def on_tracker_event(event):
         step = event['step']
         active_tracks = event['tracks']
-        previous_tracks = previous_to_dict(event['previous'])
 
-        for track in active_tracks:
-            track_events.put({ 'step': step, 'track': track, 'previous': previous_tracks.get(track.id, None) })
+        for track_event in recorder.events(step, active_tracks, event['previous']):
+            track_events.put(track_event)
 
         METRIC_TRACKERS.store(len(active_tracks), step)
 
-    tracker_events_processor = EventListener(on_tracker_event, tracker_events)
+    tracker_events_processor = EventListener(on_tracker_event, tracker_events,
+                                             config.get('tracker_workers', int, section='events', default=1),
+                                             config.get('batch_size', int, section='events', default=64))
     tracker_events_processor.start()
 
     # Tracking
+    throughput = {'frames': 0, 'detections': 0}
+
     def on_frame(frame, step: int):
+        # End of video
+        if frame is None:
+            screen_events.put(None)
+            return
+
         # On Start
         METRIC_FPS.start()
 
+        if motion is not None:
+            with PROFILER.stage('motion'):
+                motion.update(frame)
+
         # Detect objects
         detections = []
-        if step % detection_rate == 0:
-            detections = detector.detect(frame)
+        detected = scheduler.due(step)
+        if detected:
+            if replay:
+                detections = cache.detections(step, compact)
+            else:
+                detections = batcher.detections(step) if batcher is not None else detector.detect(frame)
+                if isinstance(detector, MotionGate):
+                    METRIC_AREA.store(detector.area, step)
+                if cache is not None:
+                    cache.store(step, detections)
             METRIC_DETECTIONS.store(len(detections), step)
+            throughput['detections'] += len(detections)
 
         # Track detected objects
-        active_tracks, delta_trackers = tracker.step(detections=detections)
-        tracker_events.put({ 'step': step, 'tracks': active_tracks, 'previous': tracker._previous_tracks })
+        with PROFILER.stage('track step'):
+            active_tracks, delta_trackers = tracker.step(detections=detections)
+
+        with PROFILER.stage('handoff'):
+            tracker_events.put({ 'step': step, 'tracks': active_tracks, 'previous': tracker._previous_tracks })
 
         METRIC_TRACKERSDELTA.store(delta_trackers, step)
 
-        error = tracker.error()
+        with PROFILER.stage('error'):
+            error = tracker.error()
         if error is not None:
             METRIC_ERRORS.store(error[3], step)
 
-        # Show roi
-        if use_roi:
-            frame = roi.plot(frame)
+        # Next detection, each decision is logged as the interval it sets
+        if detected:
+            scheduler.decide(step, error, len(active_tracks))
+            if scheduler.adaptive:
+                METRIC_INTERVAL.store(scheduler.interval, step)
+
+        if annotate:
+            with PROFILER.stage('draw'):
+                # Show roi
+                if use_roi:
+                    frame = roi.plot(frame)
 
-        # Show detections
-        if show_detections:
-            for det in detections:
-                cv2.rectangle(frame, (int(det.box[0]), int(det.box[1])), (int(det.box[2]), int(det.box[3])), (255, 0, 0), 1)
+                # Show detections
+                if show_detections:
+                    for box in detections_boxes(detections):
+                        cv2.rectangle(frame, (int(box[0]), int(box[1])), (int(box[2]), int(box[3])), (255, 0, 0), 1)
 
-        # Show trackers
-        if show_trackers:
-            for track in active_tracks:
-                cv2.circle(frame, (int((track.box[0] + track.box[2])/2), int((track.box[1] + track.box[3])/2)), 2, (0,255,0), thickness=-1)
+                # Show trackers
+                if show_trackers:
+                    for track in active_tracks:
+                        cv2.circle(frame, (int((track.box[0] + track.box[2])/2), int((track.box[1] + track.box[3])/2)), 2, (0,255,0), thickness=-1)
 
         # On End
-        METRIC_FPS.stop(step)
+        fps = METRIC_FPS.stop(step)
+        scheduler.observe(1000 / fps, delta_trackers, motion.untracked([track.box for track in active_tracks]) if motion is not None else 0.)
+        throughput['frames'] += 1
 
-        screen_events.put({'frame':frame,'step':step})
+        METRIC_SCREEN_QUEUE.store(screen_events.depth, step)
+        METRIC_TRACKER_QUEUE.store(tracker_events.depth, step)
+        METRIC_TRACK_QUEUE.store(track_events.depth, step)
+        METRIC_EVENTS_DROPPED.store(sum(events.dropped + events.coalesced for events in EVENT_QUEUES), step)
+
+        with PROFILER.stage('handoff'):
+            frame_sink.write(frame, step)
+            screen_events.put({'frame':frame,'step':step})
 
     def read_frame():
         return video.read(downscale=video_downscale, soft=True)
 
+    # Nothing to detect, draw nor measure motion on a replay: frames are not decoded, the first one stands for all of them
+    decode = not replay or annotate or motion is not None
+    if not decode:
+        replayed = {'frames': 0}
+
+        def read_frame():
+            if replayed['frames'] >= cache.frames:
+                return None
+
+            replayed['frames'] += 1
+            return frame
+
+    # Decode the next frames while the current one is processed
+    prefetcher = None
+    if decode and config.get('prefetch', int, default=0) > 0:
+        prefetcher = VideoPrefetcher(video, config.get('prefetch', int), video_downscale)
+        prefetcher.start()
+        read_frame = prefetcher.read
+
+    # Detect the frames due for detection in batches, at the fixed detection rate and on whole frames only
+    def on_batch(size, latency, step):
+        METRIC_BATCH.store(latency, step)
+        METRIC_BATCH_FRAME.store(latency / size, step)
+
+    batcher = None
+    if not replay and not scheduler.adaptive and not gate and config.get('batch_size', int, section='yolo', default=1) > 1:
+        batcher = DetectionBatcher(detector, read_frame, detection_rate, config.get('batch_size', int, section='yolo'), on_batch)
+        read_frame = batcher.read
+
     video_processor = VideoProcessor(read_frame, on_frame)
+    start = time.perf_counter()
     video_processor.start()
 
     # Process screen events on main thread
+    ended = False
     while True:
         tmp = screen_events.get()
 
         if tmp is None:
+            ended = True
             break
 
         frame = tmp['frame']
         step = tmp['step']
 
         if frame is None:
+            ended = True
             break
 
-        key = SCREEN_PRIMARY.show(frame, filename=FILE_FRAMES + f'/{step}.jpg')
+        if headless:
+            continue
+
+        with PROFILER.stage('display'):
+            key = SCREEN_PRIMARY.show(frame)
         if key == ord('q'):
             break
 
+        # Refresh the stats screens while processing
+        if stats_refresh > 0 and step % stats_refresh == 0:
+            SCREEN_STATS_1.show(METRIC_FPS.render(SCREEN_STATS_1.width, SCREEN_STATS_1.height), wait=False)
+            SCREEN_STATS_2.show(METRIC_ERRORS.render(SCREEN_STATS_2.width, SCREEN_STATS_2.height), wait=False)
+            SCREEN_STATS_3.show(METRIC_TRACKERS.render(SCREEN_STATS_3.width, SCREEN_STATS_3.height), wait=False)
+
+    elapsed = time.perf_counter() - start
+
+    # on q the frame in flight is finished before the writers stop, its screen events are drained meanwhile (a blocking queue would hold it)
     video_processor.stop()
+    deadline = time.monotonic() + 10.
+    while not video_processor.join(0.05):
+        if time.monotonic() > deadline:
+            print("Warning: the frame processor did not stop, its last events may be lost.")
+            break
+
+        while screen_events.depth > 0:
+            screen_events.get()
+
+    if prefetcher is not None:
+        prefetcher.stop()
+    frame_sink.stop()
     tracker_events_processor.stop()
     track_events_processor.stop()
-
-    # Save metrics
-    db = DB(FILE_DATABASE)
-    METRIC_FPS.each(db.save_metrics)
-    METRIC_DETECTIONS.each(db.save_metrics)
-    METRIC_TRACKERS.each(db.save_metrics)
-    METRIC_ERRORS.each(db.save_metrics)
-    METRIC_TRACKERSDELTA.each(db.save_metrics)
+    db_writer.stop()
+
+    print(f"Processed {throughput['frames']} frames in {elapsed:.2f} s - {throughput['frames'] / elapsed:.2f} frames/s - {throughput['detections'] / elapsed:.2f} detections/s")
+    print(f"Frames: {frame_sink.written} written - {frame_sink.dropped} dropped")
+    print(f"DB: {db_writer.rows} rows - {db_writer.flushes} flushes - {db_writer.flush_latency:.2f} ms/flush")
+    if scheduler.adaptive:
+        print(f"Scheduler: {' - '.join(f'{decision} {count}' for decision, count in scheduler.decisions.items())} decisions - interval {METRIC_INTERVAL.mean:.2f} mean")
+    if isinstance(detector, MotionGate):
+        print(f"Gate: {detector.counts['skipped']} skipped - {detector.counts['cropped']} cropped - {detector.counts['full']} whole frame - {METRIC_AREA.mean or 0:.2f} mean area")
+    print(f"Events: screen {screen_events.dropped + screen_events.coalesced} - tracker {tracker_events.dropped + tracker_events.coalesced} - track {track_events.dropped + track_events.coalesced} dropped or coalesced")
+    for metric in METRICS:
+        if metric.size > 0:
+            print(f"{metric.name}: min {metric.min:.2f} - mean {metric.mean:.2f} - p95 {metric.p95:.2f} - max {metric.max:.2f}")
+    if PROFILER.enabled:
+        PROFILER.summary()
+
+    db = db_writer.flush_metrics(METRICS, PROFILER.rows(throughput['frames']))
+
+    # Detections of a whole video are cached for the next runs
+    if cache is not None and not replay and ended:
+        cache.save(throughput['frames'], video.fps)
 
     # Rewind video
     video.rewind()
     frame = video.read(downscale=video_downscale)
 
     # Save metrics image
-    cv2.imwrite(DIRECTORY_BASE + '/cell_scores.jpg', frame_cell_scores(FILE_DATABASE, frame, grid, (50,0,0)))
-    cv2.imwrite(DIRECTORY_BASE + '/cell_qty.jpg', frame_cell_traffic(FILE_DATABASE, frame, grid, (0,50,0)))
+    cv2.imwrite(DIRECTORY_BASE + '/cell_scores.jpg', recorder.heatmap.frame_scores(frame, (50,0,0)))
+    cv2.imwrite(DIRECTORY_BASE + '/cell_qty.jpg', recorder.heatmap.frame_traffic(frame, (0,50,0)))
     cv2.imwrite(DIRECTORY_BASE + '/trackers_duration.jpg', stats_tracking_duration(FILE_DATABASE))
     cv2.imwrite(DIRECTORY_BASE + '/FPS.jpg', METRIC_FPS.plot())
     cv2.imwrite(DIRECTORY_BASE + '/detections.jpg', METRIC_DETECTIONS.plot())
     cv2.imwrite(DIRECTORY_BASE + '/trackers_errors.jpg', METRIC_ERRORS.plot())
     cv2.imwrite(DIRECTORY_BASE + '/trackers_active.jpg', METRIC_TRACKERS.plot())
     cv2.imwrite(DIRECTORY_BASE + '/trackers_delta.jpg', METRIC_TRACKERSDELTA.plot())
+    if scheduler.adaptive:
+        cv2.imwrite(DIRECTORY_BASE + '/detection_interval.jpg', METRIC_INTERVAL.plot())
 
     # Close video
     video.release()
+
+    summary = {
+        'source': config.get('source'), 'output': DIRECTORY_BASE,
+        'frames': throughput['frames'], 'elapsed': elapsed, 'fps': throughput['frames'] / elapsed, 'detections': throughput['detections'],
+        'tracks': len(db.load_tracking_ids()), 'rows': db_writer.rows, 'tracker_error': METRIC_ERRORS.mean,
+    }
     
+    if headless:
+        return summary
+
     # Show metrics
     SCREEN_STATS_1.show(METRIC_FPS.plot(), wait=False)
     #SCREEN_STATS_2.show(METRIC_DETECTIONS.plot(), wait=False)
     SCREEN_STATS_2.show(METRIC_ERRORS.plot(), wait=False)
     SCREEN_STATS_3.show(METRIC_TRACKERS.plot(), delay=0)
 
+    return summary
+
 if __name__ == "__main__":
     # Set up command-line argument parser
     parser = argparse.ArgumentParser(description='UNAV - Master en Big Data Science - Trabajo Final de Master')
     
     # Add command-line arguments
     parser.add_argument('--config', type=str, default='config.ini', help='Configuration File')
+    parser.add_argument('--headless', action='store_true', help='Run without windows, as fast as possible')
+    parser.add_argument('--processes', action='store_true', help='Decode, detect and track on separate processes (headless only)')
     
     # Parse command-line arguments
     args = parser.parse_args()
 
     # Call main function with command-line arguments
-    main(args.config)
+    main(args.config, args.headless, args.processes)
@@ -0,0 +1,104 @@
+import argparse
+import cv2
+import numpy as np
+import re
+import sqlite3
+
+from utils.DB import SCHEMA_VERSION, create_schema, track_row
+
+CHUNK_SIZE = 10000
+NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+def parse_pair(text: str):
+    # "(12, 34)", "(np.int64(12), np.int64(34))" or "None"
+    if text is None:
+        return None
+
+    numbers = NUMBER.findall(text.replace('int64', '').replace('int32', ''))
+    if len(numbers) != 2:
+        return None
+
+    return (float(numbers[0]), float(numbers[1]))
+
+def parse_score(score):
+    # numpy float scores were stored as their raw bytes
+    if isinstance(score, bytes):
+        return float(np.frombuffer(score, dtype=np.float32 if len(score) == 4 else np.float64)[0])
+
+    return score
+
+def legacy_row(tracker, position, direction, cell, frame, roi, score, timestamp, tick_frequency: float):
+    # ticks become seconds, they keep the tick counter origin as it cannot be mapped to a date
+    seconds = timestamp / tick_frequency if timestamp is not None else None
+    return (tracker, parse_pair(position), parse_pair(direction), cell, frame, roi, parse_score(score), seconds)
+
+def tracker_ids(c, uuids: set) -> dict:
+    c.executemany("INSERT OR IGNORE INTO trackers (uuid) VALUES (?)", [(str(uuid),) for uuid in uuids])
+    return {uuid: c.execute("SELECT id FROM trackers WHERE uuid=?", (str(uuid),)).fetchone()[0] for uuid in uuids}
+
+def has_table(c, table: str) -> bool:
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return c.fetchone() is not None
+
+def migrate(path: str, tick_frequency: float):
+    # transactions are explicit, the whole migration commits at once or not at all
+    db = sqlite3.connect(path, isolation_level=None)
+    c = db.cursor()
+
+    c.execute("PRAGMA user_version")
+    version = c.fetchone()[0]
+
+    # a tracks_v1 table is the source of an interrupted migration
+    leftover = has_table(c, 'tracks_v1')
+
+    if version == SCHEMA_VERSION and not leftover:
+        print(f"{path} already uses schema version {SCHEMA_VERSION}")
+        db.close()
+        return
+
+    # closing without the commit rolls back whatever was done
+    try:
+        c.execute("BEGIN")
+
+        if leftover:
+            c.execute("DROP TABLE IF EXISTS tracks")
+        else:
+            c.execute("ALTER TABLE tracks RENAME TO tracks_v1")
+
+        # the typed tracks table, its indexes and the schema version
+        create_schema(c)
+
+        source = db.cursor()
+        source.execute("SELECT tracker, position, direction, cell, frame, roi, score, timestamp FROM tracks_v1")
+
+        rows = 0
+        trackers = {}
+        while True:
+            chunk = [legacy_row(*row, tick_frequency) for row in source.fetchmany(CHUNK_SIZE)]
+            if len(chunk) == 0:
+                break
+
+            trackers.update(tracker_ids(c, {row[0] for row in chunk} - trackers.keys()))
+            c.executemany("INSERT INTO tracks (tracker, x, y, dx, dy, cell, frame, roi, score, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          [track_row(trackers[tracker], *row) for tracker, *row in chunk])
+            rows += len(chunk)
+
+        c.execute("DROP TABLE tracks_v1")
+        c.execute("COMMIT")
+        c.execute("VACUUM")
+    finally:
+        db.close()
+
+    print(f"{path}: {rows} tracks migrated to schema version {SCHEMA_VERSION}")
+
+if __name__ == "__main__":
+    # Set up command-line argument parser
+    parser = argparse.ArgumentParser(description='UNAV - Master en Big Data Science - Trabajo Final de Master - Database migration')
+    parser.add_argument('database', type=str, nargs='+', help='tracking.db files to migrate in place')
+    parser.add_argument('--tick-frequency', type=float, default=cv2.getTickFrequency(), help='Ticks per second of the machine that recorded the tracks')
+
+    # Parse command-line arguments
+    args = parser.parse_args()
+
+    for path in args.database:
+        migrate(path, args.tick_frequency)
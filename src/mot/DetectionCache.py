@@ -0,0 +1,143 @@
+import hashlib
+import json
+import numpy as np
+import os
+
+from mot.Detections import Detections, detections_boxes
+
+# files of a cache entry, all loaded as memory maps
+ARRAYS = ['detected', 'offsets', 'boxes', 'scores', 'class_ids']
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha1.update(chunk)
+
+    return sha1.hexdigest()
+
+def detections_arrays(detections):
+    if isinstance(detections, Detections):
+        return detections.boxes, detections.scores, detections.class_ids
+
+    boxes = detections_boxes(detections)
+    scores = np.array([det.score for det in detections], dtype=np.float32)
+    class_ids = np.array([det.class_id for det in detections], dtype=np.int16)
+    return boxes, scores, class_ids
+
+class DetectionCache:
+    """ Detections of every detected frame of a video, stored as flat memory mapped arrays under a key of the video, the model and the detector settings """
+
+    _path: str = None
+    _key: dict = None
+    _frames: int = 0
+    _fps: float = None
+    _detected: np.ndarray = None
+    _offsets: np.ndarray = None
+    _boxes: np.ndarray = None
+    _scores: np.ndarray = None
+    _class_ids: np.ndarray = None
+    _pending: dict = None
+
+    def __init__(self, path: str, key: dict = None):
+        self._path = path
+        self._key = key if key is not None else {}
+        self._pending = {}
+
+    def load(self) -> bool:
+        if not os.path.isfile(os.path.join(self._path, 'cache.json')):
+            return False
+
+        with open(os.path.join(self._path, 'cache.json')) as file:
+            descriptor = json.load(file)
+
+        self._frames = descriptor['frames']
+        self._fps = descriptor.get('fps')
+
+        self._detected, self._offsets, self._boxes, self._scores, self._class_ids = [np.load(os.path.join(self._path, name + '.npy'), mmap_mode='r') for name in ARRAYS]
+        return True
+
+    def covers(self, detection_rate: int) -> bool:
+        # every frame due for detection at this rate has cached detections
+        return self._detected is not None and bool(self._detected[::detection_rate].all())
+
+    def detected(self, step: int) -> bool:
+        return step < self._frames and bool(self._detected[step])
+
+    def detections(self, step: int, compact: bool = True):
+        # a frame never detected has no detections to replay, not an empty list of them
+        if not self.detected(step):
+            raise KeyError(f"frame {step} is not in the detection cache {self._path}")
+
+        start, end = self._offsets[step], self._offsets[step + 1]
+        detections = Detections(np.array(self._boxes[start:end]), np.array(self._scores[start:end]), np.array(self._class_ids[start:end]))
+
+        return detections if compact else detections.to_list()
+
+    def store(self, step: int, detections):
+        self._pending[step] = detections_arrays(detections)
+
+    def save(self, frames: int, fps: float = None):
+        """ Writes the stored detections of a complete run, frames without them are marked as not detected """
+        detected = np.zeros(frames, dtype=bool)
+        counts = np.zeros(frames, dtype=np.int64)
+
+        for step, (boxes, _, _) in self._pending.items():
+            if step < frames:
+                detected[step] = True
+                counts[step] = len(boxes)
+
+        offsets = np.zeros(frames + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        steps = [step for step in sorted(self._pending.keys()) if step < frames]
+        arrays = {
+            'detected': detected,
+            'offsets': offsets,
+            'boxes': np.concatenate([self._pending[step][0] for step in steps] + [np.empty((0, 4))]).astype(np.float32),
+            'scores': np.concatenate([self._pending[step][1] for step in steps] + [np.empty(0)]).astype(np.float32),
+            'class_ids': np.concatenate([self._pending[step][2] for step in steps] + [np.empty(0)]).astype(np.int16),
+        }
+
+        # arrays first and the descriptor last, a run stopped halfway leaves no readable entry
+        os.makedirs(self._path, exist_ok=True)
+        if os.path.isfile(os.path.join(self._path, 'cache.json')):
+            os.remove(os.path.join(self._path, 'cache.json'))
+
+        for name, array in arrays.items():
+            np.save(os.path.join(self._path, name + '.npy'), array)
+
+        with open(os.path.join(self._path, 'cache.json'), 'w') as file:
+            json.dump({**self._key, 'frames': frames, 'fps': fps, 'detected': int(detected.sum()), 'detections': int(offsets[-1])}, file, indent=2)
+
+        self._pending = {}
+        self._frames = frames
+        self._fps = fps
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def fps(self):
+        return self._fps
+
+    @staticmethod
+    def make(directory: str, video_path: str, model_path: str, confidence_threshold: float, downscale: float, gate: dict = None):
+        key = {
+            'video': file_hash(video_path),
+            'model': file_hash(model_path) if os.path.isfile(model_path) else os.path.basename(model_path),
+            'confidence_threshold': confidence_threshold,
+            'downscale': downscale,
+        }
+
+        # motion gated detections are kept apart from the whole frame ones
+        if gate is not None:
+            key['gate'] = gate
+        name = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+        return DetectionCache(os.path.join(directory, name), key)
@@ -0,0 +1,64 @@
+import numpy as np
+
+from motpy.core import Detection
+
+class Detections:
+    """ Struct of arrays with the boxes, scores and class ids of the detections of a frame """
+
+    _boxes: np.ndarray = None
+    _scores: np.ndarray = None
+    _class_ids: np.ndarray = None
+
+    def __init__(self, boxes: np.ndarray = None, scores: np.ndarray = None, class_ids: np.ndarray = None):
+        self._boxes = boxes if boxes is not None else np.empty((0, 4), dtype=np.float32)
+        self._scores = scores if scores is not None else np.empty((0,), dtype=np.float32)
+        self._class_ids = class_ids if class_ids is not None else np.empty((0,), dtype=int)
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __getitem__(self, index: int) -> Detection:
+        # Detection objects are only built when a single detection is consumed
+        return Detection(box=self._boxes[index], score=self._scores[index], class_id=self._class_ids[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_list(self) -> list[Detection]:
+        return [self[index] for index in range(len(self))]
+
+    @property
+    def boxes(self):
+        return self._boxes
+
+    @property
+    def scores(self):
+        return self._scores
+
+    @property
+    def class_ids(self):
+        return self._class_ids
+
+def detections_boxes(detections) -> np.ndarray:
+    if isinstance(detections, Detections):
+        return detections.boxes
+
+    return np.array([det.box for det in detections], dtype=float).reshape(-1, 4)
+
+def offset_detections(detections, x: float, y: float):
+    # detections of a crop in the coordinates of the whole frame
+    offset = np.array([x, y, x, y], dtype=np.float32)
+    if isinstance(detections, Detections):
+        return Detections(detections.boxes + offset, detections.scores, detections.class_ids)
+
+    return [Detection(box=det.box + offset, score=det.score, class_id=det.class_id) for det in detections]
+
+def concat_detections(parts: list, compact: bool):
+    if not compact:
+        return [det for part in parts for det in part]
+
+    if len(parts) == 0:
+        return Detections()
+
+    return Detections(np.concatenate([part.boxes for part in parts]), np.concatenate([part.scores for part in parts]), np.concatenate([part.class_ids for part in parts]))
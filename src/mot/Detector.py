@@ -1,19 +1,240 @@
+import cv2
+import numpy as np
+import time
+
+from collections import deque
+from mot.Detections import Detections, concat_detections, offset_detections
 from utils.Config import Config
+from utils.Motion import Motion
+from utils.Profiler import Profiler
 from motpy.core import Detection
 from ultralytics import YOLO
 
 PERSON=0
 
+PROFILER = Profiler()
+
+def model_path(data_dir: str) -> str:
+    return data_dir + '/yolov8n.pt'
+
+def load_model(data_dir: str) -> YOLO:
+    return YOLO(model_path(data_dir))
+
 class YOLODetector:
     _detector = None
     _confidence_threshold = None
+    _compact = False
 
-    def __init__(self):
+    def __init__(self, model: YOLO = None):
         config = Config()
-        self._detector = YOLO(config.get('data_dir') + '/yolov8n.pt')
+        # a loaded model can be shared by the runs of a same process
+        self._detector = model if model is not None else load_model(config.get('data_dir'))
         self._confidence_threshold = config.get('confidence_threshold', float, section='yolo')
+        self._compact = config.get('compact', bool, section='yolo', default=False)
 
+    @PROFILER.timed('detect')
     def detect(self, frame) -> list[Detection]:
         results = self._detector(frame, verbose=False)
-        detections = [Detection(box=b, score=s, class_id=l) for b, s, l in zip(results[0].boxes.xyxy.cpu().numpy(), results[0].boxes.conf.cpu().numpy(), results[0].boxes.cls.cpu().numpy().astype(int))]
-        return [i for i in detections if i.class_id == PERSON and i.score >= self._confidence_threshold]
\ No newline at end of file
+        return self._detections(results[0])
+
+    @PROFILER.timed('detect batch')
+    def detect_batch(self, frames: list) -> list[list[Detection]]:
+        if len(frames) == 0:
+            return []
+
+        results = self._detector(frames, verbose=False)
+        return [self._detections(result) for result in results]
+
+    def _detections(self, result) -> list[Detection]:
+        boxes = result.boxes.xyxy.cpu().numpy()
+        scores = result.boxes.conf.cpu().numpy()
+        class_ids = result.boxes.cls.cpu().numpy().astype(int)
+
+        # Filter on the arrays before any Detection is built
+        keep = (class_ids == PERSON) & (scores >= self._confidence_threshold)
+        detections = Detections(boxes[keep], scores[keep], class_ids[keep])
+
+        return detections if self._compact else detections.to_list()
+
+    @property
+    def compact(self):
+        return self._compact
+
+class DetectionBatcher:
+    """ Reads frames ahead until batch_size of them are due for detection and detects them in a single call """
+
+    _detector: YOLODetector = None
+    _read_frame: callable = None
+    _on_batch: callable = None
+    _detection_rate: int = 1
+    _batch_size: int = 1
+    _frames: deque = None
+    _detections: dict = None
+    _step: int = 0
+    _end: bool = False
+
+    def __init__(self, detector: YOLODetector, read_frame: callable, detection_rate: int, batch_size: int, on_batch: callable = None):
+        self._detector = detector
+        self._read_frame = read_frame
+        self._detection_rate = detection_rate
+        self._batch_size = batch_size
+        self._on_batch = on_batch
+        self._frames = deque()
+        self._detections = {}
+
+    def read(self):
+        # frames are returned in order, the detections of a batch are ready before its first frame
+        if len(self._frames) == 0:
+            self._fill()
+
+        if len(self._frames) == 0:
+            return None
+
+        return self._frames.popleft()
+
+    def detections(self, step: int) -> list[Detection]:
+        return self._detections.pop(step, [])
+
+    def _fill(self):
+        due = []
+
+        while not self._end and len(due) < self._batch_size:
+            frame = self._read_frame()
+
+            if frame is None:
+                self._end = True
+                break
+
+            if self._step % self._detection_rate == 0:
+                due.append((frame, self._step))
+
+            self._frames.append(frame)
+            self._step += 1
+
+        if len(due) == 0:
+            return
+
+        start = time.perf_counter()
+        results = self._detector.detect_batch([frame for frame, _ in due])
+        latency = (time.perf_counter() - start) * 1000.
+
+        for (_, step), detections in zip(due, results):
+            self._detections[step] = detections
+
+        if self._on_batch is not None:
+            self._on_batch(len(due), latency, due[-1][1])
+
+def merge_regions(regions: list) -> list:
+    # overlapping crops are joined, a detection is never made twice
+    regions = list(regions)
+    merged = True
+
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return regions
+
+class MotionGate:
+    """ Detects only where the frame moves: nothing on static frames, the regions around the moving cells (or the roi bounding box) otherwise """
+
+    _detector: YOLODetector = None
+    _motion: Motion = None
+    _threshold: float = 4.
+    _margin: int = 1
+    _max_area: float = 0.5
+    _refresh: int = 0
+    _mask: np.ndarray = None
+    _bounds: tuple = None
+    _calls: int = 0
+    _area: float = 1.
+    _counts: dict = None
+
+    def __init__(self, detector: YOLODetector, motion: Motion, threshold: float = 4., margin: int = 1, max_area: float = 0.5, refresh: int = 0,
+                 mask: np.ndarray = None, bounds: tuple = None):
+        self._detector = detector
+        self._motion = motion
+        self._threshold = threshold
+        self._margin = margin
+        self._max_area = max_area
+        self._refresh = refresh
+        self._mask = mask
+        self._bounds = bounds
+        self._counts = {'skipped': 0, 'cropped': 0, 'full': 0}
+
+    def regions(self, frame) -> list:
+        """ Crops (x1, y1, x2, y2) around the groups of moving cells, grown by margin cells, or the roi bounding box """
+        height, width = frame.shape[:2]
+        active = self._motion.energy > self._threshold
+        if self._mask is not None:
+            active &= self._mask
+
+        if not active.any():
+            return []
+
+        if self._bounds is not None:
+            x1, y1, x2, y2 = self._bounds
+            return [(max(x1, 0), max(y1, 0), min(x2, width), min(y2, height))]
+
+        active = active.astype(np.uint8)
+        if self._margin > 0:
+            active = cv2.dilate(active, np.ones((2 * self._margin + 1, 2 * self._margin + 1), dtype=np.uint8))
+
+        cell_size = self._motion.cell_size
+        _, _, stats, _ = cv2.connectedComponentsWithStats(active, connectivity=8)
+        regions = [(x * cell_size, y * cell_size, min((x + w) * cell_size, width), min((y + h) * cell_size, height)) for x, y, w, h, _ in stats[1:]]
+
+        return merge_regions(regions)
+
+    def detect(self, frame):
+        # every refresh calls the whole frame is detected, the tracks of objects standing still are kept
+        full = self._refresh > 0 and self._calls % self._refresh == 0
+        self._calls += 1
+
+        height, width = frame.shape[:2]
+        regions = [] if full else self.regions(frame)
+        area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) / (width * height)
+
+        if full or area > self._max_area:
+            self._counts['full'] += 1
+            self._area = 1.
+            return self._detector.detect(frame)
+
+        self._area = area
+        if len(regions) == 0:
+            self._counts['skipped'] += 1
+            return concat_detections([], self._detector.compact)
+
+        self._counts['cropped'] += 1
+        results = self._detector.detect_batch([frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions])
+
+        return concat_detections([offset_detections(detections, x1, y1) for (x1, y1, _, _), detections in zip(regions, results)], self._detector.compact)
+
+    @property
+    def area(self):
+        # share of the frame sent to the detector on the last call
+        return self._area
+
+    @property
+    def counts(self):
+        return self._counts
+
+    @staticmethod
+    def make(detector: YOLODetector, motion: Motion, mask: np.ndarray = None, bounds: tuple = None):
+        config = Config()
+
+        return MotionGate(detector, motion,
+                          threshold=config.get('threshold', float, section='gate', default=4.),
+                          margin=config.get('margin', int, section='gate', default=1),
+                          max_area=config.get('max_area', float, section='gate', default=0.5),
+                          refresh=config.get('refresh', int, section='gate', default=4),
+                          mask=mask, bounds=bounds)
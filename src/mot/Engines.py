@@ -0,0 +1,371 @@
+import numpy as np
+
+from abc import ABC, abstractmethod
+from filterpy.kalman import MerweScaledSigmaPoints
+from motpy.core import Box
+from motpy.model import Model
+
+# model matrices and weights, built once per engine type, model spec and dt
+_MATRICES = {}
+
+class Engine(ABC):
+    """ Keeps the state of many single object trackers in stacked arrays, one slot per tracker """
+
+    _fields: tuple = ()
+    _capacity: int = 0
+    _free: list = None
+
+    def __init__(self, capacity: int = 64):
+        self._capacity = max(1, capacity)
+        self._free = list(range(self._capacity - 1, -1, -1))
+
+    def _grow(self):
+        capacity = self._capacity * 2
+
+        for name in self._fields:
+            field = getattr(self, name)
+            grown = np.empty((capacity,) + field.shape[1:], dtype=field.dtype)
+            grown[:self._capacity] = field
+            setattr(self, name, grown)
+
+        self._free = list(range(capacity - 1, self._capacity - 1, -1)) + self._free
+        self._capacity = capacity
+
+    def allocate(self, box: Box) -> int:
+        if len(self._free) == 0:
+            self._grow()
+
+        slot = self._free.pop()
+        self._init_slot(slot, box)
+        return slot
+
+    def release(self, slot: int):
+        self._free.append(slot)
+
+    def is_invalid(self, slot: int) -> bool:
+        return False
+
+    @abstractmethod
+    def _init_slot(self, slot: int, box: Box):
+        """ State of a new tracker in the slot, from its first box """
+
+    @abstractmethod
+    def predict(self, slots):
+        """ One prediction step of the trackers in the slots """
+
+    def update(self, slots, boxes):
+        slots = np.asarray(slots, dtype=int)
+        boxes = np.asarray(boxes, dtype=float).reshape(len(slots), -1)
+
+        # a tracker may be matched to several detections: update them in rounds, in match order
+        while len(slots) > 0:
+            _, first = np.unique(slots, return_index=True)
+            first = np.sort(first)
+            self._update(slots[first], boxes[first])
+
+            rest = np.ones(len(slots), dtype=bool)
+            rest[first] = False
+            slots, boxes = slots[rest], boxes[rest]
+
+    @abstractmethod
+    def _update(self, slots: np.ndarray, boxes: np.ndarray):
+        """ Update of distinct slots, each with one box """
+
+    def _error(self, slots: np.ndarray, error: np.ndarray):
+        # (min, mean, max, var) of each error row, as Tracker._calc_error_distribution
+        self.errors[slots, 0] = np.min(error, axis=1)
+        self.errors[slots, 1] = np.mean(error, axis=1)
+        self.errors[slots, 2] = np.max(error, axis=1)
+        self.errors[slots, 3] = np.mean(error**2, axis=1)
+
+def boxes_to_points(boxes: np.ndarray) -> np.ndarray:
+    # Tracker._box_to_point for many boxes
+    return np.stack(((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2), axis=1).astype(int)
+
+def slot_runs(slots: np.ndarray):
+    # contiguous runs of slots as (slice of the engine arrays, positions in slots), basic slices are views of the arrays
+    order = np.argsort(slots, kind='stable')
+    ordered = slots[order]
+    bounds = np.flatnonzero(np.diff(ordered) != 1) + 1
+
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(slots)]):
+        yield slice(ordered[start], ordered[end - 1] + 1), order[start:end]
+
+class ModelEngine(Engine):
+    """ Engine for trackers following a motpy motion model """
+
+    model: Model = None
+
+    def __init__(self, model_kwargs: dict, capacity: int = 64):
+        super(ModelEngine, self).__init__(capacity)
+
+        self.model = Model(**model_kwargs)
+
+        key = (type(self).__name__, tuple(sorted(model_kwargs.items())))
+        if key not in _MATRICES:
+            _MATRICES[key] = self._build()
+
+        for name, value in _MATRICES[key].items():
+            setattr(self, name, value)
+
+    def _build(self) -> dict:
+        return {
+            'F': self.model.build_F(),
+            'Q': self.model.build_Q(),
+            'H': self.model.build_H(),
+            'R': self.model.build_R(),
+            'P0': self.model.build_P(),
+            'I': np.eye(self.model.state_length)
+        }
+
+    def boxes_to_z(self, boxes: np.ndarray) -> np.ndarray:
+        # Model.box_to_z for many boxes
+        half = int(self.model.dim_box / 2)
+        center = ((boxes[:, :half] + boxes[:, half:]) / 2.0)[:, :self.model.dim_pos]
+        length = (boxes[:, half:] - boxes[:, :half])[:, :self.model.dim_size]
+        return np.concatenate((center, length), axis=1)
+
+    def boxes_to_x(self, boxes: np.ndarray) -> np.ndarray:
+        # Model.box_to_x for many boxes
+        x = np.zeros((len(boxes), self.model.state_length))
+        x[:, self.model.z_in_x_idxs] = self.boxes_to_z(boxes)
+        return x
+
+    def x_to_boxes(self, x: np.ndarray) -> np.ndarray:
+        # Model.x_to_box for many states
+        size = max(self.model.dim_pos, self.model.dim_size)
+        center = np.zeros((len(x), size))
+        length = np.zeros((len(x), size))
+        center[:, :self.model.dim_pos] = x[:, self.model.pos_idxs]
+        length[:, :self.model.dim_size] = x[:, self.model.size_idxs]
+        return np.concatenate((center - length / 2, center + length / 2), axis=1)
+
+class KalmanEngine(ModelEngine):
+    """ Kalman filter predict/update for every tracker at once, as filterpy's KalmanFilter """
+
+    _fields = ('x', 'P', 'centers', 'errors')
+
+    def __init__(self, model_kwargs: dict, capacity: int = 64):
+        super(KalmanEngine, self).__init__(model_kwargs, capacity)
+
+        n = self.model.state_length
+        self.x = np.zeros((self._capacity, n))
+        self.P = np.zeros((self._capacity, n, n))
+        self.centers = np.zeros((self._capacity, 2), dtype=int)
+        self.errors = np.full((self._capacity, 4), np.nan)
+
+    def _init_slot(self, slot: int, box: Box):
+        box = np.asarray(box, dtype=float).reshape(1, -1)
+        self.x[slot] = self.boxes_to_x(box)[0]
+        self.P[slot] = self.P0
+        self.centers[slot] = boxes_to_points(box)[0]
+        self.errors[slot] = np.nan
+
+    def is_invalid(self, slot: int) -> bool:
+        return bool(np.isnan(self.x[slot]).any())
+
+    def predict(self, slots):
+        slots = np.asarray(slots, dtype=int)
+        if len(slots) == 0:
+            return
+
+        x = self.x[slots] @ self.F.T
+        self.x[slots] = x
+        self.P[slots] = self.F @ self.P[slots] @ self.F.T + self.Q
+        self.centers[slots] = boxes_to_points(self.x_to_boxes(x))
+
+    def _update(self, slots: np.ndarray, boxes: np.ndarray):
+        x = self.x[slots]
+        P = self.P[slots]
+
+        self._error(slots, self.boxes_to_x(boxes) - x)
+
+        z = self.boxes_to_z(boxes)
+        y = z - x @ self.H.T
+        PHT = P @ self.H.T
+        S = self.H @ PHT + self.R
+        K = PHT @ np.linalg.inv(S)
+
+        I_KH = self.I - K @ self.H
+        self.x[slots] = x + (K @ y[:, :, None])[:, :, 0]
+        self.P[slots] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self.R @ K.transpose(0, 2, 1)
+        self.centers[slots] = boxes_to_points(boxes)
+
+class UnscentedEngine(ModelEngine):
+    """ Unscented Kalman filter predict/update for every tracker at once, as filterpy's UnscentedKalmanFilter """
+
+    _fields = ('x', 'P', 'sigmas_f', 'centers', 'errors')
+
+    def __init__(self, model_kwargs: dict, capacity: int = 64):
+        super(UnscentedEngine, self).__init__(model_kwargs, capacity)
+
+        n = self.model.state_length
+        self.x = np.zeros((self._capacity, n))
+        self.P = np.zeros((self._capacity, n, n))
+        self.sigmas_f = np.zeros((self._capacity, 2 * n + 1, n))
+        self.centers = np.zeros((self._capacity, 2), dtype=int)
+        self.errors = np.full((self._capacity, 4), np.nan)
+
+    def _build(self) -> dict:
+        matrices = super(UnscentedEngine, self)._build()
+
+        # Generate 2n+1 points
+        n = self.model.state_length
+        points = MerweScaledSigmaPoints(n=n, alpha=.1, beta=2., kappa=3-self.model.dim_pos)
+        matrices['Wm'] = points.Wm
+        matrices['Wc'] = points.Wc
+        matrices['scale'] = points.alpha**2 * (n + points.kappa)
+
+        return matrices
+
+    def _init_slot(self, slot: int, box: Box):
+        box = np.asarray(box, dtype=float).reshape(1, -1)
+        self.x[slot] = self.boxes_to_x(box)[0]
+        self.P[slot] = self.P0
+        self.sigmas_f[slot] = 0.
+        self.centers[slot] = boxes_to_points(box)[0]
+        self.errors[slot] = np.nan
+
+    def is_invalid(self, slot: int) -> bool:
+        return bool(np.isnan(self.x[slot]).any())
+
+    def sigma_points(self, x: np.ndarray, P: np.ndarray) -> np.ndarray:
+        # MerweScaledSigmaPoints.sigma_points for many trackers: x, x + U[k], x - U[k] with U = chol(scale * P)
+        U = np.linalg.cholesky(self.scale * P).transpose(0, 2, 1)
+        return np.concatenate((x[:, None, :], x[:, None, :] + U, x[:, None, :] - U), axis=1)
+
+    def predict(self, slots):
+        slots = np.asarray(slots, dtype=int)
+        if len(slots) == 0:
+            return
+
+        # the transition is linear, so every sigma point is propagated with one product
+        sigmas_f = self.sigma_points(self.x[slots], self.P[slots]) @ self.F.T
+
+        x = np.einsum('k,tkn->tn', self.Wm, sigmas_f)
+        y = sigmas_f - x[:, None, :]
+
+        self.x[slots] = x
+        self.P[slots] = np.einsum('k,tki,tkj->tij', self.Wc, y, y) + self.Q
+        self.sigmas_f[slots] = sigmas_f
+        self.centers[slots] = boxes_to_points(self.x_to_boxes(x))
+
+    def _update(self, slots: np.ndarray, boxes: np.ndarray):
+        x = self.x[slots]
+        sigmas_f = self.sigmas_f[slots]
+
+        self._error(slots, self.boxes_to_x(boxes) - x)
+
+        sigmas_h = sigmas_f @ self.H.T
+        zp = np.einsum('k,tkm->tm', self.Wm, sigmas_h)
+        dz = sigmas_h - zp[:, None, :]
+        S = np.einsum('k,tki,tkj->tij', self.Wc, dz, dz) + self.R
+
+        Pxz = np.einsum('k,tki,tkj->tij', self.Wc, sigmas_f - x[:, None, :], dz)
+        K = Pxz @ np.linalg.inv(S)
+
+        z = self.boxes_to_z(boxes)
+        self.x[slots] = x + (K @ (z - zp)[:, :, None])[:, :, 0]
+        self.P[slots] = self.P[slots] - K @ S @ K.transpose(0, 2, 1)
+        self.centers[slots] = boxes_to_points(boxes)
+
+class ParticleEngine(Engine):
+    """ Particle filter for every tracker at once, as ParticleTracker, on one (trackers, particles, 4) array """
+
+    _fields = ('particles', 'weights', 'centers', 'errors')
+    _dt: float = 1.
+    _noise: float = .001
+    _particles_qty: int = 500
+    _resampled: np.ndarray = None
+
+    def __init__(self, model_kwargs: dict, capacity: int = 64):
+        super(ParticleEngine, self).__init__(capacity)
+
+        self._dt = model_kwargs['dt']
+        self._noise = model_kwargs.get('noise', .001)
+        self._particles_qty = model_kwargs.get('particles', 500)
+        self._rng = np.random.default_rng()
+
+        self.particles = np.zeros((self._capacity, self._particles_qty, 4))
+        self.weights = np.zeros((self._capacity, self._particles_qty))
+        self.centers = np.zeros((self._capacity, 2))
+        self.errors = np.full((self._capacity, 4), np.nan)
+
+    def _init_slot(self, slot: int, box: Box):
+        center = boxes_to_points(np.asarray(box, dtype=float).reshape(1, -1))[0]
+
+        # gaussian particles around (x, y, 0, 0) with unit std
+        self._rng.standard_normal(out=self.particles[slot])
+        self.particles[slot, :, 0:2] += center
+        self.weights[slot] = 1. / self._particles_qty
+        self.centers[slot] = center
+        self.errors[slot] = np.nan
+
+    def is_invalid(self, slot: int) -> bool:
+        return bool(np.isnan(self.centers[slot]).any())
+
+    def _centers(self, slots: np.ndarray):
+        for run, _ in slot_runs(slots):
+            weights = self.weights[run]
+            self.centers[run] = np.einsum('tn,tnk->tk', weights, self.particles[run, :, 0:2]) / weights.sum(axis=1)[:, None]
+
+    def predict(self, slots):
+        slots = np.asarray(slots, dtype=int)
+        if len(slots) == 0:
+            return
+
+        # Predict new position based on velocity and course, in place on each run of slots
+        for run, _ in slot_runs(slots):
+            particles = self.particles[run]
+            particles[:, :, 0:2] += particles[:, :, 2:4] * self._dt
+
+        self._centers(slots)
+
+    def _update(self, slots: np.ndarray, boxes: np.ndarray):
+        T, N = len(slots), self._particles_qty
+        x = boxes_to_points(boxes)
+
+        error = x - self.centers[slots]
+        self._error(slots, error)
+
+        # every particle moves to the detection, with one noise draw per tracker
+        moves = x + self._rng.standard_normal((T, 2)) * self._noise
+        zs = np.linalg.norm(x, axis=1) + self._rng.standard_normal(T) * self._noise
+        resample = np.zeros(T, dtype=bool)
+
+        for run, rows in slot_runs(slots):
+            particles, weights = self.particles[run], self.weights[run]
+            particles[:, :, 0:2] = moves[rows, None, :]
+
+            # gaussian likelihood of the measured distance, in closed form
+            distance = np.linalg.norm(particles[:, :, 0:2], axis=2)
+            weights *= np.exp(-0.5 * ((zs[rows, None] - distance) / self._noise)**2) / (self._noise * np.sqrt(2 * np.pi))
+            weights += 1.e-300  # avoid round-off to zero
+            weights /= weights.sum(axis=1)[:, None]  # normalize
+
+            resample[rows] = (1. / np.sum(np.square(weights), axis=1)) < N / 2
+
+        # Resample if too few effective particles, systematic resampling on every row at once
+        if np.any(resample):
+            rows = np.nonzero(resample)[0]
+            offsets = np.arange(len(rows))[:, None]
+            positions = (self._rng.random(len(rows))[:, None] + np.arange(N)) / N
+            cumulative_sum = np.cumsum(self.weights[slots[rows]], axis=1)
+            indexes = np.searchsorted((cumulative_sum + offsets).ravel(), (positions + offsets).ravel(), side='right').reshape(len(rows), N) - offsets * N
+            np.clip(indexes, 0, N - 1, out=indexes)
+
+            # the drawn particles are gathered in a scratch buffer, then written over their rows
+            if self._resampled is None or len(self._resampled) < len(rows) * N:
+                self._resampled = np.empty((self._capacity * N, 4))
+            resampled = self._resampled[:len(rows) * N]
+            np.take(self.particles.reshape(-1, 4), (slots[rows, None] * N + indexes).ravel(), axis=0, out=resampled, mode='clip')
+
+            self.particles[slots[rows]] = resampled.reshape(len(rows), N, 4)
+            self.weights[slots[rows]] = 1. / N
+
+        # Update velocities based on the error
+        noise = self._rng.standard_normal((T, N, 2)) * self._noise
+        for run, rows in slot_runs(slots):
+            self.particles[run, :, 2:4] += (error[rows] / self._dt)[:, None, :] + noise[rows]
+
+        self._centers(slots)
@@ -0,0 +1,180 @@
+import numpy as np
+import scipy
+
+from motpy.metrics import calculate_iou
+from motpy.tracker import EPS, BaseMatchingFunction, SingleObjectTracker
+from typing import Sequence
+
+from mot.Detections import detections_boxes
+
+def match_by_iou(iou_mat: np.ndarray, min_iou: float, multi_match_min_iou: float) -> np.ndarray:
+    row_ind, col_ind = scipy.optimize.linear_sum_assignment(-iou_mat)
+
+    matches = []
+    for r, c in zip(row_ind, col_ind):
+        # check linear assignment winner
+        if iou_mat[r, c] >= min_iou:
+            matches.append((r, c))
+
+        # check other high IOU detections
+        if multi_match_min_iou < 1.:
+            for c2 in np.nonzero(iou_mat[r] > multi_match_min_iou)[0]:
+                if c2 != c:
+                    matches.append((r, c2))
+
+    return np.array(matches)
+
+class IOUMatchingFunction(BaseMatchingFunction):
+    """ IOU matching as motpy's default one, reading the boxes straight from a Detections container """
+
+    def __init__(self, min_iou: float = 0.1, multi_match_min_iou: float = 1. + EPS) -> None:
+        self.min_iou = min_iou
+        self.multi_match_min_iou = multi_match_min_iou
+
+    def __call__(self, trackers: Sequence[SingleObjectTracker], detections) -> np.ndarray:
+        if len(trackers) == 0 or len(detections) == 0:
+            return []
+
+        iou_mat = calculate_iou(np.array([t.box() for t in trackers]), detections_boxes(detections))
+        return match_by_iou(iou_mat, self.min_iou, self.multi_match_min_iou)
+
+def candidate_pairs(boxes1: np.ndarray, boxes2: np.ndarray, cell_size: float):
+    """ (rows, cols) of the box pairs whose centers fall in the same or neighbouring grid cells """
+
+    centers1 = (boxes1[:, 0:2] + boxes1[:, 2:4]) / 2
+    centers2 = (boxes2[:, 0:2] + boxes2[:, 2:4]) / 2
+
+    # cells at least as big as the biggest box: overlapping boxes are never more than one cell apart
+    extent = max(np.max(boxes1[:, 2:4] - boxes1[:, 0:2]), np.max(boxes2[:, 2:4] - boxes2[:, 0:2]))
+    size = max(cell_size, extent, EPS)
+
+    cells1 = np.floor(centers1 / size).astype(np.int64)
+    cells2 = np.floor(centers2 / size).astype(np.int64)
+    origin = np.minimum(cells1.min(axis=0), cells2.min(axis=0)) - 1
+    cells1 -= origin
+    cells2 -= origin
+    height = max(cells1[:, 1].max(), cells2[:, 1].max()) + 2
+
+    # detections sorted by cell id, each neighbour cell of a tracker is a contiguous range
+    keys2 = cells2[:, 0] * height + cells2[:, 1]
+    order = np.argsort(keys2, kind='stable')
+    keys2 = keys2[order]
+
+    rows, cols = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            keys1 = (cells1[:, 0] + dx) * height + (cells1[:, 1] + dy)
+            lo = np.searchsorted(keys2, keys1, side='left')
+            counts = np.searchsorted(keys2, keys1, side='right') - lo
+
+            total = counts.sum()
+            if total == 0:
+                continue
+
+            starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+            rows.append(np.repeat(np.arange(len(boxes1)), counts))
+            cols.append(order[np.arange(total) + starts])
+
+    if len(rows) == 0:
+        return np.empty((0,), dtype=int), np.empty((0,), dtype=int)
+
+    return np.concatenate(rows), np.concatenate(cols)
+
+def pairs_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    # iou of boxes1[i] and boxes2[i]
+    top_left = np.maximum(boxes1[:, 0:2], boxes2[:, 0:2])
+    bottom_right = np.minimum(boxes1[:, 2:4], boxes2[:, 2:4])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+    area1 = np.prod(boxes1[:, 2:4] - boxes1[:, 0:2], axis=1)
+    area2 = np.prod(boxes2[:, 2:4] - boxes2[:, 0:2], axis=1)
+    return inter / (np.clip(area1 + area2 - inter, 0, None) + EPS)
+
+def assign_greedy(rows: np.ndarray, cols: np.ndarray, ious: np.ndarray, min_iou: float) -> list:
+    matches = []
+    used_rows, used_cols = set(), set()
+
+    for index in np.argsort(-ious, kind='stable'):
+        if ious[index] < min_iou:
+            break
+
+        r, c = rows[index], cols[index]
+        if r not in used_rows and c not in used_cols:
+            used_rows.add(r)
+            used_cols.add(c)
+            matches.append((r, c))
+
+    return matches
+
+def assign_hungarian(rows: np.ndarray, cols: np.ndarray, ious: np.ndarray, min_iou: float, shape: tuple) -> list:
+    # pairs without overlap add nothing to the assignment, so each connected group is solved on its own
+    graph = scipy.sparse.coo_matrix((np.ones(len(rows)), (rows, shape[0] + cols)), shape=(shape[0] + shape[1],) * 2)
+    _, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+    groups = labels[rows]
+
+    # a group made of a single pair needs no solver
+    sizes = np.bincount(groups)
+    single = (sizes[groups] == 1) & (ious >= min_iou)
+    matches = list(zip(rows[single], cols[single]))
+
+    shared = np.flatnonzero(sizes[groups] > 1)
+    order = shared[np.argsort(groups[shared], kind='stable')]
+    bounds = np.flatnonzero(np.diff(groups[order])) + 1
+
+    for group in np.split(order, bounds) if len(order) > 0 else []:
+        group_rows, row_idx = np.unique(rows[group], return_inverse=True)
+        group_cols, col_idx = np.unique(cols[group], return_inverse=True)
+
+        iou_mat = np.zeros((len(group_rows), len(group_cols)))
+        iou_mat[row_idx, col_idx] = ious[group]
+
+        for r, c in zip(*scipy.optimize.linear_sum_assignment(-iou_mat)):
+            if iou_mat[r, c] >= min_iou:
+                matches.append((group_rows[r], group_cols[c]))
+
+    return matches
+
+class GridMatchingFunction(BaseMatchingFunction):
+    """ IOU matching restricted to the tracker/detection pairs that share a grid cell neighbourhood """
+
+    def __init__(self, min_iou: float = 0.1, multi_match_min_iou: float = 1. + EPS, cell_size: float = 40, assignment: str = 'hungarian') -> None:
+        self.min_iou = min_iou
+        self.multi_match_min_iou = multi_match_min_iou
+        self.cell_size = cell_size
+        self.assignment = assignment
+
+    def __call__(self, trackers: Sequence[SingleObjectTracker], detections) -> np.ndarray:
+        if len(trackers) == 0 or len(detections) == 0:
+            return []
+
+        boxes1 = np.array([t.box() for t in trackers], dtype=float).reshape(-1, 4)
+        boxes2 = np.asarray(detections_boxes(detections), dtype=float)
+
+        rows, cols = candidate_pairs(boxes1, boxes2, self.cell_size)
+        ious = pairs_iou(boxes1[rows], boxes2[cols])
+
+        overlap = ious > 0
+        rows, cols, ious = rows[overlap], cols[overlap], ious[overlap]
+
+        if len(rows) == 0:
+            return []
+
+        if self.assignment == 'hungarian':
+            matches = assign_hungarian(rows, cols, ious, self.min_iou, (len(boxes1), len(boxes2)))
+        else:
+            matches = assign_greedy(rows, cols, ious, self.min_iou)
+
+        # check other high IOU detections of every tracker, matched or not, as motpy does for each tracker the solver assigns
+        # (all of them unless there are more trackers than detections, and as long as multi_match_min_iou >= min_iou)
+        if self.multi_match_min_iou < 1.:
+            assigned = dict(matches)
+            for r, c in zip(rows[ious > self.multi_match_min_iou], cols[ious > self.multi_match_min_iou]):
+                if assigned.get(r) != c:
+                    matches.append((r, c))
+
+        return np.array(matches)
+
+def make_matching_fn(type: str, min_iou: float, multi_match_min_iou: float, cell_size: float = 40, assignment: str = 'hungarian') -> BaseMatchingFunction:
+    if type.upper() == 'GRID':
+        return GridMatchingFunction(min_iou, multi_match_min_iou, cell_size, assignment)
+
+    return IOUMatchingFunction(min_iou, multi_match_min_iou)
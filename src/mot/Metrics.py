@@ -1,55 +1,91 @@
 import cv2
 import numpy as np
+import threading
+import time
 
-from matplotlib import pyplot as plt
 from collections import deque
-from io import BytesIO
 
+from utils import Plot
 from utils.DB import DB
 from utils.Grid import Grid
 
-def frame_cell_scores(db_file: str, frame, grid: Grid, color):
-    db = DB(db_file)
-    cell_scores = db.load_cell_scores()
-    cell_scores = {cell[0]: cell[1] for cell in cell_scores}
-    grid._cells = [(cell[0],cell[1],cell[2],cell[3],cell_scores.get(cell[3],0)) for cell in grid._cells]
+class Heatmap:
+    """ Per cell track count and score sum, kept in arrays shaped like the grid """
 
-    blue = np.full((grid.cell_size,grid.cell_size,3), color, np.uint8)
-    frame_scores = frame.copy()
-    for x, y, img, _, score in grid._cells:
-        frame_scores[y:y+grid.cell_size, x:x+grid.cell_size] = cv2.addWeighted(img, 1, blue, score, 0.0)
+    _grid: Grid = None
+    _counts: np.ndarray = None
+    _scored: np.ndarray = None
+    _score_sums: np.ndarray = None
 
-    return frame_scores
+    def __init__(self, grid: Grid):
+        self._grid = grid
+        self._counts = np.zeros(grid.shape, dtype=np.int64)
+        self._scored = np.zeros(grid.shape, dtype=np.int64)
+        self._score_sums = np.zeros(grid.shape, dtype=np.float64)
 
-def frame_cell_traffic(db_file, frame, grid: Grid, color):
-    db = DB(db_file)
-    cell_qty = db.load_cell_qty()
-    cell_qty = {cell[0]: cell[1] for cell in cell_qty}
+    def store(self, cell, score):
+        if cell is None or cell < 0:
+            return
 
-    scale = 1.0/max(cell_qty.values())
-    for k in cell_qty:
-        cell_qty[k] = cell_qty[k] * scale
-    
-    grid._cells = [(cell[0],cell[1],cell[2],cell[3],cell_qty.get(cell[3],0)) for cell in grid._cells]
+        row, col = divmod(cell, self._grid.shape[1])
+        self._counts[row, col] += 1
 
-    green = np.full((grid.cell_size,grid.cell_size,3), color, np.uint8)
-    frame_qty = frame.copy()
-    for x, y, img, _, score in grid._cells:
-        frame_qty[y:y+grid.cell_size, x:x+grid.cell_size] = cv2.addWeighted(img, 1, green, score, 0.0)
+        # as the database query, only positive scores count towards the mean
+        if score is not None and score > 0:
+            self._scored[row, col] += 1
+            self._score_sums[row, col] += score
 
-    return frame_qty
+    def load(self, db: DB):
+        for cell, qty, scored, score_sum in db.load_cell_stats():
+            if cell is not None and 0 <= cell < self._counts.size:
+                self._counts.flat[cell] = qty
+                self._scored.flat[cell] = scored
+                self._score_sums.flat[cell] = score_sum
 
-def stats_tracking_duration(db_file):
-    def timestamp_diff_to_sec(timestamp_difference):
-        return int(cv2.getTickFrequency() / timestamp_difference) if timestamp_difference != 0 else 0
+        return self
+
+    def scores(self) -> np.ndarray:
+        return np.divide(self._score_sums, self._scored, out=np.zeros_like(self._score_sums), where=self._scored > 0)
+
+    def traffic(self) -> np.ndarray:
+        top = self._counts.max()
+        return self._counts / top if top > 0 else np.zeros(self._counts.shape)
+
+    def render(self, frame, values: np.ndarray, color):
+        # frame + values * color on each cell, upscaled to pixels at once and cropped to the partial edge cells
+        height, width = frame.shape[:2]
+        cell_size = self._grid.cell_size
+        rows, cols = values.shape
+
+        weights = cv2.resize(values.astype(np.float32), (cols * cell_size, rows * cell_size), interpolation=cv2.INTER_NEAREST)[:height, :width]
+        overlay = np.rint(weights[:, :, None] * np.asarray(color, dtype=np.float32))
+
+        return np.clip(frame.astype(np.float32) + overlay, 0, 255).astype(np.uint8)
 
+    def frame_scores(self, frame, color):
+        return self.render(frame, self.scores(), color)
 
-    buffer = BytesIO()
+    def frame_traffic(self, frame, color):
+        return self.render(frame, self.traffic(), color)
+
+    @property
+    def counts(self):
+        return self._counts
+
+    @property
+    def score_sums(self):
+        return self._score_sums
+
+def frame_cell_scores(db_file: str, frame, grid: Grid, color):
+    return Heatmap(grid).load(DB(db_file)).frame_scores(frame, color)
+
+def frame_cell_traffic(db_file, frame, grid: Grid, color):
+    return Heatmap(grid).load(DB(db_file)).frame_traffic(frame, color)
+
+def stats_tracking_duration(db_file):
     db = DB(db_file)
     results = db.load_tracking_duration()
 
-    results = [(row[0], row[1], row[2], timestamp_diff_to_sec(row[3])) for row in results]
-
     '''
     # Print the formatted results
     for row in results:
@@ -65,34 +101,196 @@ def stats_tracking_duration(db_file):
     timestamp_differences = [row[3] for row in results]
 
     # Plot the distribution
-    #plt.hist(timestamp_differences, color='skyblue', edgecolor='black')
-    plt.boxplot(timestamp_differences)
-    plt.title('Distribution of Trackers duration')
-    #plt.xlabel('Timestamp Difference (seconds)')
-    #plt.ylabel('Frequency')
-    plt.grid(True)
-    plt.savefig(buffer, format='png')
-    plt.clf()
-    buffer.seek(0)
-    time_series_img = np.asarray(bytearray(buffer.read()), dtype=np.uint8)
-    return cv2.imdecode(time_series_img, cv2.IMREAD_COLOR)
+    figure = Plot.figure()
+    axes = figure.subplots()
+    #axes.hist(timestamp_differences, color='skyblue', edgecolor='black')
+    axes.boxplot(timestamp_differences)
+    axes.set_title('Distribution of Trackers duration')
+    #axes.set_xlabel('Timestamp Difference (seconds)')
+    #axes.set_ylabel('Frequency')
+    axes.grid(True)
+    return Plot.figure_image(figure)
+
+class Quantile():
+    """ P² streaming quantile estimate, five markers updated in O(1) per value """
+
+    _p: float = 0.5
+    _initial: list = None
+    _heights: list = None
+    _positions: list = None
+    _desired: list = None
+    _increments: list = None
+
+    def __init__(self, p: float):
+        self._p = p
+        self._initial = []
+
+    def add(self, x: float):
+        if self._heights is None:
+            self._initial.append(x)
+
+            if len(self._initial) == 5:
+                p = self._p
+                self._heights = sorted(self._initial)
+                self._positions = [0, 1, 2, 3, 4]
+                self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+                self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+            return
+
+        q, n = self._heights, self._positions
+
+        # cell of the new value, the extreme markers follow min and max
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while not q[k] <= x < q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # move the middle markers towards their desired positions, parabolic or else linear
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+                q[i] = height
+                n[i] += d
+
+    @property
+    def value(self):
+        if self._heights is None:
+            return float(np.percentile(self._initial, self._p * 100)) if len(self._initial) > 0 else float('nan')
+
+        return self._heights[2]
 
 class Metric():
-    _steps: deque = None
-    _values: deque = None
+    """ Values kept in growable typed arrays, averaged in equal groups past maxlen, raw rows flushed in blocks to a sink """
+
+    _steps: np.ndarray = None
+    _values: np.ndarray = None
+    _averages: np.ndarray = None
+    _size: int = 0
     _name: str = None
-    
-    def __init__(self, name: str, maxlen: int = None):
+    _maxlen: int = None
+    _stride: int = 1
+    _group_sum: float = 0.
+    _group_count: int = 0
+    _sink: callable = None
+    _flush_every: int = 500
+    _rows: list = None
+    _window: int = 30
+    _window_values: deque = None
+    _window_sum: float = 0.
+    _count: int = 0
+    _sum: float = 0.
+    _min: float = float('inf')
+    _max: float = float('-inf')
+    _p95: Quantile = None
+    _lock: threading.RLock = None
+
+    def __init__(self, name: str, maxlen: int = None, window: int = 30, sink: callable = None, flush_every: int = 500):
         self._name = name
-        self._steps = deque(maxlen=maxlen)
-        self._values = deque(maxlen=maxlen)
+        self._maxlen = maxlen + maxlen % 2 if maxlen is not None else None
+        self._sink = sink
+        self._flush_every = flush_every
+        self._rows = []
+        self._window = window
+        self._window_values = deque(maxlen=window)
+        self._p95 = Quantile(0.95)
+        self._lock = threading.RLock()
+
+        capacity = min(self._maxlen, 1024) if self._maxlen is not None else 1024
+        self._steps = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty(capacity, dtype=np.float64)
+        self._averages = np.empty(capacity, dtype=np.float64)
 
     def store(self, value, step):
-        self._steps.append(step)
-        self._values.append(value)
+        # several event workers may store at once
+        with self._lock:
+            self._store(value, step)
+
+    def _store(self, value, step):
+        # moving average updated with the value entering and the one leaving the window
+        if len(self._window_values) == self._window:
+            self._window_sum -= self._window_values[0]
+
+        self._window_values.append(value)
+        self._window_sum += value
+
+        # running statistics of the whole stream
+        self._count += 1
+        self._sum += value
+        self._min = min(self._min, value)
+        self._max = max(self._max, value)
+        self._p95.add(value)
+
+        # every raw row reaches the sink, in blocks
+        if self._sink is not None:
+            self._rows.append((self._name, int(step), float(value)))
+
+            if len(self._rows) >= self._flush_every:
+                self.flush()
+
+        # kept values are the mean of stride consecutive values
+        self._group_sum += value
+        self._group_count += 1
+
+        if self._group_count < self._stride:
+            return
+
+        self._steps[self._size] = step
+        self._values[self._size] = self._group_sum / self._group_count
+        self._averages[self._size] = self._window_sum / self._window if len(self._window_values) == self._window else np.nan
+        self._size += 1
+        self._group_sum = 0.
+        self._group_count = 0
+
+        # make room as soon as the arrays are full, so the next group already has the new stride
+        if self._size == len(self._values):
+            self._grow()
+
+    def _grow(self):
+        if self._maxlen is None or len(self._values) < self._maxlen:
+            capacity = len(self._values) * 2 if self._maxlen is None else min(len(self._values) * 2, self._maxlen)
+            self._steps = np.resize(self._steps, capacity)
+            self._values = np.resize(self._values, capacity)
+            self._averages = np.resize(self._averages, capacity)
+            return
+
+        # full: each pair is merged into its mean at the later step and later values are grouped twice as large
+        half = self._size // 2
+        self._steps[:half] = self._steps[1:self._size:2]
+        self._values[:half] = (self._values[0:self._size:2] + self._values[1:self._size:2]) / 2
+        self._averages[:half] = self._averages[1:self._size:2]
+        self._size = half
+        self._stride *= 2
+
+    def flush(self, sink: callable = None):
+        # raw rows stored since the last flush, written as one block
+        sink = sink if sink is not None else self._sink
+        if sink is None or len(self._rows) == 0:
+            return
+
+        with self._lock:
+            rows, self._rows = self._rows, []
+        sink(rows)
 
     def each(self, action):
-        for step, value in zip(self._steps, self._values):
+        for step, value in zip(self._steps[:self._size].tolist(), self._values[:self._size].tolist()):
             action(self._name, step, value)
 
     def calculate_moving_average(self, values, window_size):
@@ -100,40 +298,77 @@ class Metric():
         moving_avg = np.convolve(values_array, np.ones(window_size) / window_size, mode='valid')
         return moving_avg
 
+    def series(self, window_size = 30):
+        # copies, other threads keep storing while a chart is drawn
+        with self._lock:
+            size = self._size
+            steps, values, averages = self._steps[:size].copy(), self._values[:size].copy(), self._averages[:size].copy()
+        series = [(steps, values, 'Original')]
+
+        if window_size == self._window:
+            ready = ~np.isnan(averages)
+            series.append((steps[ready], averages[ready], 'Moving Average'))
+        elif size >= window_size:
+            series.append((steps[window_size - 1:], self.calculate_moving_average(values, window_size), 'Moving Average'))
+
+        return series
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def min(self):
+        return self._min if self._count > 0 else None
+
+    @property
+    def max(self):
+        return self._max if self._count > 0 else None
+
+    @property
+    def mean(self):
+        return self._sum / self._count if self._count > 0 else None
+
+    @property
+    def window_mean(self):
+        return self._window_sum / len(self._window_values) if len(self._window_values) > 0 else None
+
+    @property
+    def p95(self):
+        return self._p95.value if self._count > 0 else None
+
     def plot(self, y_min = None, y_max = None, window_size = 30):
-        buffer = BytesIO()
+        figure = Plot.figure()
+        axes = figure.subplots()
 
         if y_min is not None and y_max is not None:
-            plt.ylim(y_min, y_max)
-            plt.yticks(np.arange(y_min, y_max, 2))
-
-        plt.plot(self._steps, self._values, label = 'Original')
-
-        # Calculate and plot the moving average
-        if len(self._values) >= window_size:
-            steps_list = list(self._steps)
-            values_list = list(self._values)
-            moving_avg = self.calculate_moving_average(values_list, window_size)
-            moving_avg_steps = steps_list[window_size - 1:] 
-            plt.plot(moving_avg_steps, moving_avg, label = 'Moving Average')
-
-        plt.xlabel('Frame')
-        plt.ylabel(self._name)
-        plt.savefig(buffer, format='png')
-        plt.clf()
-        buffer.seek(0)
-        time_series_img = np.asarray(bytearray(buffer.read()), dtype=np.uint8)
-        return cv2.imdecode(time_series_img, cv2.IMREAD_COLOR)
-        
+            axes.set_ylim(y_min, y_max)
+            axes.set_yticks(np.arange(y_min, y_max, 2))
+
+        for steps, values, label in self.series(window_size):
+            if len(steps) > 0:
+                axes.plot(steps, values, label = label)
+
+        axes.set_xlabel('Frame')
+        axes.set_ylabel(self._name)
+        return Plot.figure_image(figure)
+
+    def render(self, width = 640, height = 480, y_min = None, y_max = None, window_size = 30):
+        # OpenCV drawn chart, cheap enough to refresh while processing
+        return Plot.render_series(self.series(window_size), width, height, y_min, y_max, ylabel=self._name)
 
 class MetricFPS(Metric):
     _start: int = None
 
     def start(self):
-        self._start = cv2.getTickCount()
+        self._start = time.perf_counter_ns()
 
     def stop(self, step):
-        end = int(cv2.getTickFrequency() / (cv2.getTickCount() - self._start))
+        end = 1e9 / max(time.perf_counter_ns() - self._start, 1)
         self.store(end, step)
 
         return end
@@ -148,4 +383,16 @@ class MetricTrackerErrors(Metric):
     pass
 
 class MetricTrackersDelta(Metric):
-    pass
\ No newline at end of file
+    pass
+
+class MetricQueueDepth(Metric):
+    pass
+
+class MetricLatency(Metric):
+    pass
+
+class MetricDetectionInterval(Metric):
+    pass
+
+class MetricDetectionArea(Metric):
+    pass
@@ -3,10 +3,15 @@ import numpy as np
 
 from typing import Dict
 
+from mot.Detections import Detections, detections_boxes
+from mot.Matching import IOUMatchingFunction, make_matching_fn
 from mot.Track import Track
-from mot.Trackers import GHTracker, KalmanTracker, ParticleTracker, UnscentedKalmanTracker
+from mot.Trackers import BatchedKalmanTracker, FastParticleTracker, FastUnscentedKalmanTracker, GHTracker, KalmanTracker, ParticleTracker, UnscentedKalmanTracker
 from utils.Config import Config
 
+# types accepted by MultiObjectTracker.make
+PRESETS = ['KALMAN', 'KALMAN_BATCHED', 'UNSCENTED', 'UNSCENTED_FAST', 'UNSCENTED_BATCHED', 'GH', 'PARTICLE', 'PARTICLE_BATCHED']
+
 def track_from_motpy(track: motpy.core.Track):
     if track is None:
         return None
@@ -16,6 +21,10 @@ def track_from_motpy(track: motpy.core.Track):
 def previous_to_dict(previous_tracks):
     return {track.id: track for track in previous_tracks}
 
+def tracks_centers(tracks) -> np.ndarray:
+    boxes = np.array([track.box for track in tracks], dtype=float).reshape(-1, 4)
+    return ((boxes[:, 0:2] + boxes[:, 2:4]) / 2).astype(int)
+
 class _MultiObjectTracker(motpy.tracker.MultiObjectTracker):
     def __init__(self,
                  dt: float,
@@ -25,13 +34,91 @@ class _MultiObjectTracker(motpy.tracker.MultiObjectTracker):
                  tracker_kwargs: Dict = None,
                  matching_fn_kwargs: Dict = None,
                  active_tracks_kwargs: Dict = None) -> None:
-        
+
+        if matching_fn is None:
+            matching_fn = IOUMatchingFunction(**(matching_fn_kwargs if matching_fn_kwargs is not None else {}))
+
         super().__init__(dt, model_spec, matching_fn, tracker_kwargs, matching_fn_kwargs, active_tracks_kwargs)
 
         self.tracker_clss = tracker_clss
         self.tracker_kwargs['model_kwargs'] = model_spec
         self.tracker_kwargs['model_kwargs']['dt'] = dt
 
+    def predict_trackers(self) -> None:
+        for t in self.trackers:
+            t.predict()
+
+    def update_trackers(self, matches, detections) -> None:
+        for track_idx, det_idx in matches:
+            self.trackers[track_idx].update(detection=detections[det_idx])
+
+    def step(self, detections) -> list[motpy.core.Track]:
+        """ motpy's step, a Detections container only builds Detection objects for the detections a tracker consumes """
+
+        # filter out empty detections
+        if not isinstance(detections, Detections):
+            detections = [det for det in detections if det.box is not None]
+
+        # predict state in all trackers
+        self.predict_trackers()
+
+        # match trackers with detections
+        matches = self.matching_fn(self.trackers, detections)
+
+        # assigned trackers: correct
+        self.update_trackers(matches, detections)
+
+        # not assigned detections: create new trackers POF
+        assigned_det_idxs = set(matches[:, 1]) if len(matches) > 0 else []
+        for det_idx in set(range(len(detections))).difference(assigned_det_idxs):
+            det = detections[det_idx]
+            tracker = self.tracker_clss(box0=det.box,
+                                        score0=det.score,
+                                        class_id0=det.class_id,
+                                        **self.tracker_kwargs)
+            self.trackers.append(tracker)
+
+        # unassigned trackers
+        assigned_track_idxs = set(matches[:, 0]) if len(matches) > 0 else []
+        for track_idx in set(range(len(self.trackers))).difference(assigned_track_idxs):
+            self.trackers[track_idx].stale()
+
+        # cleanup dead trackers
+        self.cleanup_trackers()
+
+        return self.active_tracks(**self.active_tracks_kwargs)
+
+class _BatchedMultiObjectTracker(_MultiObjectTracker):
+    """ Predicts and updates every tracker at once through the engine shared by its trackers """
+
+    def __init__(self, dt: float, tracker_clss = None, **kwargs) -> None:
+        super().__init__(dt, tracker_clss, **kwargs)
+
+        self.engine = tracker_clss.engine_clss(self.tracker_kwargs['model_kwargs'])
+        self.tracker_kwargs['engine'] = self.engine
+
+    def predict_trackers(self) -> None:
+        self.engine.predict([t.slot for t in self.trackers])
+
+        for t in self.trackers:
+            t.steps_alive += 1
+
+    def update_trackers(self, matches, detections) -> None:
+        if len(matches) == 0:
+            return
+
+        self.engine.update([self.trackers[track_idx].slot for track_idx in matches[:, 0]], detections_boxes(detections)[matches[:, 1]])
+
+        for track_idx, det_idx in matches:
+            self.trackers[track_idx].update_meta(detections[det_idx])
+
+    def cleanup_trackers(self) -> None:
+        for t in self.trackers:
+            if t.is_stale() or t.is_invalid():
+                t.release()
+
+        super().cleanup_trackers()
+
 class MultiObjectTracker():
     _tracker = None
     _active_tracks = []
@@ -51,8 +138,7 @@ class MultiObjectTracker():
             return self.update_tracks(self._tracker.step(detections=detections))
         
         # predict state in all trackers
-        for t in self._tracker.trackers:
-            t.predict()
+        self._tracker.predict_trackers()
 
         return self.update_tracks(self._tracker.active_tracks(**self._tracker.active_tracks_kwargs))
     
@@ -70,43 +156,51 @@ class MultiObjectTracker():
         return None
 
     @staticmethod
-    def make(type: str, fps: int):
+    def make(type: str, fps: int, overrides: dict = None):
         type = type.upper()
         config = Config()
 
-        if type == 'KALMAN':
-            return MultiObjectTracker(_MultiObjectTracker(
-                dt=1 / fps,
-                tracker_clss=KalmanTracker,
-                tracker_kwargs={'max_staleness': 5},
-                model_spec={'order_pos': 1, 'dim_pos': 2, 'order_size': 0, 'dim_size': 2, 'q_var_pos': 5000., 'r_var_pos': 0.1},
-                matching_fn_kwargs={'min_iou': config.get('min_iou', float), 'multi_match_min_iou': 0.93},
-                active_tracks_kwargs={'min_steps_alive': config.get('detection_rate', int) + 1}
-            ))
-        elif type == 'UNSCENTED':
-            return MultiObjectTracker(_MultiObjectTracker(
-                dt=1 / fps,
-                tracker_clss=UnscentedKalmanTracker,
-                tracker_kwargs={'max_staleness': 5},
-                model_spec={'order_pos': 1, 'dim_pos': 2, 'order_size': 0, 'dim_size': 2, 'q_var_pos': 5000., 'r_var_pos': 0.1},
-                matching_fn_kwargs={'min_iou': config.get('min_iou', float), 'multi_match_min_iou': 0.93},
-                active_tracks_kwargs={'min_steps_alive': config.get('detection_rate', int) + 1}
-            ))
-        elif type == 'GH':
-            return MultiObjectTracker(_MultiObjectTracker(
-                dt=1 / fps,
-                tracker_clss=GHTracker,
-                tracker_kwargs={'max_staleness': 5},
-                model_spec={},
-                matching_fn_kwargs={'min_iou': config.get('min_iou', float), 'multi_match_min_iou': 0.93},
-                active_tracks_kwargs={'min_steps_alive': config.get('detection_rate', int) + 1}
-            ))
-        elif type == 'PARTICLE':
-            return MultiObjectTracker(_MultiObjectTracker(
-                dt=1 / fps,
-                tracker_clss=ParticleTracker,
-                tracker_kwargs={'max_staleness': 5},
-                model_spec={},
-                matching_fn_kwargs={'min_iou': config.get('min_iou', float), 'multi_match_min_iou': 0.93},
-                active_tracks_kwargs={'min_steps_alive': config.get('detection_rate', int) + 1}
-            ))            
+        # settings from the configuration, each one can be overridden (sweeps)
+        overrides = overrides if overrides is not None else {}
+        max_staleness = overrides.get('max_staleness', config.get('max_staleness', int, default=5))
+        q_var_pos = overrides.get('q_var_pos', config.get('q_var_pos', float, default=5000.))
+        r_var_pos = overrides.get('r_var_pos', config.get('r_var_pos', float, default=0.1))
+        min_iou = overrides.get('min_iou', config.get('min_iou', float))
+        multi_match_min_iou = overrides.get('multi_match_min_iou', config.get('multi_match_min_iou', float, default=0.93))
+        detection_rate = overrides.get('detection_rate', config.get('detection_rate', int))
+        particles = overrides.get('particles', config.get('particles', int, default=500))
+        gh_g = overrides.get('gh_g', config.get('gh_g', float, default=0.01))
+        gh_h = overrides.get('gh_h', config.get('gh_h', float, default=0.1))
+
+        # one matching function shared by every preset
+        matching_fn = make_matching_fn(overrides.get('matching', config.get('matching', default='iou')),
+                                       min_iou=min_iou,
+                                       multi_match_min_iou=multi_match_min_iou,
+                                       cell_size=config.get('cell_size', int),
+                                       assignment=config.get('matching_assignment', default='hungarian'))
+
+        # type: (wrapper, tracker class, model spec), the wrapper adds dt to its own copy of the spec
+        kalman = {'order_pos': 1, 'dim_pos': 2, 'order_size': 0, 'dim_size': 2, 'q_var_pos': q_var_pos, 'r_var_pos': r_var_pos}
+        presets = {
+            'KALMAN': (_MultiObjectTracker, KalmanTracker, kalman),
+            'KALMAN_BATCHED': (_BatchedMultiObjectTracker, BatchedKalmanTracker, kalman),
+            'UNSCENTED': (_MultiObjectTracker, UnscentedKalmanTracker, kalman),
+            'UNSCENTED_FAST': (_MultiObjectTracker, FastUnscentedKalmanTracker, kalman),
+            'UNSCENTED_BATCHED': (_BatchedMultiObjectTracker, FastUnscentedKalmanTracker, kalman),
+            'GH': (_MultiObjectTracker, GHTracker, {'g': gh_g, 'h': gh_h}),
+            'PARTICLE': (_MultiObjectTracker, ParticleTracker, {'particles': particles}),
+            'PARTICLE_BATCHED': (_BatchedMultiObjectTracker, FastParticleTracker, {'particles': particles}),
+        }
+
+        if type not in presets:
+            return None
+
+        wrapper, tracker_clss, model_spec = presets[type]
+        return MultiObjectTracker(wrapper(
+            dt=1 / fps,
+            tracker_clss=tracker_clss,
+            tracker_kwargs={'max_staleness': max_staleness},
+            model_spec=dict(model_spec),
+            matching_fn=matching_fn,
+            active_tracks_kwargs={'min_steps_alive': detection_rate + 1}
+        ))
@@ -1,4 +1,5 @@
 import cv2
+import numpy as np
 import uuid
 
 from utils.Grid import Grid
@@ -16,12 +17,14 @@ class Roi:
     _start = None
     _end = None
     _roi_cells = None
+    _mask = None
     _count = 0
 
     def __init__(self, grid: Grid):
         self._id = str(uuid.uuid4())
         self._grid = grid
         self._roi_cells = []
+        self._mask = np.zeros(len(grid.cells), dtype=bool)
     
     def define(self, frame):
         self._frame = frame
@@ -54,19 +57,48 @@ class Roi:
     def _select_zones(self):
         # Extract selected zones and draw rectangles for each selected zone
         if self._start is not None and self._end is not None:
-            x1, y1 = self._start
-            x2, y2 = self._end
-            cells = self._grid.cells
-            cell_size = self._grid.cell_size
-
-            selected = [cell for cell in cells if ((x1 <= cell[0] and cell[0] < x2) or (x1 <= cell[0] + cell_size and cell[0] + cell_size < x2)) and
-                                                          ((y1 <= cell[1] and cell[1] < y2) or (y1 <= cell[1] + cell_size and cell[1] + cell_size < y2))]
-            
-            self._roi_cells = self._roi_cells + selected
+            self.select(self._start, self._end)
 
         self.plot(self._frame, False)
         cv2.imshow(WINDOW_TITLE, self._frame)
 
+    def select(self, start: tuple, end: tuple):
+        x1, y1 = start
+        x2, y2 = end
+        cells = self._grid.cells
+        cell_size = self._grid.cell_size
+
+        # cells already selected are kept once
+        selected = [cell for cell in cells if ((x1 <= cell[0] and cell[0] < x2) or (x1 <= cell[0] + cell_size and cell[0] + cell_size < x2)) and
+                                                      ((y1 <= cell[1] and cell[1] < y2) or (y1 <= cell[1] + cell_size and cell[1] + cell_size < y2)) and
+                                                      not self._mask[cell[3]]]
+
+        self._start = start
+        self._end = end
+        self._roi_cells = self._roi_cells + selected
+        self._mask[[cell[3] for cell in selected]] = True
+
+    def select_cells(self, ids: list):
+        selected = [self._grid.cell(id) for id in dict.fromkeys(ids) if self._grid.cell(id) is not None and not self._mask[id]]
+
+        self._roi_cells = self._roi_cells + selected
+        self._mask[[cell[3] for cell in selected]] = True
+
+    def load(self, rects: str = '', cells: str = ''):
+        # rects: 'x1,y1,x2,y2;x1,y1,x2,y2' - cells: 'id,id,id'
+        for rect in [r for r in rects.split(';') if r.strip() != '']:
+            x1, y1, x2, y2 = [int(v) for v in rect.split(',')]
+            self.select((x1, y1), (x2, y2))
+
+        if cells.strip() != '':
+            self.select_cells([int(v) for v in cells.split(',')])
+
+        if len(self._roi_cells) > 0:
+            # plot the bounding box of the whole selection
+            cell_size = self._grid.cell_size
+            self._start = (min(cell[0] for cell in self._roi_cells), min(cell[1] for cell in self._roi_cells))
+            self._end = (max(cell[0] for cell in self._roi_cells) + cell_size, max(cell[1] for cell in self._roi_cells) + cell_size)
+
     def plot(self, frame, copy=True):
         # Display the frame with selected zones
         if frame is None:
@@ -86,17 +118,36 @@ class Roi:
         
         return frame
     
+    def contains(self, id) -> bool:
+        return id is not None and 0 <= id < len(self._mask) and bool(self._mask[id])
+
     def in_cell(self, point: tuple):
-        for cell in self._roi_cells:
-            x, y, _, _, _ = cell
-            cell_end_x = x + self._grid.cell_size
-            cell_end_y = y + self._grid.cell_size
-            
-            if x <= point[0] <= cell_end_x and y <= point[1] <= cell_end_y:
-                return cell
+        id = self._grid.cell_id(point)
+        return self._grid.cell(id) if self.contains(id) else None
 
-        return None
+    def in_cells(self, points: np.ndarray) -> np.ndarray:
+        # cell ids (N,) of the points inside the roi, -1 otherwise
+        ids = self._grid.in_cells(points)
+        inside = ids >= 0
+        inside[inside] = self._mask[ids[inside]]
+
+        return np.where(inside, ids, -1)
 
     @property
     def selected_cells(self):
-        return self._roi_cells
\ No newline at end of file
+        return self._roi_cells
+
+    @property
+    def mask(self):
+        # selected cells as a (rows, cols) grid mask
+        return self._mask.reshape(self._grid.shape)
+
+    @property
+    def bounds(self):
+        # bounding box (x1, y1, x2, y2) of the selected cells
+        if len(self._roi_cells) == 0:
+            return None
+
+        cell_size = self._grid.cell_size
+        return (min(cell[0] for cell in self._roi_cells), min(cell[1] for cell in self._roi_cells),
+                max(cell[0] for cell in self._roi_cells) + cell_size, max(cell[1] for cell in self._roi_cells) + cell_size)
\ No newline at end of file
@@ -0,0 +1,114 @@
+from utils.Config import Config
+
+# decisions of the adaptive scheduler
+FIXED = 'fixed'
+BUDGET = 'budget'
+BUSY = 'busy'
+IDLE = 'idle'
+CALM = 'calm'
+HOLD = 'hold'
+
+class DetectionScheduler:
+    """ Steps between detections, fixed or adapted after each detection to the tracks and the motion of the scene within a per frame latency budget """
+
+    _adaptive: bool = False
+    _interval: int = 1
+    _min_interval: int = 1
+    _max_interval: int = 1
+    _latency_budget: float = 0.
+    _error_threshold: float = 20.
+    _motion_threshold: float = 4.
+    _smoothing: float = 0.1
+    _next: int = 0
+    _latency: float = None
+    _churn: int = 0
+    _motion: float = 0.
+    _decisions: dict = None
+
+    def __init__(self, interval: int, adaptive: bool = False, min_interval: int = 1, max_interval: int = 1, latency_budget: float = 0.,
+                 error_threshold: float = 20., motion_threshold: float = 4., smoothing: float = 0.1):
+        self._adaptive = adaptive
+        self._min_interval = min(min_interval, max_interval)
+        self._max_interval = max_interval
+        self._interval = max(self._min_interval, min(interval, self._max_interval)) if adaptive else interval
+        self._latency_budget = latency_budget
+        self._error_threshold = error_threshold
+        self._motion_threshold = motion_threshold
+        self._smoothing = smoothing
+        self._decisions = {}
+
+    def due(self, step: int) -> bool:
+        # a fixed interval keeps the modulus of detection_rate
+        if not self._adaptive:
+            return step % self._interval == 0
+
+        return step >= self._next
+
+    def observe(self, latency: float, delta_trackers: int, motion: float = 0.):
+        """ Signals of every frame: latency (ms), trackers created or removed and peak motion energy of the cells without tracks """
+        self._latency = latency if self._latency is None else self._latency + self._smoothing * (latency - self._latency)
+        self._churn += abs(delta_trackers)
+        self._motion = max(self._motion, motion)
+
+    def decide(self, step: int, error: tuple, active_tracks: int) -> str:
+        """ Next detection step after the detection of this one, from the signals observed since the previous one """
+        error = error[1] if error is not None else None
+
+        if not self._adaptive:
+            decision = FIXED
+        elif self._latency_budget > 0 and self._latency is not None and self._latency > self._latency_budget:
+            # over the budget, detections are spread whatever the scene does
+            decision = BUDGET
+            self._interval += 1
+        elif self._churn > 0 or (error is not None and error > self._error_threshold) or self._motion > self._motion_threshold:
+            decision = BUSY
+            self._interval = self._interval // 2
+        elif active_tracks == 0 and self._motion <= self._motion_threshold / 2:
+            decision = IDLE
+            self._interval = self._max_interval
+        elif (error is None or error <= self._error_threshold / 2) and self._motion <= self._motion_threshold / 2:
+            decision = CALM
+            self._interval += 1
+        else:
+            decision = HOLD
+
+        if self._adaptive:
+            self._interval = max(self._min_interval, min(self._interval, self._max_interval))
+
+        self._next = step + self._interval
+        self._churn = 0
+        self._motion = 0.
+        self._decisions[decision] = self._decisions.get(decision, 0) + 1
+
+        return decision
+
+    @property
+    def adaptive(self):
+        return self._adaptive
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def min_interval(self):
+        return self._min_interval
+
+    @property
+    def latency(self):
+        return self._latency
+
+    @property
+    def decisions(self):
+        return self._decisions
+
+    @staticmethod
+    def make(detection_rate: int):
+        config = Config()
+
+        return DetectionScheduler(detection_rate, config.get('adaptive', bool, section='scheduler', default=False),
+                                  min_interval=config.get('min_interval', int, section='scheduler', default=1),
+                                  max_interval=config.get('max_interval', int, section='scheduler', default=5),
+                                  latency_budget=config.get('latency_budget', float, section='scheduler', default=0.),
+                                  error_threshold=config.get('error_threshold', float, section='scheduler', default=20.),
+                                  motion_threshold=config.get('motion_threshold', float, section='scheduler', default=4.))
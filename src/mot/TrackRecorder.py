@@ -0,0 +1,82 @@
+import threading
+import time
+
+from mot.Metrics import Heatmap
+from mot.MultiObjectTracker import track_from_motpy, previous_to_dict, tracks_centers
+from mot.Roi import Roi
+from utils.Grid import Grid
+from utils.Profiler import Profiler
+
+PROFILER = Profiler()
+
+class TrackRecorder:
+    """ Turns tracker steps into per track events and saves the tracks entering or moving across cells """
+
+    _grid: Grid = None
+    _roi: Roi = None
+    _heatmap: Heatmap = None
+    _save_track: callable = None
+    _lock: threading.Lock = None
+
+    def __init__(self, grid: Grid, save_track: callable, roi: Roi = None):
+        self._grid = grid
+        self._roi = roi
+        self._save_track = save_track
+        self._heatmap = Heatmap(grid)
+
+        # track events may be handled by several workers
+        self._lock = threading.Lock()
+
+    def events(self, step: int, active_tracks, previous_tracks) -> list:
+        previous_tracks = previous_to_dict(previous_tracks)
+
+        # Resolve the cells of every track in one call
+        cells = self._grid.in_cells(tracks_centers(active_tracks)).tolist()
+        previous_cells = dict(zip(previous_tracks.keys(), self._grid.in_cells(tracks_centers(previous_tracks.values())).tolist()))
+
+        return [{ 'step': step, 'track': track, 'previous': previous_tracks.get(track.id, None), 'cell': cell, 'previous_cell': previous_cells.get(track.id, -1) }
+                for track, cell in zip(active_tracks, cells)]
+
+    def save_track(self, tracker, position, direction, cell, frame, roi, score, timestamp):
+        with self._lock:
+            self._heatmap.store(cell, score)
+        self._save_track(tracker, position, direction, cell, frame, roi, score, timestamp)
+
+    @PROFILER.timed('track event')
+    def on_track_event(self, event):
+        step = event['step']
+        track = track_from_motpy(event['track']) if event['track'] is not None else None
+        previous = track_from_motpy(event['previous']) if event['previous'] is not None else None
+        diff = track.diff(previous) if track is not None and previous is not None else None
+        timestamp = time.time()
+
+        if track is None:
+            return
+
+        # cell ids are resolved for all tracks at once on the tracker event
+        cell = event['cell']
+        roi = self._roi
+
+        if roi is None:
+            if cell < 0:
+                return
+
+            self.save_track(track._id, track.center, diff, cell, step, None, track._score, timestamp)
+            return
+
+        current_cell = cell if roi.contains(cell) else None
+        last_cell = event['previous_cell'] if roi.contains(event['previous_cell']) else None
+
+        if current_cell is not None and last_cell is None:
+            with self._lock:
+                roi._count += 1
+            self.save_track(track._id, track.center, diff, current_cell, step, roi._id, track._score, timestamp)
+        elif current_cell is not None and last_cell is not None and current_cell != last_cell:
+            self.save_track(track._id, track.center, diff, current_cell, step, roi._id, track._score, timestamp)
+        elif current_cell is None and last_cell is not None:
+            with self._lock:
+                roi._count -= 1
+
+    @property
+    def heatmap(self):
+        return self._heatmap
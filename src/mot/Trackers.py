@@ -3,6 +3,7 @@ import numpy as np
 from filterpy.gh import GHFilter
 from filterpy.kalman import KalmanFilter, UnscentedKalmanFilter, MerweScaledSigmaPoints
 from filterpy.monte_carlo import systematic_resample
+from mot.Engines import Engine, KalmanEngine, ParticleEngine, UnscentedEngine
 from motpy.core import Box, Detection, Vector, setup_logger
 from motpy.model import Model
 from motpy.tracker import SingleObjectTracker
@@ -68,7 +69,7 @@ class GHTracker(Tracker):
 
         super(GHTracker, self).__init__(box0, **kwargs)
 
-        self._tracker: GHFilter = GHFilter(x=self._center, g=0.01, h=0.1, dx=0, dt=model_kwargs['dt'])
+        self._tracker: GHFilter = GHFilter(x=self._center, g=model_kwargs.get('g', 0.01), h=model_kwargs.get('h', 0.1), dx=0, dt=model_kwargs['dt'])
 
     def _predict(self) -> None:
         self._tracker.dx = self._tracker.dx_prediction
@@ -134,7 +135,7 @@ class ParticleTracker(Tracker):
 
         super(ParticleTracker, self).__init__(box0, **kwargs)
 
-        self._particles_qty = 500
+        self._particles_qty = model_kwargs.get('particles', 500)
         self._dt = model_kwargs['dt']
 
         mean = (self._center[0], self._center[1], 0, 0)
@@ -239,3 +240,76 @@ class UnscentedKalmanTracker(Tracker):
         z = self.model.box_to_z(detection.box)
         self._tracker.update(z)
         self._center = self._box_to_point(detection.box)
+
+class EngineTracker(Tracker):
+    """ A single object tracker whose filter state lives in a slot of a shared engine """
+
+    engine_clss = None
+
+    def __init__(self,
+                 model_kwargs: dict = { 'dt': 1 },
+                 x0: Optional[Vector] = None,
+                 box0: Optional[Box] = None,
+                 engine: Optional[Engine] = None,
+                 **kwargs) -> None:
+
+        super(EngineTracker, self).__init__(box0, **kwargs)
+
+        # without a shared engine the tracker runs on a private one
+        self._engine = engine if engine is not None else self.engine_clss(model_kwargs, capacity=1)
+        self._slot = self._engine.allocate(box0)
+
+    def _predict(self) -> None:
+        self._engine.predict([self._slot])
+
+    def _update_box(self, detection: Detection) -> None:
+        self._engine.update([self._slot], [detection.box])
+
+    def update_meta(self, detection: Detection) -> None:
+        # SingleObjectTracker.update once the engine already updated the box
+        self.steps_positive += 1
+
+        self.class_id = self.update_class_id(detection.class_id)
+        self.score = self.update_score_fn(old=self.score, new=detection.score)
+        self.feature = self.update_feature_fn(old=self.feature, new=detection.feature)
+
+        self.unstale(rate=3)
+
+    def release(self) -> None:
+        self._engine.release(self._slot)
+
+    def error(self):
+        #(min, mean, max, var)
+        return tuple(None if np.isnan(e) else e for e in self._engine.errors[self._slot])
+
+    def box(self) -> Box:
+        w = self._width / 2
+        h = self._height / 2
+        center = self._engine.centers[self._slot]
+        return np.array([center[0] - w, center[1] - h, center[0] + w, center[1] + h])
+
+    def is_invalid(self) -> bool:
+        return self._engine.is_invalid(self._slot)
+
+    @property
+    def slot(self):
+        return self._slot
+
+    @property
+    def center(self):
+        return self._engine.centers[self._slot]
+
+class BatchedKalmanTracker(EngineTracker):
+    """ A single object tracker using Kalman filter, batched with every other tracker of its engine """
+
+    engine_clss = KalmanEngine
+
+class FastUnscentedKalmanTracker(EngineTracker):
+    """ A single object tracker using Unscented Kalman filter with cached model matrices and sigma point weights """
+
+    engine_clss = UnscentedEngine
+
+class FastParticleTracker(EngineTracker):
+    """ A single object tracker using Particle filter, with the particles of every tracker in one array """
+
+    engine_clss = ParticleEngine
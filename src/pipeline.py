@@ -0,0 +1,354 @@
+import cv2
+import multiprocessing
+import queue
+import time
+
+from mot.Detections import detections_boxes
+from mot.Detector import YOLODetector
+from mot.Metrics import MetricDetections, MetricFPS, MetricTrackerErrors, MetricTrackers, MetricTrackersDelta, MetricQueueDepth, MetricLatency, stats_tracking_duration
+from mot.MultiObjectTracker import MultiObjectTracker
+from mot.Roi import Roi
+from mot.TrackRecorder import TrackRecorder
+from utils.Config import Config
+from utils.DB import DB
+from utils.DBWriter import DBWriter
+from utils.FrameRing import FrameRing
+from utils.FrameSink import FrameSink
+from utils.Grid import Grid
+from utils.Profiler import Profiler
+from utils.Video import Video
+
+PROFILER = Profiler()
+
+# Decoder, detector and tracker in their own processes: frames stay in a shared memory ring and only
+# {'step', 'slot', ...} messages travel through the queues, None marks the end of the video
+
+def decode(ring: FrameRing, frames):
+    config = Config()
+
+    video = Video(config.get('source'))
+    video.open()
+    video_downscale = config.get('video_downscale', float)
+    height, width = ring.shape[:2]
+    decoded = None
+    step = 0
+
+    # as on the threaded pipeline, the first frame only sizes the grid
+    video.skip(1)
+
+    while True:
+        slot = ring.acquire()
+
+        # decode, or decode and downscale, straight into the slot
+        if video_downscale == 1.:
+            with PROFILER.stage('decode'):
+                ret = video.cap.read(ring.view(slot))[0]
+        else:
+            with PROFILER.stage('decode'):
+                ret, decoded = video.cap.read(decoded)
+            if ret:
+                with PROFILER.stage('downscale'):
+                    cv2.resize(decoded, (width, height), dst=ring.view(slot), interpolation=cv2.INTER_AREA)
+
+        if not ret:
+            ring.release(slot)
+            break
+
+        frames.put({'step': step, 'slot': slot})
+        step += 1
+
+    frames.put(None)
+    video.release()
+    ring.close()
+
+    return {'frames': step}, PROFILER.rows(step)
+
+def detect(ring: FrameRing, frames, detections):
+    config = Config()
+
+    detector = YOLODetector()
+    detection_rate = config.get('detection_rate', int)
+    batch_size = config.get('batch_size', int, section='yolo', default=1)
+    pending = []
+    due = []
+    detected = 0
+
+    while True:
+        message = frames.get()
+
+        if message is not None:
+            message = {**message, 'detections': None, 'batch': None}
+            pending.append(message)
+            if message['step'] % detection_rate == 0:
+                due.append(message)
+
+        # frames leave in order, so the ones behind a due frame wait until its batch is detected
+        if len(due) > 0 and len(due) < batch_size and message is not None:
+            continue
+
+        if len(due) > 0:
+            start = time.perf_counter()
+            if batch_size > 1:
+                results = detector.detect_batch([ring.view(due_message['slot']) for due_message in due])
+            else:
+                results = [detector.detect(ring.view(due[0]['slot']))]
+            latency = (time.perf_counter() - start) * 1000.
+
+            for due_message, result in zip(due, results):
+                due_message['detections'] = result
+                detected += 1
+            if batch_size > 1:
+                due[-1]['batch'] = (len(due), latency)
+
+        for pending_message in pending:
+            detections.put(pending_message)
+        pending = []
+        due = []
+
+        if message is None:
+            break
+
+    detections.put(None)
+    ring.close()
+
+    return {'detected': detected}, PROFILER.rows(detected)
+
+def track(ring: FrameRing, detections, directory: str, database_file: str, fps: float, frame):
+    config = Config()
+
+    def on_db_flush(depth, latency, step):
+        METRIC_DB_QUEUE.store(depth, step)
+        METRIC_DB_FLUSH.store(latency, step)
+
+    db_writer = DBWriter(database_file, config.get('batch_size', int, section='db', default=500), config.get('flush_interval', float, section='db', default=1.), on_db_flush)
+
+    metrics_maxlen = config.get('metrics_maxlen', int, default=10000)
+    METRIC_FPS = MetricFPS('FPS', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_DETECTIONS = MetricDetections('Detections', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_TRACKERS = MetricTrackers('Active Trackers', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_ERRORS = MetricTrackerErrors('Tracker Errors', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_TRACKERSDELTA = MetricTrackersDelta('Trackers Delta', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_DB_QUEUE = MetricQueueDepth('DB Queue', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_DB_FLUSH = MetricLatency('DB Flush', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_BATCH = MetricLatency('Detection Batch', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_BATCH_FRAME = MetricLatency('Detection Frame', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRIC_DETECTION_QUEUE = MetricQueueDepth('Detection Queue', metrics_maxlen, sink=db_writer.save_metrics_many)
+    METRICS = [METRIC_FPS, METRIC_DETECTIONS, METRIC_TRACKERS, METRIC_ERRORS, METRIC_TRACKERSDELTA, METRIC_DB_QUEUE, METRIC_DB_FLUSH, METRIC_BATCH, METRIC_BATCH_FRAME, METRIC_DETECTION_QUEUE]
+
+    db_writer.start()
+
+    show_detections: bool = config.get('show_detections', bool)
+    show_trackers: bool = config.get('show_trackers', bool)
+    use_roi: bool = config.get('use_roi', bool)
+
+    frame_sink = FrameSink.make(config.get('frames', section='output', default='images'), directory, fps,
+                                every=config.get('frames_every', int, section='output', default=1),
+                                workers=config.get('frames_workers', int, section='output', default=1),
+                                maxsize=config.get('frames_queue', int, section='output', default=64),
+                                policy=config.get('frames_policy', section='output', default='drop'))
+    frame_sink.start()
+
+    grid = Grid(config.get('cell_size', int))
+    grid.divide(frame)
+
+    roi = None
+    if use_roi:
+        roi = Roi(grid)
+        roi.load(config.get('roi', default=''), config.get('roi_cells', default=''))
+
+    tracker = MultiObjectTracker.make(config.get('tracker'), fps)
+
+    # track events are handled right away, the database writes stay on the writer thread
+    recorder = TrackRecorder(grid, db_writer.save_track, roi)
+    throughput = {'frames': 0, 'detections': 0}
+    start = None
+
+    while True:
+        message = detections.get()
+
+        if message is None:
+            break
+
+        # processing time starts on the first frame, once every stage is up
+        if start is None:
+            start = time.perf_counter()
+
+        step = message['step']
+        METRIC_FPS.start()
+
+        frame_detections = message['detections'] if message['detections'] is not None else []
+        if message['detections'] is not None:
+            METRIC_DETECTIONS.store(len(frame_detections), step)
+            throughput['detections'] += len(frame_detections)
+        if message['batch'] is not None:
+            size, latency = message['batch']
+            METRIC_BATCH.store(latency, step)
+            METRIC_BATCH_FRAME.store(latency / size, step)
+
+        with PROFILER.stage('track step'):
+            active_tracks, delta_trackers = tracker.step(detections=frame_detections)
+
+        with PROFILER.stage('tracker event'):
+            for event in recorder.events(step, active_tracks, tracker._previous_tracks):
+                recorder.on_track_event(event)
+
+        METRIC_TRACKERS.store(len(active_tracks), step)
+        METRIC_TRACKERSDELTA.store(delta_trackers, step)
+
+        with PROFILER.stage('error'):
+            error = tracker.error()
+        if error is not None:
+            METRIC_ERRORS.store(error[3], step)
+
+        # the sink keeps the frame after the slot is reused, so it gets a copy
+        if frame_sink.enabled:
+            with PROFILER.stage('draw'):
+                annotated = ring.view(message['slot']).copy()
+
+                if roi is not None:
+                    annotated = roi.plot(annotated)
+
+                if show_detections:
+                    for box in detections_boxes(frame_detections):
+                        cv2.rectangle(annotated, (int(box[0]), int(box[1])), (int(box[2]), int(box[3])), (255, 0, 0), 1)
+
+                if show_trackers:
+                    for active_track in active_tracks:
+                        cv2.circle(annotated, (int((active_track.box[0] + active_track.box[2])/2), int((active_track.box[1] + active_track.box[3])/2)), 2, (0,255,0), thickness=-1)
+
+            frame_sink.write(annotated, step)
+
+        ring.release(message['slot'])
+
+        METRIC_FPS.stop(step)
+        METRIC_DETECTION_QUEUE.store(detections.qsize(), step)
+        throughput['frames'] += 1
+
+    elapsed = time.perf_counter() - start if start is not None else 0.
+    frame_sink.stop()
+    db_writer.flush_metrics(METRICS)
+    ring.close()
+
+    cv2.imwrite(directory + '/cell_scores.jpg', recorder.heatmap.frame_scores(frame, (50,0,0)))
+    cv2.imwrite(directory + '/cell_qty.jpg', recorder.heatmap.frame_traffic(frame, (0,50,0)))
+    cv2.imwrite(directory + '/trackers_duration.jpg', stats_tracking_duration(database_file))
+    cv2.imwrite(directory + '/FPS.jpg', METRIC_FPS.plot())
+    cv2.imwrite(directory + '/detections.jpg', METRIC_DETECTIONS.plot())
+    cv2.imwrite(directory + '/trackers_errors.jpg', METRIC_ERRORS.plot())
+    cv2.imwrite(directory + '/trackers_active.jpg', METRIC_TRACKERS.plot())
+    cv2.imwrite(directory + '/trackers_delta.jpg', METRIC_TRACKERSDELTA.plot())
+
+    summary = {
+        **throughput,
+        'elapsed': elapsed,
+        'written': frame_sink.written, 'dropped': frame_sink.dropped,
+        'rows': db_writer.rows, 'flushes': db_writer.flushes, 'flush_latency': db_writer.flush_latency,
+        'metrics': [(metric.name, metric.min, metric.mean, metric.p95, metric.max) for metric in METRICS if metric.size > 0],
+    }
+    return summary, PROFILER.rows(throughput['frames'])
+
+def stage(target: callable, name: str, results, config_file: str, source: str, *args):
+    # process entry point: the stage summary and its profiler rows go back to the main process
+    config = Config()
+    config.load(config_file)
+    config.set('source', source)
+    PROFILER.enable(config.get('profile', bool, default=False))
+
+    summary, rows = target(*args)
+
+    if PROFILER.enabled:
+        print(f"[{name}]")
+        PROFILER.summary()
+
+    results.put((name, summary, rows))
+
+def collect(processes: list, results) -> dict:
+    summaries = {}
+
+    while len(summaries) < len(processes):
+        try:
+            name, summary, rows = results.get(timeout=1.)
+            summaries[name] = (summary, rows)
+            continue
+        except queue.Empty:
+            pass
+
+        # a stage ended without a summary: stop the others instead of waiting on their queues forever
+        failed = [process.name for process in processes if not process.is_alive() and process.name not in summaries]
+        if len(failed) > 0 and results.empty():
+            print(f"Error: pipeline stage {', '.join(failed)} stopped before the end of the video.")
+            for process in processes:
+                process.terminate()
+            return None
+
+    return summaries
+
+def run(config_file: str, directory: str, database_file: str) -> dict:
+    """ Processes the video with the decoder, the detector and the tracker each on its own process """
+    config = Config()
+    context = multiprocessing.get_context('spawn')
+
+    video_downscale: float = config.get('video_downscale', float)
+    detection_rate: int = config.get('detection_rate', int)
+    batch_size: int = config.get('batch_size', int, section='yolo', default=1)
+
+    if config.get('use_roi', bool) and config.get('roi', default='') == '' and config.get('roi_cells', default='') == '':
+        print("Error: processes pipeline requires 'roi' or 'roi_cells' in the configuration.")
+        exit()
+
+    # first frame for the ring shape, the grid and the result images
+    source = config.get('source')
+    video = Video(source)
+    video.open()
+    frame = video.read(downscale=video_downscale)
+    fps = video.fps
+    video.release()
+
+    # the detector holds a whole batch of frames, the decoder needs a slot more to make progress
+    slots = max(config.get('ring_slots', int, section='pipeline', default=16), detection_rate * batch_size + 2)
+    ring = FrameRing(frame.shape, slots, frame.dtype, context)
+    queue_size = config.get('queue_size', int, section='pipeline', default=0)
+    frames = context.Queue(queue_size)
+    detections = context.Queue(queue_size)
+    results = context.Queue()
+
+    processes = [
+        context.Process(target=stage, name='decode', args=(decode, 'decode', results, config_file, source, ring, frames)),
+        context.Process(target=stage, name='detect', args=(detect, 'detect', results, config_file, source, ring, frames, detections)),
+        context.Process(target=stage, name='track', args=(track, 'track', results, config_file, source, ring, detections, directory, database_file, fps, frame)),
+    ]
+
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+
+    summaries = collect(processes, results)
+    total = time.perf_counter() - start
+
+    for process in processes:
+        process.join()
+    ring.close()
+
+    if summaries is None:
+        exit()
+
+    summary, _ = summaries['track']
+    elapsed = max(summary['elapsed'], 1e-9)
+    print(f"Pipeline: {len(processes)} processes - {total:.2f} s including start up and results")
+    print(f"Processed {summary['frames']} frames in {elapsed:.2f} s - {summary['frames'] / elapsed:.2f} frames/s - {summary['detections'] / elapsed:.2f} detections/s")
+    print(f"Frames: {summary['written']} written - {summary['dropped']} dropped")
+    print(f"DB: {summary['rows']} rows - {summary['flushes']} flushes - {summary['flush_latency']:.2f} ms/flush")
+    for name, low, mean, p95, high in summary['metrics']:
+        print(f"{name}: min {low:.2f} - mean {mean:.2f} - p95 {p95:.2f} - max {high:.2f}")
+
+    # stage latencies of every process
+    db = DB(database_file)
+    for _, rows in summaries.values():
+        db.save_metrics_many(rows)
+
+    tracker_errors = [mean for name, _, mean, _, _ in summary['metrics'] if name == 'Tracker Errors']
+    return {
+        'source': source, 'output': directory,
+        'frames': summary['frames'], 'elapsed': elapsed, 'fps': summary['frames'] / elapsed, 'detections': summary['detections'],
+        'tracks': len(db.load_tracking_ids()), 'rows': summary['rows'], 'tracker_error': tracker_errors[0] if len(tracker_errors) > 0 else None,
+    }
@@ -1,61 +1,23 @@
 import argparse
 import glob
-from io import BytesIO
 import os
 import cv2
 import re
 from datetime import datetime
 import numpy as np
 import matplotlib as mpl
-import matplotlib.pyplot as plt
 
+from utils import Plot
 from utils.Grid import Grid
 from utils.Video import Video
 from utils.Config import Config
 from utils.DB import DB
-
-def frame_cell_scores(db_file: str, frame, grid: Grid, color):
-    db = DB(db_file)
-    cell_scores = db.load_cell_scores()
-    cell_scores = {cell[0]: cell[1] for cell in cell_scores}
-    grid._cells = [(cell[0],cell[1],cell[2],cell[3],cell_scores.get(cell[3],0)) for cell in grid._cells]
-
-    blue = np.full((grid.cell_size,grid.cell_size,3), color, np.uint8)
-    frame_scores = frame.copy()
-    for x, y, img, _, score in grid._cells:
-        frame_scores[y:y+grid.cell_size, x:x+grid.cell_size] = cv2.addWeighted(img, 1, blue, score, 0.0)
-
-    return frame_scores
-
-def frame_cell_traffic(db_file, frame, grid: Grid, color):
-    db = DB(db_file)
-    cell_qty = db.load_cell_qty()
-    cell_qty = {cell[0]: cell[1] for cell in cell_qty}
-
-    scale = 1.0/max(cell_qty.values())
-    for k in cell_qty:
-        cell_qty[k] = cell_qty[k] * scale
-    
-    grid._cells = [(cell[0],cell[1],cell[2],cell[3],cell_qty.get(cell[3],0)) for cell in grid._cells]
-
-    green = np.full((grid.cell_size,grid.cell_size,3), color, np.uint8)
-    frame_qty = frame.copy()
-    for x, y, img, _, score in grid._cells:
-        frame_qty[y:y+grid.cell_size, x:x+grid.cell_size] = cv2.addWeighted(img, 1, green, score, 0.0)
-
-    return frame_qty
+from mot.Metrics import frame_cell_scores, frame_cell_traffic
 
 def stats_tracking_duration(db_file):
-    def timestamp_diff_to_sec(timestamp_difference):
-        return int(cv2.getTickFrequency() / timestamp_difference) if timestamp_difference != 0 else 0
-
-
-    buffer = BytesIO()
     db = DB(db_file)
     results = db.load_tracking_duration()
 
-    results = [(row[0], row[1], row[2], timestamp_diff_to_sec(row[3])) for row in results]
-
     '''
     # Print the formatted results
     for row in results:
@@ -71,18 +33,15 @@ def stats_tracking_duration(db_file):
     timestamp_differences = [row[3] for row in results]
 
     # Plot the distribution
-    #plt.hist(timestamp_differences, color='skyblue', edgecolor='black')
-    plt.boxplot(timestamp_differences)
-    plt.title('Distribution of Trackers duration')
-    plt.xlabel('Timestamp Difference (seconds)')
-    plt.ylabel('Frequency')
-    plt.grid(True)
-    #plt.show()
-    plt.savefig(buffer, format='png')
-    plt.clf()
-    buffer.seek(0)
-    time_series_img = np.asarray(bytearray(buffer.read()), dtype=np.uint8)
-    return cv2.imdecode(time_series_img, cv2.IMREAD_COLOR)
+    figure = Plot.figure()
+    axes = figure.subplots()
+    #axes.hist(timestamp_differences, color='skyblue', edgecolor='black')
+    axes.boxplot(timestamp_differences)
+    axes.set_title('Distribution of Trackers duration')
+    axes.set_xlabel('Timestamp Difference (seconds)')
+    axes.set_ylabel('Frequency')
+    axes.grid(True)
+    return Plot.figure_image(figure)
 
 def main(config_file, db_file):
     '''
@@ -0,0 +1,316 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import numpy as np
+import os
+import re
+import sqlite3
+import time
+import traceback
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    import optuna
+except ImportError:
+    optuna = None
+
+from harness import init_worker, make_scenario, run
+from utils.Table import print_table
+
+# tracker settings MultiObjectTracker.make takes as overrides and their types
+PARAMS = {
+    'max_staleness': int,
+    'q_var_pos': float,
+    'r_var_pos': float,
+    'min_iou': float,
+    'multi_match_min_iou': float,
+    'detection_rate': int,
+    'particles': int,
+    'gh_g': float,
+    'gh_h': float,
+    'matching': str,
+}
+
+# metrics that only grow along a run, a constraint on them can fail before the end
+MONOTONE = ['id_switches', 'tracks']
+
+FIELDS = ['trial', 'status', 'meets', 'steps_per_s', 'track_steps_per_s', 'recall', 'id_switches', 'tracks', 'error_mse', 'elapsed', 'params']
+
+def parse_param(spec: str):
+    """ name=v1,v2,... (grid or choice), name=uniform:a:b, name=loguniform:a:b or name=int:a:b """
+    name, _, values = spec.partition('=')
+    if name not in PARAMS:
+        raise ValueError(f"unknown parameter {name}, one of {', '.join(PARAMS)}")
+
+    kind, _, bounds = values.partition(':')
+    if kind in ['uniform', 'loguniform', 'int']:
+        low, high = [float(bound) for bound in bounds.split(':')]
+        return name, (kind, int(low), int(high)) if kind == 'int' else (kind, low, high)
+
+    return name, ('choice', [PARAMS[name](value) for value in values.split(',')])
+
+def parse_target(spec: str):
+    # metric>=value or metric<=value
+    match = re.fullmatch(r'(\w+)\s*(>=|<=)\s*([-\d.eE]+)', spec)
+    if match is None:
+        raise ValueError(f"target {spec} is not metric>=value or metric<=value")
+
+    return match.group(1), match.group(2), float(match.group(3))
+
+def meets(metrics: dict, targets: list) -> bool:
+    for metric, operator, value in targets:
+        if metrics.get(metric) is None:
+            return False
+        if operator == '>=' and metrics[metric] < value or operator == '<=' and metrics[metric] > value:
+            return False
+
+    return True
+
+def grid(space: dict):
+    names = list(space.keys())
+    for values in itertools.product(*[space[name][1] for name in names]):
+        yield dict(zip(names, values))
+
+def sample(space: dict, rng: np.random.Generator) -> dict:
+    params = {}
+    for name, (kind, *args) in space.items():
+        if kind == 'choice':
+            params[name] = args[0][rng.integers(len(args[0]))]
+        elif kind == 'int':
+            params[name] = int(rng.integers(args[0], args[1] + 1))
+        elif kind == 'loguniform':
+            params[name] = float(np.exp(rng.uniform(np.log(args[0]), np.log(args[1]))))
+        else:
+            params[name] = float(rng.uniform(args[0], args[1]))
+
+    return params
+
+def suggest(trial, space: dict) -> dict:
+    params = {}
+    for name, (kind, *args) in space.items():
+        if kind == 'choice':
+            params[name] = trial.suggest_categorical(name, args[0])
+        elif kind == 'int':
+            params[name] = trial.suggest_int(name, args[0], args[1])
+        else:
+            params[name] = trial.suggest_float(name, args[0], args[1], log=kind == 'loguniform')
+
+    return params
+
+def aggregate(results: list) -> dict:
+    # totals over the scenarios, recall and id switches only from the ones with ground truth
+    truth = [result for result in results if result['id_switches'] is not None]
+    elapsed = sum(result['elapsed'] for result in results)
+    errors = [result['error_mse'] for result in results if result['error_mse'] is not None]
+    expected = sum(result['expected'] for result in truth)
+
+    return {
+        'steps': sum(result['steps'] for result in results),
+        'elapsed': elapsed,
+        'steps_per_s': sum(result['steps'] for result in results) / elapsed if elapsed > 0 else None,
+        'track_steps_per_s': sum(result['track_steps'] for result in results) / elapsed if elapsed > 0 else None,
+        'recall': sum(result['matched'] for result in truth) / expected if expected > 0 else None,
+        'id_switches': sum(result['id_switches'] for result in truth) if len(truth) > 0 else None,
+        'tracks': sum(result['tracks'] for result in results),
+        'error_mse': float(np.mean(errors)) if len(errors) > 0 else None,
+    }
+
+def early_stop(targets: list, done: list, warmup: int, margin: float):
+    """ Stops a scenario once a monotone target is exceeded, or the recall after warmup steps is margin below its target """
+    def should_stop(partial: dict) -> bool:
+        totals = aggregate(done + [partial])
+
+        for metric, operator, value in targets:
+            if totals.get(metric) is None:
+                continue
+            if metric in MONOTONE and operator == '<=' and totals[metric] > value:
+                return True
+            if metric == 'recall' and operator == '>=' and partial['steps'] >= warmup and totals[metric] < value - margin:
+                return True
+
+        return False
+
+    return should_stop
+
+SCENARIOS = None
+
+def init_sweep_worker(config_file: str, specs: list):
+    global SCENARIOS
+
+    # scenarios are built once per worker and shared by all its trials
+    init_worker(config_file)
+    SCENARIOS = [make_scenario(spec) for spec in specs]
+
+def trial(preset: str, params: dict, targets: list, warmup: int, margin: float) -> dict:
+    try:
+        results = []
+        for scenario in SCENARIOS:
+            result = run(preset, scenario, params, should_stop=early_stop(targets, results, warmup, margin))
+            results.append(result)
+
+            if result['stopped']:
+                return {**aggregate(results), 'status': 'pruned', 'meets': False}
+
+        metrics = aggregate(results)
+        return {**metrics, 'status': 'done', 'meets': meets(metrics, targets)}
+    except Exception as e:
+        traceback.print_exc()
+        return {'status': 'failed', 'meets': False, 'error': f'{type(e).__name__}: {e}'}
+
+class Trials:
+    """ Results of the trials of every sweep in a sqlite database, a sweep run again skips the parameters it already tried """
+
+    _connection: sqlite3.Connection = None
+    _sweep: str = None
+
+    def __init__(self, path: str, sweep: str):
+        self._connection = sqlite3.connect(path)
+        self._sweep = sweep
+        self._connection.execute("CREATE TABLE IF NOT EXISTS trials (sweep TEXT, preset TEXT, params TEXT, status TEXT, meets INTEGER, steps INTEGER, elapsed REAL, "
+                                 "steps_per_s REAL, track_steps_per_s REAL, recall REAL, id_switches INTEGER, tracks INTEGER, error_mse REAL, error TEXT, "
+                                 "'timestamp' DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        self._connection.commit()
+
+    @staticmethod
+    def key(params: dict) -> str:
+        return json.dumps(params, sort_keys=True)
+
+    def done(self) -> set:
+        rows = self._connection.execute("SELECT params FROM trials WHERE sweep=? AND status!='failed'", (self._sweep,)).fetchall()
+        return {row[0] for row in rows}
+
+    def save(self, preset: str, params: dict, result: dict):
+        self._connection.execute("INSERT INTO trials (sweep, preset, params, status, meets, steps, elapsed, steps_per_s, track_steps_per_s, recall, id_switches, tracks, error_mse, error) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (self._sweep, preset, Trials.key(params), result['status'], int(result['meets']), result.get('steps'), result.get('elapsed'),
+                                  result.get('steps_per_s'), result.get('track_steps_per_s'), result.get('recall'), result.get('id_switches'),
+                                  result.get('tracks'), result.get('error_mse'), result.get('error')))
+        self._connection.commit()
+
+    def results(self) -> list:
+        cursor = self._connection.execute("SELECT rowid AS trial, * FROM trials WHERE sweep=? ORDER BY meets DESC, steps_per_s DESC", (self._sweep,))
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        self._connection.close()
+
+def sweep(config_file: str, name: str, preset: str, space: dict, search: str, trials: int, targets: list, specs: list,
+          workers: int, warmup: int, margin: float, database: str, seed: int, top: int):
+    store = Trials(database, name)
+    done = store.done()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_sweep_worker, initargs=(config_file, specs)) as executor:
+
+        def submit(params: dict):
+            return executor.submit(trial, preset, params, targets, warmup, margin)
+
+        def report(params: dict, result: dict):
+            store.save(preset, params, result)
+            speed = f"{result['steps_per_s']:.2f} steps/s" if result.get('steps_per_s') is not None else result.get('error', '')
+            print(f"{result['status']} {Trials.key(params)}: {speed}{' - meets the target' if result['meets'] else ''}")
+
+        if search == 'optuna':
+            if optuna is None:
+                print("Optuna is not installed, use --search grid or random")
+                exit()
+
+            # fastest config meeting the targets, the ones missing them rank below any of them
+            study = optuna.create_study(direction='maximize', sampler=optuna.samplers.TPESampler(seed=seed))
+            while len(study.trials) < trials:
+                batch = [study.ask() for _ in range(min(workers, trials - len(study.trials)))]
+                futures = [(optuna_trial, suggest(optuna_trial, space)) for optuna_trial in batch]
+                futures = [(optuna_trial, params, submit(params)) for optuna_trial, params in futures]
+
+                for optuna_trial, params, future in futures:
+                    result = future.result()
+                    report(params, result)
+
+                    if result['status'] == 'failed':
+                        study.tell(optuna_trial, state=optuna.trial.TrialState.FAIL)
+                    elif result['status'] == 'pruned':
+                        study.tell(optuna_trial, state=optuna.trial.TrialState.PRUNED)
+                    else:
+                        study.tell(optuna_trial, result['steps_per_s'] if result['meets'] else -1. / (1. + result['steps_per_s']))
+        else:
+            if search == 'grid':
+                candidates = grid(space)
+            else:
+                rng = np.random.default_rng(seed)
+                candidates = (sample(space, rng) for _ in range(trials))
+
+            # skips the parameters tried by a previous run of the same sweep
+            candidates = (params for params in candidates if Trials.key(params) not in done)
+
+            pending = {}
+            for params in candidates:
+                pending[submit(params)] = params
+
+                # at most two trials per worker in flight, random and grid spaces can be large
+                while len(pending) >= workers * 2:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        report(pending.pop(future), future.result())
+
+            for future in list(pending):
+                report(pending.pop(future), future.result())
+
+    results = store.results()
+    store.close()
+
+    print_table(results[:top], FIELDS)
+
+    best = next((result for result in results if result['meets']), None)
+    if best is None:
+        print(f"No trial of sweep {name} meets {' '.join(f'{m}{o}{v:g}' for m, o, v in targets)}")
+        return
+
+    print(f"Fastest trial meeting the target: {best['trial']} - {best['steps_per_s']:.2f} steps/s")
+    print('[general]')
+    print(f"tracker = {preset.lower()}")
+    for param, value in json.loads(best['params']).items():
+        print(f"{param} = {value}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Searches tracker settings over synthetic scenarios and cached detections on a pool of processes')
+    parser.add_argument('--config', type=str, default='config.ini', help='Configuration File, settings not swept are taken from it')
+    parser.add_argument('--name', type=str, default=None, help='Sweep name, a sweep run again resumes where it stopped (preset and search by default)')
+    parser.add_argument('--preset', type=str, default='kalman_batched', help='MultiObjectTracker.make type')
+    parser.add_argument('--param', type=str, nargs='+', required=True, help='name=v1,v2 | name=uniform:a:b | name=loguniform:a:b | name=int:a:b')
+    parser.add_argument('--search', type=str, default='grid', choices=['grid', 'random', 'optuna'], help='Search strategy (optuna is optional)')
+    parser.add_argument('--trials', type=int, default=20, help='Trials of random and optuna searches')
+    parser.add_argument('--target', type=str, nargs='*', default=['recall>=0.8'], help='Accuracy targets as metric>=value or metric<=value')
+    parser.add_argument('--objects', type=int, nargs='*', default=[20], help='Objects per synthetic scenario')
+    parser.add_argument('--steps', type=int, default=300, help='Steps per synthetic scenario')
+    parser.add_argument('--seeds', type=int, default=1, help='Synthetic scenarios per object count')
+    parser.add_argument('--caches', type=str, nargs='*', default=[], help='Detection cache entries (directories) to replay, speed and error only')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--warmup', type=int, default=100, help='Steps before a low recall stops a trial')
+    parser.add_argument('--margin', type=float, default=0.05, help='Recall below its target by more than this stops a trial')
+    parser.add_argument('--database', type=str, default='sweep.db', help='Trials database')
+    parser.add_argument('--seed', type=int, default=0, help='Random and optuna search seed')
+    parser.add_argument('--top', type=int, default=10, help='Trials shown at the end')
+
+    args = parser.parse_args()
+
+    try:
+        space = dict(parse_param(spec) for spec in args.param)
+        targets = [parse_target(spec) for spec in args.target]
+    except ValueError as e:
+        print(e)
+        exit()
+
+    if args.search == 'grid' and any(kind != 'choice' for kind, *_ in space.values()):
+        print("Grid search takes lists of values only (name=v1,v2)")
+        exit()
+
+    specs = [{'type': 'synthetic', 'objects': count, 'steps': args.steps, 'seed': seed} for count in args.objects for seed in range(args.seeds)]
+    specs += [{'type': 'recorded', 'path': path} for path in args.caches]
+
+    start = time.perf_counter()
+    sweep(args.config, args.name or f'{args.preset}-{args.search}', args.preset.upper(), space, args.search, args.trials, targets, specs,
+          args.workers, args.warmup, args.margin, args.database, args.seed, args.top)
+    print(f"Sweep done in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,130 @@
+import numpy as np
+import os
+import sqlite3
+
+from numpy.lib.format import open_memmap
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET = 'parquet'
+NPY = 'npy'
+
+# query and typed columns of each exported table, NULL integers become -1, NULL text '' and NULL reals NaN
+TABLES = {
+    'tracks': ("SELECT tracker, x, y, dx, dy, IFNULL(cell, -1) AS cell, frame, IFNULL(roi, '') AS roi, score, timestamp FROM tracks",
+               [('tracker', np.int32), ('x', np.int32), ('y', np.int32), ('dx', np.float32), ('dy', np.float32), ('cell', np.int32),
+                ('frame', np.int32), ('roi', str), ('score', np.float32), ('timestamp', np.float64)]),
+    'trackers': ("SELECT id, uuid FROM trackers",
+                 [('id', np.int32), ('uuid', str)]),
+    'metrics': ("SELECT metric, CAST(value AS REAL) AS value, frame, CAST(strftime('%s', timestamp) AS INTEGER) AS timestamp FROM metrics",
+                [('metric', str), ('value', np.float64), ('frame', np.int32), ('timestamp', np.int64)]),
+}
+
+def default_format() -> str:
+    return PARQUET if pa is not None else NPY
+
+def chunks(db: sqlite3.Connection, table: str, chunk_size: int):
+    # rows are fetched chunk_size at a time and turned into one typed array per column
+    query, columns = TABLES[table]
+    cursor = db.execute(query)
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if len(rows) == 0:
+            break
+
+        yield {name: np.array(values, dtype=type) for (name, type), values in zip(columns, zip(*rows))}
+
+def export_parquet(db: sqlite3.Connection, table: str, output: str, chunk_size: int):
+    path = os.path.join(output, table + '.parquet')
+    writer = None
+
+    for chunk in chunks(db, table, chunk_size):
+        batch = pa.table(chunk)
+
+        if writer is None:
+            writer = pq.ParquetWriter(path, batch.schema)
+        writer.write_table(batch)
+
+    # empty tables keep their columns
+    if writer is None:
+        _, columns = TABLES[table]
+        writer = pq.ParquetWriter(path, pa.table({name: np.array([], dtype=type) for name, type in columns}).schema)
+
+    writer.close()
+
+def export_npy(db: sqlite3.Connection, table: str, output: str, chunk_size: int, compress: bool = False):
+    # one .npy per column, sized from the row count and filled chunk by chunk
+    query, columns = TABLES[table]
+    rows = db.execute(f"SELECT COUNT(1) FROM ({query})").fetchone()[0]
+    directory = os.path.join(output, table)
+    os.makedirs(directory, exist_ok=True)
+
+    arrays = {}
+    for name, type in columns:
+        if type is str:
+            width = db.execute(f"SELECT MAX(LENGTH({name})) FROM ({query})").fetchone()[0]
+            type = f'<U{max(width or 0, 1)}'
+        arrays[name] = open_memmap(os.path.join(directory, name + '.npy'), mode='w+', dtype=type, shape=(rows,))
+
+    start = 0
+    for chunk in chunks(db, table, chunk_size):
+        end = start + len(next(iter(chunk.values())))
+        for name, values in chunk.items():
+            arrays[name][start:end] = values
+        start = end
+
+    for array in arrays.values():
+        array.flush()
+
+    # numpy writes each array into the archive in buffered pieces
+    if compress:
+        np.savez_compressed(os.path.join(output, table + '.npz'), **arrays)
+
+def export_run(db_file: str, output: str, format: str = None, chunk_size: int = 100000, compress: bool = False):
+    format = format if format is not None else default_format()
+
+    if format == PARQUET and pa is None:
+        print("Error: parquet export requires pyarrow.")
+        exit()
+
+    os.makedirs(output, exist_ok=True)
+    db = sqlite3.connect(db_file)
+
+    for table in TABLES:
+        if format == PARQUET:
+            export_parquet(db, table, output, chunk_size)
+        else:
+            export_npy(db, table, output, chunk_size, compress)
+
+    db.close()
+
+def load_run(path: str) -> dict:
+    """ Exported tables as {table: {column: array}}, .npy columns are memory mapped and parquet files read through a memory map """
+
+    tables = {}
+
+    for table in TABLES:
+        parquet = os.path.join(path, table + '.parquet')
+        directory = os.path.join(path, table)
+        archive = os.path.join(path, table + '.npz')
+
+        if os.path.exists(parquet):
+            if pq is None:
+                print("Error: parquet files require pyarrow.")
+                exit()
+
+            data = pq.read_table(parquet, memory_map=True)
+            tables[table] = {name: data.column(name).to_numpy() for name in data.column_names}
+        elif os.path.isdir(directory):
+            tables[table] = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name, _ in TABLES[table][1]}
+        elif os.path.exists(archive):
+            # compressed archives cannot be mapped, each column is inflated on first access
+            tables[table] = np.load(archive)
+
+    return tables
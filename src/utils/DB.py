@@ -1,8 +1,29 @@
 import sqlite3
 
+# PRAGMA user_version of the current schema, 0 is the original one with stringified tuples
+SCHEMA_VERSION = 1
+
+def split_pair(pair):
+    return (None, None) if pair is None else (int(pair[0]), int(pair[1]))
+
+def track_row(tracker, position, direction, cell, frame, roi, score, timestamp):
+    # numpy scalars would be stored as blobs
+    score = float(score) if score is not None else None
+    return (tracker, *split_pair(position), *split_pair(direction), cell, frame, roi, score, timestamp)
+
+def create_schema(c):
+    # tracker uuids are stored once, tracks and their index reference them by integer id
+    c.execute("CREATE TABLE IF NOT EXISTS trackers (id INTEGER PRIMARY KEY, uuid TEXT UNIQUE)")
+    c.execute("CREATE TABLE IF NOT EXISTS tracks (tracker INTEGER, x INTEGER, y INTEGER, dx INTEGER, dy INTEGER, cell INTEGER, frame INTEGER, roi TEXT, score REAL, 'timestamp' REAL)")
+    c.execute("CREATE INDEX IF NOT EXISTS tracks_tracker_frame ON tracks (tracker, frame)")
+    c.execute("CREATE INDEX IF NOT EXISTS tracks_cell ON tracks (cell)")
+    c.execute("CREATE TABLE IF NOT EXISTS metrics (metric TEXT, value TEXT, frame INTEGER, 'timestamp' DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    c.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
 class DB:
     _instance = None
     _db = None
+    _trackers: dict = None
 
     def __init__(self, path:str = None) -> None:
         if path is None:
@@ -10,31 +31,80 @@ class DB:
             exit(0)
 
         self._db = sqlite3.connect(path)
+        self._trackers = {}
         
         c = self._db.cursor()
-        c.execute("CREATE TABLE IF NOT EXISTS tracks (tracker TEXT, position TEXT, direction TEXT, cell INTEGER, frame INTEGER, roi TEXT, score REAL, 'timestamp' INTEGER)")
-        c.execute("CREATE TABLE IF NOT EXISTS metrics (metric TEXT, value TEXT, frame INTEGER, 'timestamp' DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+
+        if self.version() != SCHEMA_VERSION and self.has_table('tracks'):
+            print(f"Error: {path} uses schema version {self.version()}, run src/migrate.py {path}")
+            exit()
+
+        self.create()
+
+    def version(self) -> int:
+        c = self._db.cursor()
+        c.execute("PRAGMA user_version")
+        return c.fetchone()[0]
+
+    def has_table(self, table: str) -> bool:
+        c = self._db.cursor()
+        c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+        return c.fetchone() is not None
+
+    def create(self):
+        create_schema(self._db.cursor())
         self._db.commit()
+
+    @property
+    def connection(self):
+        return self._db
     
     def __del__(self):
         self._db.close()
     
     def save_track(self, tracker, position, direction, cell, frame, roi, score, timestamp):
+        self.save_tracks([(tracker, position, direction, cell, frame, roi, score, timestamp)])
+
+    def save_tracks(self, rows):
+        # position and direction are (x, y) pairs, direction is None on the first step of a track
         c = self._db.cursor()
-        c.execute("INSERT INTO tracks (tracker, position, direction, cell, frame, roi, score, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (tracker, str(position), str(direction), cell, frame, roi, score, timestamp))
+        c.executemany("INSERT INTO tracks (tracker, x, y, dx, dy, cell, frame, roi, score, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                      [track_row(self.tracker_id(tracker), *row) for tracker, *row in rows])
         self._db.commit()
 
+    def tracker_id(self, uuid) -> int:
+        if uuid not in self._trackers:
+            c = self._db.cursor()
+            c.execute("INSERT OR IGNORE INTO trackers (uuid) VALUES (?)", (str(uuid),))
+            c.execute("SELECT id FROM trackers WHERE uuid=?", (str(uuid),))
+            self._trackers[uuid] = c.fetchone()[0]
+
+        return self._trackers[uuid]
+
     def save_metrics(self, metric, frame, value):
         c = self._db.cursor()
         c.execute("INSERT INTO metrics (metric, frame, value) VALUES (?, ?, ?)", (metric, frame, value))
         self._db.commit()
 
+    def save_metrics_many(self, rows):
+        c = self._db.cursor()
+        c.executemany("INSERT INTO metrics (metric, frame, value) VALUES (?, ?, ?)", rows)
+        self._db.commit()
+
     def load_cell_scores(self):
         c = self._db.cursor()
         c.execute("SELECT cell, avg(score) as score FROM tracks WHERE score > 0 GROUP BY cell")
 
         return [row for row in c.fetchall()]
     
+    def load_cell_stats(self):
+        c = self._db.cursor()
+        c.execute("SELECT cell, count(1) as qty, sum(score > 0) as scored, sum(CASE WHEN score > 0 THEN score ELSE 0 END) as score_sum FROM tracks GROUP BY cell")
+
+        return [row for row in c.fetchall()]
+
     def load_cell_qty(self):
         c = self._db.cursor()
         c.execute("SELECT cell, count(1) as qty FROM tracks GROUP BY cell")
@@ -63,7 +133,7 @@ class DB:
         c = self._db.cursor()
 
         # Execute query to fetch distinct tracking IDs
-        c.execute("SELECT DISTINCT tracker FROM roi_tracks")
+        c.execute("SELECT DISTINCT tracker FROM tracks")
 
         return [row[0] for row in c.fetchall()]
     
@@ -71,5 +141,5 @@ class DB:
         c = self._db.cursor()
 
         # Retrieve points for the current tracking ID
-        c.execute("SELECT * FROM roi_tracks WHERE tracker=? ORDER BY timestamp", (tracker,))
+        c.execute("SELECT x, y, cell, frame FROM tracks WHERE tracker=? ORDER BY frame", (tracker,))
         return c.fetchall()
@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+
+from utils.DB import DB
+from utils.Profiler import Profiler
+
+TRACKS = 'tracks'
+METRICS = 'metrics'
+METRICS_MANY = 'metrics_many'
+
+PROFILER = Profiler()
+
+class DBWriter:
+    """ Single connection writer, buffers rows and flushes them in bulk on a size or time basis """
+
+    _path: str = None
+    _thread: threading.Thread = None
+    _events: queue.Queue = None
+    _on_flush: callable = None
+    _batch_size: int = 500
+    _flush_interval: float = 1.
+    _step: int = 0
+    _rows: int = 0
+    _flushes: int = 0
+    _flush_time: float = 0.
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1., on_flush: callable = None):
+        self._path = path
+        self._events = queue.Queue()
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._on_flush = on_flush
+
+    def save_track(self, tracker, position, direction, cell, frame, roi, score, timestamp):
+        self._events.put((TRACKS, (tracker, position, direction, cell, frame, roi, score, timestamp)))
+
+    def save_metrics(self, metric, frame, value):
+        self._events.put((METRICS, (metric, frame, value)))
+
+    def save_metrics_many(self, rows):
+        # a whole block of (metric, frame, value) rows travels as one queue item
+        if len(rows) > 0:
+            self._events.put((METRICS_MANY, rows))
+
+    def listen_events(self, events: queue.Queue):
+        # sqlite connections must be used on the thread that created them
+        db = DB(self._path)
+        buffers = {TRACKS: [], METRICS: []}
+        pending = 0
+        deadline = time.monotonic() + self._flush_interval
+
+        while True:
+            try:
+                event = events.get(timeout=max(0., deadline - time.monotonic()))
+            except queue.Empty:
+                event = ()
+
+            if event is None:
+                break
+
+            if len(event) > 0 and event[0] == METRICS_MANY:
+                _, rows = event
+                buffers[METRICS].extend(rows)
+                pending += len(rows)
+                self._step = rows[-1][1]
+            elif len(event) > 0:
+                table, row = event
+                buffers[table].append(row)
+                pending += 1
+                self._step = row[4] if table == TRACKS else row[1]
+
+            if pending >= self._batch_size or time.monotonic() >= deadline:
+                self._flush(db, buffers)
+                pending = 0
+                deadline = time.monotonic() + self._flush_interval
+
+        self._flush(db, buffers)
+
+        # rows queued while stopping, metric blocks sent from on_flush among them
+        while not events.empty():
+            table, rows = events.get()
+            if table == METRICS_MANY:
+                buffers[METRICS].extend(rows)
+            else:
+                buffers[table].append(rows)
+            self._flush(db, buffers)
+
+    def _flush(self, db: DB, buffers: dict):
+        rows = len(buffers[TRACKS]) + len(buffers[METRICS])
+        if rows == 0:
+            return
+
+        start = time.perf_counter_ns()
+        if len(buffers[TRACKS]) > 0:
+            db.save_tracks(buffers[TRACKS])
+        if len(buffers[METRICS]) > 0:
+            db.save_metrics_many(buffers[METRICS])
+        elapsed = time.perf_counter_ns() - start
+        latency = elapsed / 1e6
+        PROFILER.record('db write', elapsed)
+
+        buffers[TRACKS] = []
+        buffers[METRICS] = []
+
+        self._rows += rows
+        self._flushes += 1
+        self._flush_time += latency
+
+        if self._on_flush is not None:
+            self._on_flush(self.depth, latency, self._step)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.listen_events, args=(self._events,))
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._events.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def flush_metrics(self, metrics: list, rows: list = None) -> DB:
+        """ Stops the writer and writes the metric rows not flushed yet, and any extra rows, on a connection of the calling thread """
+        self.stop()
+
+        db = DB(self._path)
+        for metric in metrics:
+            metric.flush(db.save_metrics_many)
+        if rows is not None and len(rows) > 0:
+            db.save_metrics_many(rows)
+
+        return db
+
+    @property
+    def depth(self):
+        return self._events.qsize()
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @property
+    def flushes(self):
+        return self._flushes
+
+    @property
+    def flush_latency(self):
+        return self._flush_time / self._flushes if self._flushes > 0 else 0.
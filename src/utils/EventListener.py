@@ -1,30 +1,60 @@
 import queue
 import threading
 
+from utils.EventQueue import EventQueue
+
 class EventListener:
-    _thread: threading.Thread = None
+    """ Worker threads handling the events of a queue, taking up to batch_size of them at once """
+
+    _threads: list = None
     _events: queue.Queue = None
     _on_event: callable = None
+    _workers: int = 1
+    _batch_size: int = 1
 
-    def __init__(self, on_event: callable, events: queue.Queue):
+    def __init__(self, on_event: callable, events: queue.Queue, workers: int = 1, batch_size: int = 1):
         self._on_event = on_event
         self._events = events
+        self._workers = max(1, workers)
+        self._batch_size = max(1, batch_size)
+        self._threads = []
+
+    def drain(self, events: queue.Queue) -> list:
+        if isinstance(events, EventQueue):
+            return events.get_many(self._batch_size)
+
+        batch = [events.get()]
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(events.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
 
     def listen_events(self, events: queue.Queue):
         while True:
-            event = events.get()
+            batch = self.drain(events)
 
-            if event is None:
-                break
+            for index, event in enumerate(batch):
+                if event is None:
+                    # stop events drained for the other workers go back to the queue
+                    for _ in range(batch[index + 1:].count(None)):
+                        events.put(None)
+                    return
 
-            self._on_event(event)
+                self._on_event(event)
 
     def start(self):
-        if self._thread is None:
-            self._thread = threading.Thread(target=self.listen_events, args=(self._events,))
-            self._thread.start()
+        if len(self._threads) == 0:
+            self._threads = [threading.Thread(target=self.listen_events, args=(self._events,)) for _ in range(self._workers)]
+            for thread in self._threads:
+                thread.start()
     
     def stop(self):
-        if self._thread is not None:
+        for _ in self._threads:
             self._events.put(None)
-            self._thread.join()
\ No newline at end of file
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
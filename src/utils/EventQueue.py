@@ -0,0 +1,119 @@
+import queue
+import time
+
+from collections import OrderedDict
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+
+class EventQueue(queue.Queue):
+    """ Bounded queue with a policy for puts on a full queue, the None stop event always goes through """
+
+    _policy: str = BLOCK
+    _key: callable = None
+    _merge: callable = None
+    _dropped: int = 0
+    _coalesced: int = 0
+    _sentinels: int = 0
+
+    def __init__(self, maxsize: int = 0, policy: str = BLOCK, key: callable = None, merge: callable = None):
+        self._policy = policy.lower()
+        self._key = key
+        self._merge = merge if merge is not None else lambda old, new: new
+
+        if self._policy == COALESCE and key is None:
+            print("Error: coalesce policy requires a key.")
+            exit()
+
+        super(EventQueue, self).__init__(maxsize)
+
+    # storage: events by key when coalescing, otherwise the default deque
+    def _init(self, maxsize):
+        super(EventQueue, self)._init(maxsize)
+        if self._policy == COALESCE:
+            self.queue = OrderedDict()
+
+    def _put(self, item):
+        if self._policy != COALESCE:
+            self.queue.append(item)
+            return
+
+        # stop events are never merged
+        if item is None:
+            self._sentinels += 1
+            self.queue[('stop', self._sentinels)] = None
+            return
+
+        self.queue[self._key(item)] = item
+
+    def _get(self):
+        if self._policy != COALESCE:
+            return self.queue.popleft()
+
+        return self.queue.popitem(last=False)[1]
+
+    def put(self, item, block: bool = True, timeout: float = None):
+        with self.not_full:
+            # an event of the same key is still waiting, bounded queue or not: merge into it and keep its place, no new task
+            if item is not None and self._policy == COALESCE:
+                key = self._key(item)
+
+                if key in self.queue:
+                    self.queue[key] = self._merge(self.queue[key], item)
+                    self._coalesced += 1
+                    return
+
+            if item is not None and self.maxsize > 0:
+                if self._policy == DROP_OLDEST:
+                    while self._qsize() >= self.maxsize:
+                        self._get()
+                        self._dropped += 1
+                        self.unfinished_tasks -= 1
+                else:
+                    self._wait_not_full(block, timeout)
+
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _wait_not_full(self, block: bool, timeout: float):
+        # queue.Queue.put waiting logic, the lock is already held
+        if not block:
+            if self._qsize() >= self.maxsize:
+                raise queue.Full
+        elif timeout is None:
+            while self._qsize() >= self.maxsize:
+                self.not_full.wait()
+        else:
+            deadline = time.monotonic() + timeout
+            while self._qsize() >= self.maxsize:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0.0:
+                    raise queue.Full
+                self.not_full.wait(remaining)
+
+    def get_many(self, max_items: int) -> list:
+        """ Waits for one event and takes up to max_items of them under a single lock """
+        with self.not_empty:
+            while not self._qsize():
+                self.not_empty.wait()
+
+            items = []
+            while self._qsize() and len(items) < max_items:
+                items.append(self._get())
+
+            self.not_full.notify(len(items))
+            return items
+
+    @property
+    def depth(self):
+        return self.qsize()
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    @property
+    def coalesced(self):
+        return self._coalesced
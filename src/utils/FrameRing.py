@@ -0,0 +1,77 @@
+import multiprocessing
+import numpy as np
+
+from multiprocessing import shared_memory
+
+class FrameRing:
+    """ Slots of same shaped frames in shared memory, processes hand them over by slot index """
+
+    _shape: tuple = None
+    _dtype: np.dtype = None
+    _slots: int = 0
+    _memory: shared_memory.SharedMemory = None
+    _frames: np.ndarray = None
+    _free = None
+    _owner: bool = False
+
+    def __init__(self, shape: tuple, slots: int = 8, dtype = np.uint8, context = None):
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._slots = slots
+        self._owner = True
+
+        size = int(np.prod(self._shape)) * self._dtype.itemsize * slots
+        self._memory = shared_memory.SharedMemory(create=True, size=size)
+        self._frames = np.ndarray((slots, *self._shape), dtype=self._dtype, buffer=self._memory.buf)
+
+        # every slot starts free, the index goes back here once the last stage is done with the frame
+        context = context if context is not None else multiprocessing.get_context()
+        self._free = context.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+    def __getstate__(self):
+        # only the block name travels, the child process attaches to it
+        return {'name': self._memory.name, 'shape': self._shape, 'dtype': self._dtype.str, 'slots': self._slots, 'free': self._free}
+
+    def __setstate__(self, state):
+        self._shape = state['shape']
+        self._dtype = np.dtype(state['dtype'])
+        self._slots = state['slots']
+        self._free = state['free']
+        self._owner = False
+
+        # child processes share the resource tracker of the creator, which unlinks the block
+        self._memory = shared_memory.SharedMemory(name=state['name'])
+        self._frames = np.ndarray((self._slots, *self._shape), dtype=self._dtype, buffer=self._memory.buf)
+
+    def acquire(self) -> int:
+        """ Waits for a free slot """
+        return self._free.get()
+
+    def release(self, slot: int):
+        self._free.put(slot)
+
+    def view(self, slot: int) -> np.ndarray:
+        # no copy: valid until the slot is released
+        return self._frames[slot]
+
+    def write(self, frame: np.ndarray) -> int:
+        slot = self.acquire()
+        self._frames[slot][...] = frame
+        return slot
+
+    def close(self):
+        self._frames = None
+        self._memory.close()
+
+        if self._owner:
+            self._memory.unlink()
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def slots(self):
+        return self._slots
@@ -0,0 +1,164 @@
+import cv2
+import os
+import queue
+import threading
+
+from abc import ABC, abstractmethod
+from utils.Profiler import Profiler
+
+PROFILER = Profiler()
+
+BLOCK = 'block'
+DROP = 'drop'
+
+class FrameSink(ABC):
+    """ Writes annotated frames on its own workers behind a bounded queue """
+
+    _threads: list = None
+    _events: queue.Queue = None
+    _workers: int = 1
+    _policy: str = DROP
+    _every: int = 1
+    _written: int = 0
+    _dropped: int = 0
+    _lock: threading.Lock = None
+
+    def __init__(self, workers: int = 1, maxsize: int = 64, policy: str = DROP, every: int = 1):
+        self._threads = []
+        self._lock = threading.Lock()
+        self._events = queue.Queue(maxsize=maxsize)
+        self._workers = workers
+        self._policy = policy
+        self._every = max(1, every)
+
+    def write(self, frame, step: int):
+        if frame is None or step % self._every != 0:
+            return
+
+        if self._policy == BLOCK:
+            self._events.put((frame, step))
+            return
+
+        try:
+            self._events.put_nowait((frame, step))
+        except queue.Full:
+            self._dropped += 1
+
+    @abstractmethod
+    def _write(self, frame, step: int):
+        """ Writes one frame, on a worker thread """
+
+    def _close(self):
+        pass
+
+    def listen_events(self, events: queue.Queue):
+        while True:
+            event = events.get()
+
+            if event is None:
+                break
+
+            with PROFILER.stage('frame write'):
+                self._write(*event)
+
+            # several workers count the frames they write
+            with self._lock:
+                self._written += 1
+
+    def start(self):
+        if len(self._threads) == 0:
+            self._threads = [threading.Thread(target=self.listen_events, args=(self._events,)) for _ in range(self._workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self):
+        for _ in self._threads:
+            self._events.put(None)
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+        self._close()
+
+    @property
+    def enabled(self):
+        return True
+
+    @property
+    def written(self):
+        return self._written
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    @staticmethod
+    def make(type: str, directory: str, fps: float, every: int = 1, workers: int = 1, maxsize: int = 64, policy: str = DROP):
+        type = type.upper()
+
+        if type == 'IMAGES':
+            return ImageFrameSink(directory + '/frames', workers=workers, maxsize=maxsize, policy=policy, every=every)
+        elif type == 'VIDEO':
+            return VideoFrameSink(directory + '/frames.mp4', fps / max(1, every), maxsize=maxsize, policy=policy, every=every)
+
+        return NullFrameSink()
+
+class NullFrameSink(FrameSink):
+    """ Discards every frame """
+
+    def write(self, frame, step: int):
+        pass
+
+    def _write(self, frame, step: int):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @property
+    def enabled(self):
+        return False
+
+class ImageFrameSink(FrameSink):
+    """ Writes each frame as a jpg file named after its step """
+
+    _path: str = None
+
+    def __init__(self, path: str, **kwargs):
+        super(ImageFrameSink, self).__init__(**kwargs)
+
+        self._path = path
+        os.makedirs(self._path, exist_ok=True)
+
+    def _write(self, frame, step: int):
+        cv2.imwrite(self._path + f'/{step}.jpg', frame)
+
+class VideoFrameSink(FrameSink):
+    """ Encodes every frame into a single video file """
+
+    _path: str = None
+    _fps: float = 0
+    _writer: cv2.VideoWriter = None
+
+    def __init__(self, path: str, fps: float, **kwargs):
+        # frames must reach the encoder in order, so a single worker is used
+        kwargs['workers'] = 1
+        super(VideoFrameSink, self).__init__(**kwargs)
+
+        self._path = path
+        self._fps = fps
+
+    def _write(self, frame, step: int):
+        if self._writer is None:
+            height, width = frame.shape[:2]
+            self._writer = cv2.VideoWriter(self._path, cv2.VideoWriter_fourcc(*'mp4v'), self._fps, (width, height))
+
+        self._writer.write(frame)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
@@ -1,8 +1,13 @@
 import cv2
+import math
+import numpy as np
 
 class Grid:
     _cells = None
     _cell_size = None
+    _rows = 0
+    _cols = 0
+    _origins = None
 
     def __init__(self, cell_size: int):
         self._cells = []
@@ -18,37 +23,59 @@ class Grid:
                 self._cells.append((x, y, frame_part, id, 0))
                 id += 1
 
+        # cells are stored row by row, so id = row * cols + col
+        self._rows = -(-height // self._cell_size)
+        self._cols = -(-width // self._cell_size)
+        self._origins = np.array([(cell[0], cell[1]) for cell in self._cells], dtype=np.int32).reshape(-1, 2)
+
         print(f"Source: {height}x{width} - Cell Size: {self._cell_size}x{self._cell_size} - Cells: {len(self._cells)}")
         return self._cells
-    
+
     def plot(self, frame):
         for x, y, _, _, _ in self._cells:
             cv2.rectangle(frame, (x, y), (x + self._cell_size, y + self._cell_size), (255,255,255), 1)
         return frame
-    
+
     def cell(self, id):
-        cells = [cell for cell in self._cells if cell[3] == id]
+        if id is None or id < 0 or id >= len(self._cells):
+            return None
+
+        return self._cells[id]
+
+    def cell_id(self, point: tuple):
+        # cells are half open, [x, x + cell_size), and floored like in_cells so negative points fall outside
+        col = math.floor(point[0] / self._cell_size)
+        row = math.floor(point[1] / self._cell_size)
+
+        if 0 <= col < self._cols and 0 <= row < self._rows:
+            return row * self._cols + col
 
-        if len(cells) == 1:
-            return cells[0]
-        
         return None
-    
+
     def in_cell(self, point: tuple):
-        for cell in self._cells:
-            x, y, _, _, _ = cell
-            cell_end_x = x + self.cell_size
-            cell_end_y = y + self.cell_size
-            
-            if x <= point[0] <= cell_end_x and y <= point[1] <= cell_end_y:
-                return cell
+        return self.cell(self.cell_id(point))
+
+    def in_cells(self, points: np.ndarray) -> np.ndarray:
+        # points (N, 2) -> cell ids (N,), -1 when the point is outside the grid
+        points = np.asarray(points).reshape(-1, 2)
+        cols = np.floor_divide(points[:, 0], self._cell_size).astype(np.int64)
+        rows = np.floor_divide(points[:, 1], self._cell_size).astype(np.int64)
+        inside = (cols >= 0) & (cols < self._cols) & (rows >= 0) & (rows < self._rows)
+
+        return np.where(inside, rows * self._cols + cols, -1)
 
-        return None
-    
     @property
     def cells(self):
         return self._cells
 
     @property
     def cell_size(self):
-        return self._cell_size
\ No newline at end of file
+        return self._cell_size
+
+    @property
+    def shape(self):
+        return (self._rows, self._cols)
+
+    @property
+    def origins(self):
+        return self._origins
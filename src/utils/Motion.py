@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+from utils.Grid import Grid
+
+class Motion:
+    """ Motion energy of each grid cell: mean absolute difference between consecutive grayscale frames, on a downsampled copy """
+
+    _grid: Grid = None
+    _cell: int = 1
+    _factor: float = 1.
+    _previous: np.ndarray = None
+    _counts: np.ndarray = None
+    _energy: np.ndarray = None
+
+    def __init__(self, grid: Grid, scale: float = 0.25):
+        self._grid = grid
+
+        # whole pixels per cell on the downsampled frame, the cells stay aligned with the grid
+        self._cell = max(1, round(grid.cell_size * scale))
+        self._factor = self._cell / grid.cell_size
+        self._energy = np.zeros(grid.shape, dtype=np.float32)
+
+    def cells(self, image: np.ndarray) -> np.ndarray:
+        # per cell sums of a downsampled image, the border cells only hold the pixels inside the frame
+        rows, cols = self._grid.shape
+        padded = np.zeros((rows * self._cell, cols * self._cell), dtype=np.float32)
+        padded[:image.shape[0], :image.shape[1]] = image
+
+        return padded.reshape(rows, self._cell, cols, self._cell).sum(axis=(1, 3))
+
+    def update(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        size = (max(1, round(width * self._factor)), max(1, round(height * self._factor)))
+        gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), size, interpolation=cv2.INTER_AREA)
+
+        # no energy on the first frame or after a change of size
+        if self._previous is None or self._previous.shape != gray.shape:
+            self._previous = gray
+            self._counts = np.maximum(self.cells(np.ones(gray.shape, dtype=np.float32)), 1)
+            self._energy = np.zeros(self._grid.shape, dtype=np.float32)
+            return self._energy
+
+        self._energy = self.cells(cv2.absdiff(gray, self._previous)) / self._counts
+        self._previous = gray
+
+        return self._energy
+
+    def untracked(self, boxes: np.ndarray) -> float:
+        """ Peak energy of the cells no box overlaps, motion of objects not tracked yet """
+        free = np.ones(self._grid.shape, dtype=bool)
+        cells = np.floor_divide(np.asarray(boxes, dtype=float).reshape(-1, 4), self._grid.cell_size).astype(np.int64)
+
+        for x1, y1, x2, y2 in cells:
+            free[max(y1, 0):max(y2 + 1, 0), max(x1, 0):max(x2 + 1, 0)] = False
+
+        return float(self._energy[free].max()) if free.any() else 0.
+
+    @property
+    def cell_size(self):
+        return self._grid.cell_size
+
+    @property
+    def energy(self):
+        return self._energy
+
+    @property
+    def peak(self):
+        return float(self._energy.max()) if self._energy.size > 0 else 0.
@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# matplotlib default cycle colors as BGR
+COLORS = [(180, 119, 31), (14, 127, 255), (44, 160, 44), (40, 39, 214)]
+
+MARGIN_LEFT = 60
+MARGIN_RIGHT = 15
+MARGIN_TOP = 15
+MARGIN_BOTTOM = 40
+TICKS = 5
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+def figure() -> Figure:
+    # a figure with its own Agg canvas, nothing is registered on pyplot's global state
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    return figure
+
+def figure_image(figure: Figure) -> np.ndarray:
+    # the Agg canvas pixels as a BGR image, without encoding
+    figure.canvas.draw()
+    return cv2.cvtColor(np.asarray(figure.canvas.buffer_rgba()), cv2.COLOR_RGBA2BGR)
+
+def axis_range(values: list, low=None, high=None):
+    finite = [v[np.isfinite(v)] for v in values]
+    finite = np.concatenate(finite) if len(finite) > 0 else np.empty(0)
+
+    low = low if low is not None else (finite.min() if finite.size > 0 else 0.)
+    high = high if high is not None else (finite.max() if finite.size > 0 else 1.)
+
+    if high <= low:
+        high = low + 1.
+
+    return float(low), float(high)
+
+def tick_label(value: float) -> str:
+    return f"{value:.0f}" if abs(value) >= 100 or value == int(value) else f"{value:.2f}"
+
+def render_series(series: list, width: int = 640, height: int = 480, y_min=None, y_max=None, xlabel: str = 'Frame', ylabel: str = '') -> np.ndarray:
+    """ Line chart of [(steps, values, label), ...] drawn straight into an OpenCV image """
+
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    left, top = MARGIN_LEFT, MARGIN_TOP
+    right, bottom = width - MARGIN_RIGHT, height - MARGIN_BOTTOM
+
+    series = [(np.asarray(steps, dtype=np.float64), np.asarray(values, dtype=np.float64), label) for steps, values, label in series]
+    x_low, x_high = axis_range([steps for steps, _, _ in series])
+    y_low, y_high = axis_range([values for _, values, _ in series], y_min, y_max)
+
+    # axes, ticks and labels
+    cv2.rectangle(image, (left, top), (right, bottom), (0, 0, 0), 1)
+
+    for tick in np.linspace(0., 1., TICKS):
+        x = int(left + tick * (right - left))
+        y = int(bottom - tick * (bottom - top))
+        cv2.line(image, (x, bottom), (x, bottom + 4), (0, 0, 0), 1)
+        cv2.line(image, (left - 4, y), (left, y), (0, 0, 0), 1)
+        cv2.putText(image, tick_label(x_low + tick * (x_high - x_low)), (x - 12, bottom + 16), FONT, 0.35, (0, 0, 0), 1, cv2.LINE_AA)
+        cv2.putText(image, tick_label(y_low + tick * (y_high - y_low)), (4, y + 4), FONT, 0.35, (0, 0, 0), 1, cv2.LINE_AA)
+
+    cv2.putText(image, xlabel, ((left + right) // 2 - 20, height - 8), FONT, 0.45, (0, 0, 0), 1, cv2.LINE_AA)
+    cv2.putText(image, ylabel, (left + 6, top + 16), FONT, 0.45, (0, 0, 0), 1, cv2.LINE_AA)
+
+    # all points of a series are mapped to pixels at once
+    for index, (steps, values, label) in enumerate(series):
+        color = COLORS[index % len(COLORS)]
+        keep = np.isfinite(steps) & np.isfinite(values)
+
+        xs = left + (steps[keep] - x_low) / (x_high - x_low) * (right - left)
+        ys = bottom - (np.clip(values[keep], y_low, y_high) - y_low) / (y_high - y_low) * (bottom - top)
+        points = np.stack([xs, ys], axis=1).round().astype(np.int32)
+
+        if len(points) > 0:
+            cv2.polylines(image, [points], False, color, 1, cv2.LINE_AA)
+
+        cv2.putText(image, label, (right - 150, top + 18 + 16 * index), FONT, 0.4, color, 1, cv2.LINE_AA)
+
+    return image
@@ -0,0 +1,186 @@
+import contextlib
+import functools
+import math
+import threading
+import time
+
+# log spaced histogram bins from 100 ns to 100 s
+BINS_PER_DECADE = 20
+MIN_NS = 100
+DECADES = 9
+BINS = BINS_PER_DECADE * DECADES + 2
+
+PERCENTILES = (50, 90, 99)
+
+# shared by every disabled stage, entering and leaving it does nothing
+NULL_TIMER = contextlib.nullcontext()
+
+class Stage:
+    """ Latency histogram of one pipeline stage """
+
+    _name: str = None
+    _counts: list = None
+    _count: int = 0
+    _total: int = 0
+    _min: int = None
+    _max: int = None
+    _lock: threading.Lock = None
+
+    def __init__(self, name: str):
+        self._name = name
+        self._counts = [0] * BINS
+        self._lock = threading.Lock()
+
+    def record(self, ns: int):
+        if ns < MIN_NS:
+            index = 0
+        else:
+            index = min(int(math.log10(ns / MIN_NS) * BINS_PER_DECADE) + 1, BINS - 1)
+
+        # stages timed on several event workers record at once
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._total += ns
+            self._min = ns if self._min is None or ns < self._min else self._min
+            self._max = ns if self._max is None or ns > self._max else self._max
+
+    def percentile(self, p: float) -> float:
+        # geometric center of the bin holding the p-th value, clamped to the exact min and max
+        if self._count == 0:
+            return None
+
+        rank = p / 100. * self._count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank and count > 0:
+                break
+
+        if index == 0:
+            return float(self._min)
+
+        ns = MIN_NS * 10 ** ((index - 0.5) / BINS_PER_DECADE)
+        return min(max(ns, self._min), self._max)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def mean(self):
+        return self._total / self._count if self._count > 0 else None
+
+    @property
+    def min(self):
+        return self._min
+
+    @property
+    def max(self):
+        return self._max
+
+
+class Timer:
+    __slots__ = ('_stage', '_start')
+
+    def __init__(self, stage: Stage):
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self._stage.record(time.perf_counter_ns() - self._start)
+        return False
+
+
+class Profiler:
+    """ Per stage latency of the frame pipeline, shared by every module """
+
+    _instance = None
+    _enabled: bool = False
+    _stages: dict = None
+    _lock: threading.Lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._stages = {}
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    def enable(self, enabled: bool = True):
+        self._enabled = enabled
+
+    def reset(self):
+        self._stages = {}
+
+    def get(self, name: str) -> Stage:
+        stage = self._stages.get(name)
+        if stage is None:
+            with self._lock:
+                stage = self._stages.setdefault(name, Stage(name))
+        return stage
+
+    def stage(self, name: str):
+        """ with Profiler().stage('detect'): ... """
+        if not self._enabled:
+            return NULL_TIMER
+
+        return Timer(self.get(name))
+
+    def timed(self, name: str):
+        """ @Profiler().timed('detect'), checked on every call so it can be enabled after the import """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self._enabled:
+                    return function(*args, **kwargs)
+
+                start = time.perf_counter_ns()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.get(name).record(time.perf_counter_ns() - start)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, ns: int):
+        if self._enabled:
+            self.get(name).record(ns)
+
+    def rows(self, frame: int) -> list:
+        # (metric, frame, value) rows in milliseconds, ready for the metrics table
+        rows = []
+        for stage in list(self._stages.values()):
+            if stage.count == 0:
+                continue
+
+            rows.append((f'Stage {stage.name} count', frame, stage.count))
+            rows.append((f'Stage {stage.name} mean', frame, stage.mean / 1e6))
+            for p in PERCENTILES:
+                rows.append((f'Stage {stage.name} p{p}', frame, stage.percentile(p) / 1e6))
+            rows.append((f'Stage {stage.name} max', frame, stage.max / 1e6))
+
+        return rows
+
+    def summary(self):
+        for stage in sorted(self._stages.values(), key=lambda stage: -stage.count * stage.mean if stage.count > 0 else 0):
+            if stage.count == 0:
+                continue
+
+            percentiles = ' - '.join(f'p{p} {stage.percentile(p) / 1e6:.3f}' for p in PERCENTILES)
+            print(f"{stage.name:<16} {stage.count:>8} calls - total {stage.count * stage.mean / 1e9:.2f} s - mean {stage.mean / 1e6:.3f} - {percentiles} - max {stage.max / 1e6:.3f} ms")
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @property
+    def stages(self):
+        return self._stages
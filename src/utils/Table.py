@@ -0,0 +1,30 @@
+import csv
+import json
+
+def save_table(path: str, rows: list, fields: list):
+    """ Rows as dicts to a .json list or a .csv table with the given columns """
+    if path.endswith('.json'):
+        with open(path, 'w') as file:
+            json.dump(rows, file, indent=2)
+        return
+
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+def format_value(value) -> str:
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.2f}"
+
+    return str(value)
+
+def print_table(rows: list, fields: list):
+    values = [[format_value(row.get(field)) for field in fields] for row in rows]
+    widths = [max([len(field)] + [len(row[index]) for row in values]) for index, field in enumerate(fields)]
+
+    print('  '.join(field.ljust(width) for field, width in zip(fields, widths)))
+    for row in values:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
@@ -1,6 +1,14 @@
 import cv2
+import queue
 import threading
 
+from utils.Profiler import Profiler
+
+# skip farther than this with a seek instead of grabbing frame by frame
+SEEK_THRESHOLD = 100
+
+PROFILER = Profiler()
+
 class Video():
     _path: str = None
     _cap: cv2.VideoCapture = None
@@ -17,30 +25,45 @@ class Video():
             exit()
 
         return self._cap
-    
+
+    def skip(self, frames: int):
+        if frames <= 0:
+            return
+
+        # Seek far away, otherwise grab without decoding
+        if frames > SEEK_THRESHOLD:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, self._cap.get(cv2.CAP_PROP_POS_FRAMES) + frames)
+            return
+
+        for _ in range(frames):
+            if not self._cap.grab():
+                break
+
     def read(self, soft:bool = False, downscale: float = 1., skip: int = 0):
         # Skip frames
-        frame_nro = -1
-        while frame_nro < skip:
-            frame_nro += 1
+        with PROFILER.stage('decode'):
+            self.skip(skip)
             ret, frame = self._cap.read()
-            if not ret and not soft:
+        if not ret:
+            if not soft:
                 print("Error: Unable to read video.")
                 exit()
+            return None
 
         # Downscale frame
         if downscale != 1.:
-            frame = cv2.resize(frame, fx=downscale, fy=downscale, dsize=None, interpolation=cv2.INTER_AREA)
+            with PROFILER.stage('downscale'):
+                frame = cv2.resize(frame, fx=downscale, fy=downscale, dsize=None, interpolation=cv2.INTER_AREA)
 
         return frame
-    
+
     def release(self):
         self._cap.release()
 
     def rewind(self):
         self.release()
         self.open()
-    
+
     @property
     def path(self):
         return self._path
@@ -52,7 +75,90 @@ class Video():
     @property
     def fps(self):
         return float(self._cap.get(cv2.CAP_PROP_FPS))
-    
+
+    @property
+    def frames(self):
+        return int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+
+class VideoPrefetcher():
+    """ Decodes and downscales the next frames on its own thread into a ring of preallocated buffers """
+
+    _video: Video = None
+    _thread: threading.Thread = None
+    _stop: bool = False
+    _downscale: float = 1.
+    _skip: int = 0
+    _buffers: list = None
+    _free: queue.Queue = None
+    _ready: queue.Queue = None
+
+    def __init__(self, video: Video, size: int = 8, downscale: float = 1., skip: int = 0):
+        self._video = video
+        self._downscale = downscale
+        self._skip = skip
+        self._buffers = [None] * size
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+
+        for slot in range(size):
+            self._free.put(slot)
+
+    def __loop__(self):
+        decoded = None
+
+        while not self._stop:
+            slot = self._free.get()
+
+            if slot is None:
+                break
+
+            # decode and downscale into the buffers allocated on the first lap
+            if self._downscale == 1.:
+                with PROFILER.stage('decode'):
+                    self._video.skip(self._skip)
+                    ret, self._buffers[slot] = self._video.cap.read(self._buffers[slot])
+            else:
+                with PROFILER.stage('decode'):
+                    self._video.skip(self._skip)
+                    ret, decoded = self._video.cap.read(decoded)
+                if ret:
+                    with PROFILER.stage('downscale'):
+                        self._buffers[slot] = cv2.resize(decoded, fx=self._downscale, fy=self._downscale, dsize=None, dst=self._buffers[slot], interpolation=cv2.INTER_AREA)
+
+            if not ret:
+                break
+
+            self._ready.put(slot)
+
+        self._ready.put(None)
+
+    def read(self):
+        slot = self._ready.get()
+
+        if slot is None:
+            # keep signaling the end of the video to later reads
+            self._ready.put(None)
+            return None
+
+        # frames outlive the ring (sinks and event queues keep them), so hand out a copy
+        frame = self._buffers[slot].copy()
+        self._free.put(slot)
+
+        return frame
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.__loop__)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop = True
+            self._free.put(None)
+            self._thread.join()
+            self._thread = None
+
 
 class VideoProcessor():
     _thread: threading.Thread = None
@@ -83,3 +189,13 @@ class VideoProcessor():
 
     def stop(self):
         self._stop = True
+
+    def join(self, timeout: float = None) -> bool:
+        # True once the frame in flight is processed and the thread is done
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return False
+            self._thread = None
+
+        return True
@@ -21,5 +21,18 @@ class Config:
         self._config = configparser.ConfigParser()
         self._config.read(file)
 
-    def get(self, option: str, type = str, section: str = GENERAL):
+    def set(self, option: str, value, section: str = GENERAL):
+        # overrides a loaded option, booleans follow the file convention (empty is false)
+        if not self._config.has_section(section):
+            self._config.add_section(section)
+
+        if isinstance(value, bool):
+            value = 'True' if value else ''
+
+        self._config.set(section, option, str(value))
+
+    def get(self, option: str, type = str, section: str = GENERAL, default = None):
+        if default is not None and not self._config.has_option(section, option):
+            return default
+
         return type(self._config.get(section, option))
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# the modules import each other from src, as when src/main.py runs
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from utils.Config import Config
+
+@pytest.fixture
+def config():
+    config = Config()
+    config.load(os.path.join(ROOT, 'config.ini'))
+    return config
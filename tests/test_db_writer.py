@@ -0,0 +1,96 @@
+import sqlite3
+import time
+
+import pytest
+
+from utils.DBWriter import DBWriter
+
+def count(path: str, table: str) -> int:
+    db = sqlite3.connect(path)
+    rows = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    db.close()
+    return rows
+
+def save_tracks(writer: DBWriter, frames):
+    for frame in frames:
+        writer.save_track('a1b2', (10 + frame, 20), (1, 0), 3, frame, None, 0.9, 1000. + frame)
+
+def wait_for(condition: callable, timeout: float = 5.):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'tracking.db')
+
+def test_flushes_when_the_batch_is_full(path):
+    writer = DBWriter(path, batch_size=10, flush_interval=60.)
+    writer.start()
+    save_tracks(writer, range(25))
+
+    assert wait_for(lambda: writer.flushes == 2)
+    assert count(path, 'tracks') == 20
+
+    writer.stop()
+    assert count(path, 'tracks') == 25
+
+def test_flushes_when_the_interval_elapses(path):
+    writer = DBWriter(path, batch_size=1000, flush_interval=0.1)
+    writer.start()
+    save_tracks(writer, range(3))
+
+    assert wait_for(lambda: writer.flushes == 1)
+    assert count(path, 'tracks') == 3
+    writer.stop()
+
+def test_stop_drains_the_queued_rows(path):
+    writer = DBWriter(path, batch_size=1000, flush_interval=60.)
+    writer.start()
+    save_tracks(writer, range(7))
+    writer.save_metrics('FPS', 6, 25.)
+    writer.save_metrics_many([('Trackers', frame, 2) for frame in range(5)])
+    writer.stop()
+
+    assert count(path, 'tracks') == 7
+    assert count(path, 'metrics') == 6
+    assert writer.rows == 13
+
+def test_on_flush_reports_depth_latency_and_step(path):
+    flushes = []
+
+    def on_flush(depth, latency, step):
+        flushes.append((depth, latency, step))
+
+        # rows sent from the callback while stopping are written too
+        if len(flushes) == 1:
+            writer.save_metrics_many([('DB queue depth', step, depth)])
+
+    writer = DBWriter(path, batch_size=5, flush_interval=60., on_flush=on_flush)
+    writer.start()
+    save_tracks(writer, range(5))
+    assert wait_for(lambda: len(flushes) == 1)
+    writer.stop()
+
+    depth, latency, step = flushes[0]
+    assert depth == 0
+    assert latency >= 0
+    assert step == 4
+    assert count(path, 'metrics') == 1
+    assert writer.flushes == len(flushes) == 2
+
+def test_flush_metrics_writes_what_the_metrics_still_hold(path):
+    from mot.Metrics import Metric
+
+    writer = DBWriter(path, batch_size=1000, flush_interval=60.)
+    metric = Metric('FPS', sink=writer.save_metrics_many, flush_every=10)
+    writer.start()
+    for step in range(25):
+        metric.store(25., step)
+
+    # 20 rows reached the writer in blocks, the last 5 are still held by the metric
+    db = writer.flush_metrics([metric], [('Stage detect count', 25, 3)])
+
+    assert count(path, 'metrics') == 26
+    assert len(db.load_tracking_ids()) == 0
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from motpy import Detection
+from mot.DetectionCache import DetectionCache
+from mot.Detections import Detections
+
+def detections(count: int, seed: int) -> Detections:
+    rng = np.random.default_rng(seed)
+    boxes = rng.uniform(0, 600, (count, 2))
+    return Detections(np.hstack([boxes, boxes + 40]).astype(np.float32), rng.uniform(0.3, 1, count).astype(np.float32), rng.integers(0, 3, count).astype(np.int16))
+
+@pytest.fixture
+def files(tmp_path):
+    video, model = tmp_path / 'video.mp4', tmp_path / 'yolo.pt'
+    video.write_bytes(b'frames')
+    model.write_bytes(b'weights')
+    return tmp_path, str(video), str(model)
+
+def test_detections_round_trip(tmp_path):
+    stored = {0: detections(5, 0), 2: detections(0, 1), 4: detections(3, 2)}
+    cache = DetectionCache(str(tmp_path / 'entry'), {'video': 'x'})
+    for step, dets in stored.items():
+        cache.store(step, dets)
+    # detection lists are stored as well
+    cache.store(6, [Detection(box=np.array([1., 2., 3., 4.]), score=0.5, class_id=1)])
+    cache.save(8, fps=25.)
+
+    loaded = DetectionCache(str(tmp_path / 'entry'))
+    assert loaded.load()
+    assert loaded.frames == 8
+    assert loaded.fps == 25.
+    assert loaded.covers(2)
+    assert not loaded.covers(1)
+
+    for step, dets in stored.items():
+        replayed = loaded.detections(step)
+        np.testing.assert_array_equal(replayed.boxes, dets.boxes)
+        np.testing.assert_array_equal(replayed.scores, dets.scores)
+        np.testing.assert_array_equal(replayed.class_ids, dets.class_ids)
+
+    [detection] = loaded.detections(6, compact=False)
+    np.testing.assert_array_equal(detection.box, [1, 2, 3, 4])
+    assert (detection.class_id, detection.score) == (1, 0.5)
+
+def test_undetected_frames_are_misses(tmp_path):
+    cache = DetectionCache(str(tmp_path / 'entry'))
+    assert not cache.load()
+
+    cache.store(0, detections(2, 0))
+    cache.save(3)
+    cache.load()
+
+    assert cache.detected(0)
+    assert not cache.detected(1)
+    assert not cache.detected(3)
+
+    with pytest.raises(KeyError):
+        cache.detections(1)
+    with pytest.raises(KeyError):
+        cache.detections(10)
+
+def test_entries_are_keyed_on_the_source_and_the_settings(files):
+    directory, video, model = files
+    cache = DetectionCache.make(str(directory / 'cache'), video, model, 0.5, 1.)
+    cache.store(0, detections(2, 0))
+    cache.save(1)
+
+    assert DetectionCache.make(str(directory / 'cache'), video, model, 0.5, 1.).load()
+
+    # another threshold, downscale or gate is another entry
+    assert not DetectionCache.make(str(directory / 'cache'), video, model, 0.6, 1.).load()
+    assert not DetectionCache.make(str(directory / 'cache'), video, model, 0.5, 0.5).load()
+    assert not DetectionCache.make(str(directory / 'cache'), video, model, 0.5, 1., gate={'threshold': 2.}).load()
+
+    # so is a video or a model whose content changed
+    with open(model, 'ab') as file:
+        file.write(b'retrained')
+    assert not DetectionCache.make(str(directory / 'cache'), video, model, 0.5, 1.).load()
+
+    with open(model, 'wb') as file:
+        file.write(b'weights')
+    assert DetectionCache.make(str(directory / 'cache'), video, model, 0.5, 1.).load()
+
+    with open(video, 'wb') as file:
+        file.write(b'other frames')
+    assert not DetectionCache.make(str(directory / 'cache'), video, model, 0.5, 1.).load()
@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from utils.EventQueue import EventQueue, BLOCK, DROP_OLDEST, COALESCE
+
+def drain(events: EventQueue) -> list:
+    items = []
+    while events.depth > 0:
+        items.append(events.get())
+    return items
+
+def test_block_raises_when_full_without_waiting():
+    events = EventQueue(2, BLOCK)
+    events.put(1)
+    events.put(2)
+
+    with pytest.raises(queue.Full):
+        events.put(3, block=False)
+
+    start = time.monotonic()
+    with pytest.raises(queue.Full):
+        events.put(3, timeout=0.05)
+    assert time.monotonic() - start >= 0.05
+
+    assert drain(events) == [1, 2]
+
+def test_block_waits_for_a_get():
+    events = EventQueue(1, BLOCK)
+    events.put(1)
+
+    taker = threading.Timer(0.05, events.get)
+    taker.start()
+    events.put(2, timeout=5)
+    taker.join()
+
+    assert drain(events) == [2]
+
+def test_drop_oldest_keeps_the_newest():
+    events = EventQueue(3, DROP_OLDEST)
+    for item in range(10):
+        events.put(item, block=False)
+
+    assert events.dropped == 7
+    assert drain(events) == [7, 8, 9]
+
+def test_coalesce_merges_into_the_waiting_event():
+    events = EventQueue(2, COALESCE, key=lambda item: item[0], merge=lambda old, new: (old[0], old[1] + new[1]))
+    events.put(('a', [1]))
+    events.put(('b', [2]))
+    events.put(('a', [3]), block=False)
+
+    assert events.coalesced == 1
+    assert events.depth == 2
+    # the merged event keeps its place
+    assert drain(events) == [('a', [1, 3]), ('b', [2])]
+
+    events.put(('a', [4]))
+    assert drain(events) == [('a', [4])]
+
+def test_coalesce_keeps_the_newest_without_merge():
+    events = EventQueue(2, COALESCE, key=lambda item: item[0])
+    events.put(('a', 1))
+    events.put(('a', 2))
+
+    assert drain(events) == [('a', 2)]
+
+@pytest.mark.parametrize('policy', [BLOCK, DROP_OLDEST, COALESCE])
+def test_stop_event_always_goes_through(policy):
+    events = EventQueue(1, policy, key=lambda item: item)
+    events.put(1)
+    events.put(None, block=False)
+    events.put(None, block=False)
+
+    assert events.dropped == 0
+    assert drain(events) == [1, None, None]
+
+def test_get_many_takes_up_to_max_items():
+    events = EventQueue(10, BLOCK)
+    for item in range(5):
+        events.put(item)
+
+    assert events.get_many(3) == [0, 1, 2]
+    assert events.get_many(3) == [3, 4]
+
+def test_get_many_waits_and_frees_room():
+    events = EventQueue(2, BLOCK)
+    threading.Timer(0.05, events.put, args=(1,)).start()
+
+    assert events.get_many(5) == [1]
+
+    events.put(2)
+    events.put(3)
+    putter = threading.Thread(target=events.put, args=(4,))
+    putter.start()
+    assert events.get_many(2) == [2, 3]
+    putter.join(timeout=5)
+
+    assert not putter.is_alive()
+    assert drain(events) == [4]
+
+def test_unbounded_coalesce_merges_and_joins():
+    events = EventQueue(0, COALESCE, key=lambda item: item[0], merge=lambda old, new: (old[0], old[1] + new[1]))
+    events.put(('a', [1]))
+    events.put(('a', [2]))
+
+    assert events.coalesced == 1
+    assert events.depth == 1
+
+    def work():
+        events.get()
+        events.task_done()
+
+    worker = threading.Thread(target=work)
+    worker.start()
+    joiner = threading.Thread(target=events.join, daemon=True)
+    joiner.start()
+    joiner.join(timeout=5)
+    worker.join()
+
+    assert not joiner.is_alive()
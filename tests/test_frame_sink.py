@@ -0,0 +1,35 @@
+import numpy as np
+
+from utils.FrameSink import BLOCK, FrameSink
+
+class CountingFrameSink(FrameSink):
+    """ Keeps the steps written by every worker """
+
+    def __init__(self, **kwargs):
+        super(CountingFrameSink, self).__init__(**kwargs)
+        self.steps = []
+
+    def _write(self, frame, step: int):
+        self.steps.append(step)
+
+def test_every_worker_write_is_counted():
+    sink = CountingFrameSink(workers=4, maxsize=8, policy=BLOCK)
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+
+    sink.start()
+    for step in range(20000):
+        sink.write(frame, step)
+    sink.stop()
+
+    assert sorted(sink.steps) == list(range(20000))
+    assert sink.written == 20000
+    assert sink.dropped == 0
+
+def test_null_sink_discards_frames():
+    sink = FrameSink.make('none', '/tmp', 25)
+    sink.start()
+    sink.write(np.zeros((4, 4, 3), dtype=np.uint8), 0)
+    sink.stop()
+
+    assert not sink.enabled
+    assert sink.written == 0
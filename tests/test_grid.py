@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from utils.Grid import Grid
+
+@pytest.fixture
+def grid():
+    grid = Grid(32)
+    grid.divide(np.zeros((64, 80, 3), dtype=np.uint8))
+    return grid
+
+@pytest.mark.parametrize('point, id', [((0, 0), 0), ((31.9, 10), 0), ((32, 10), 1), ((79, 63), 5),
+                                       ((-0.5, 5), None), ((5, -0.5), None), ((80, 10), 2), ((96, 10), None), ((10, 64), None)])
+def test_cell_id_of_half_open_cells(grid, point, id):
+    assert grid.cell_id(point) == id
+
+def test_in_cells_agrees_with_cell_id(grid):
+    points = np.random.default_rng(0).uniform(-40, 120, (500, 2))
+    ids = [grid.cell_id(point) for point in points]
+
+    assert grid.in_cells(points).tolist() == [-1 if id is None else id for id in ids]
@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+import pytest
+
+from mot.Metrics import Heatmap
+from utils.Grid import Grid
+
+def legacy_render(grid: Grid, frame: np.ndarray, values: dict, color) -> np.ndarray:
+    # the per cell addWeighted loop of frame_cell_scores and frame_cell_traffic before the Heatmap
+    block = np.full((grid.cell_size, grid.cell_size, 3), color, np.uint8)
+    frame = frame.copy()
+
+    for x, y, img, id, _ in grid.cells:
+        frame[y:y + grid.cell_size, x:x + grid.cell_size] = cv2.addWeighted(img, 1, block, values.get(id, 0), 0.0)
+
+    return frame
+
+@pytest.fixture
+def points():
+    # tracks rows (cell, score) of a fixed run, some without a positive score
+    rng = np.random.default_rng(0)
+    cells = rng.integers(0, 12 * 16, 3000)
+    scores = np.where(rng.random(3000) < 0.2, 0., rng.uniform(0.2, 1, 3000))
+    return list(zip(cells.tolist(), scores.tolist()))
+
+@pytest.fixture
+def frame():
+    return np.random.default_rng(1).integers(0, 256, (12 * 32, 16 * 32, 3)).astype(np.uint8)
+
+def test_heatmaps_match_the_per_cell_rendering(frame, points):
+    grid = Grid(32)
+    grid.divide(frame)
+    heatmap = Heatmap(grid)
+    for cell, score in points:
+        heatmap.store(cell, score)
+
+    # the GROUP BY queries of the old path: avg of the positive scores, count of every row
+    scores, counts = {}, {}
+    for cell, score in points:
+        counts[cell] = counts.get(cell, 0) + 1
+        if score > 0:
+            scores.setdefault(cell, []).append(score)
+    scores = {cell: np.mean(values) for cell, values in scores.items()}
+    traffic = {cell: count / max(counts.values()) for cell, count in counts.items()}
+
+    np.testing.assert_array_equal(heatmap.frame_scores(frame, (255, 0, 0)), legacy_render(grid, frame, scores, (255, 0, 0)))
+    np.testing.assert_array_equal(heatmap.frame_traffic(frame, (0, 255, 0)), legacy_render(grid, frame, traffic, (0, 255, 0)))
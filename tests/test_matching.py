@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from motpy.tracker import IOUAndFeatureMatchingFunction
+from mot.Detections import Detections
+from mot.Matching import GridMatchingFunction, IOUMatchingFunction
+
+class Boxed:
+    """ Just the box of a tracker """
+
+    def __init__(self, box):
+        self._box = box
+
+    def box(self):
+        return self._box
+
+def crowd(trackers: int, detections: int, seed: int):
+    # people sized boxes, trackers near most detections and a few near duplicate detections
+    rng = np.random.default_rng(seed)
+    boxes = rng.uniform(0, 600, (detections, 2))
+    detected = np.hstack([boxes, boxes + rng.uniform(20, 60, (detections, 2))])
+    detected[-detections // 10:] = detected[:detections // 10] + rng.normal(0, 0.5, (detections // 10, 4))
+
+    followed = detected[rng.choice(detections, trackers, replace=trackers > detections)] + rng.normal(0, 4, (trackers, 4))
+    return [Boxed(box) for box in followed], Detections(detected.astype(np.float32), np.ones(detections, dtype=np.float32), np.zeros(detections, dtype=int))
+
+def match_set(matches) -> set:
+    return {tuple(match) for match in np.asarray(matches).reshape(-1, 2).tolist()}
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('trackers, detections', [(50, 50), (40, 60), (60, 40), (200, 220)])
+def test_grid_matching_finds_the_dense_matches(seed, trackers, detections):
+    trackers, detections = crowd(trackers, detections, seed)
+
+    dense = IOUMatchingFunction(min_iou=0.3)(trackers, detections)
+    grid = GridMatchingFunction(min_iou=0.3, cell_size=40)(trackers, detections)
+
+    assert len(dense) > 0
+    assert match_set(grid) == match_set(dense)
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('trackers, detections', [(50, 50), (40, 60), (200, 220)])
+@pytest.mark.parametrize('multi_match_min_iou', [0.5, 0.8, 0.93])
+def test_grid_matching_finds_the_dense_multi_matches(seed, trackers, detections, multi_match_min_iou):
+    trackers, detections = crowd(trackers, detections, seed)
+
+    # the dense matching is motpy's own, the grid one must find the same multi matches
+    motpy = IOUAndFeatureMatchingFunction(min_iou=0.3, multi_match_min_iou=multi_match_min_iou)(trackers, detections.to_list())
+    dense = IOUMatchingFunction(min_iou=0.3, multi_match_min_iou=multi_match_min_iou)(trackers, detections)
+    grid = GridMatchingFunction(min_iou=0.3, multi_match_min_iou=multi_match_min_iou, cell_size=40)(trackers, detections)
+
+    assert match_set(dense) == match_set(motpy)
+    assert match_set(grid) == match_set(motpy)
+
+def test_grid_greedy_matching_is_one_to_one():
+    trackers, detections = crowd(100, 100, 0)
+    matches = np.asarray(GridMatchingFunction(min_iou=0.3, cell_size=40, assignment='greedy')(trackers, detections))
+
+    assert len(np.unique(matches[:, 0])) == len(matches)
+    assert len(np.unique(matches[:, 1])) == len(matches)
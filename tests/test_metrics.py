@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+import pytest
+
+from mot.Metrics import Metric, Quantile
+from utils.Profiler import Profiler
+
+@pytest.mark.parametrize('p', [0.5, 0.95])
+@pytest.mark.parametrize('stream', ['normal', 'lognormal', 'uniform'])
+def test_quantile_estimates_the_percentile(p, stream):
+    rng = np.random.default_rng(0)
+    values = {'normal': lambda: rng.normal(30, 5, 20000),
+              'lognormal': lambda: rng.lognormal(3, 0.5, 20000),
+              'uniform': lambda: rng.uniform(0, 100, 20000)}[stream]()
+
+    quantile = Quantile(p)
+    for value in values:
+        quantile.add(value)
+
+    # within 2% of the spread of the stream
+    spread = np.percentile(values, 99) - np.percentile(values, 1)
+    assert abs(quantile.value - np.percentile(values, p * 100)) < 0.02 * spread
+
+def test_quantile_of_a_short_stream_is_exact():
+    quantile = Quantile(0.95)
+    assert np.isnan(quantile.value)
+
+    for value in [4., 1., 3.]:
+        quantile.add(value)
+    assert quantile.value == np.percentile([4., 1., 3.], 95)
+
+def test_quantile_follows_a_shifting_stream():
+    rng = np.random.default_rng(1)
+    quantile = Quantile(0.5)
+
+    for value in rng.normal(10, 1, 5000):
+        quantile.add(value)
+    for value in rng.normal(50, 1, 50000):
+        quantile.add(value)
+
+    assert abs(quantile.value - 50) < 1
+
+def test_metric_and_stages_store_from_several_workers():
+    rows = []
+    metric = Metric('Trackers', maxlen=64, sink=rows.extend, flush_every=100)
+    profiler = Profiler()
+    profiler.reset()
+
+    def work(worker):
+        for step in range(5000):
+            metric.store(worker, step)
+            profiler.get('tracker event').record(1000)
+
+    workers = [threading.Thread(target=work, args=(worker,)) for worker in range(4)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    metric.flush()
+
+    assert len(rows) == 20000
+    assert metric.mean == 1.5
+    assert profiler.get('tracker event').count == 20000
+    profiler.reset()
+
+def test_legacy_plot_draws_the_stored_points_only(monkeypatch):
+    from matplotlib import pyplot
+    import benchmark
+
+    metric = Metric('FPS')
+    for step, value in enumerate(np.random.default_rng(0).normal(30, 5, 10000)):
+        metric.store(value, step)
+
+    plotted = []
+    plot = pyplot.plot
+    monkeypatch.setattr(pyplot, 'plot', lambda steps, values, **kwargs: plotted.append((len(steps), len(values))) or plot(steps, values, **kwargs))
+    benchmark.legacy_plot(metric)
+
+    assert plotted[0] == (10000, 10000)
+    assert plotted[1] == (10000 - 29, 10000 - 29)
@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+import migrate
+from benchmark import legacy_tracks
+from utils.DB import DB, SCHEMA_VERSION
+
+def tables(path: str) -> dict:
+    db = sqlite3.connect(path)
+    c = db.cursor()
+    names = [row[0] for row in c.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]
+    counts = {name: c.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in names}
+    counts['version'] = c.execute("PRAGMA user_version").fetchone()[0]
+    db.close()
+    return counts
+
+@pytest.fixture
+def legacy(tmp_path):
+    path = str(tmp_path / 'tracking.db')
+    legacy_tracks(path, 40, 500)
+    return path
+
+def test_migrate_converts_every_track(legacy):
+    before = tables(legacy)
+    migrate.migrate(legacy, 1e9)
+    after = tables(legacy)
+
+    assert after['version'] == SCHEMA_VERSION
+    assert after['tracks'] == before['tracks']
+    assert after['trackers'] == 40
+    assert 'tracks_v1' not in after
+
+    points = DB(legacy).load_tracking_points(1)
+    assert len(points) > 0
+
+def test_interrupted_migrate_leaves_the_legacy_database(legacy, monkeypatch):
+    before = tables(legacy)
+    legacy_row = migrate.legacy_row
+    copied = []
+
+    def crash(*row):
+        copied.append(row)
+        if len(copied) > migrate.CHUNK_SIZE // 2:
+            raise KeyboardInterrupt
+        return legacy_row(*row)
+
+    monkeypatch.setattr(migrate, 'CHUNK_SIZE', 1000)
+    monkeypatch.setattr(migrate, 'legacy_row', crash)
+    with pytest.raises(KeyboardInterrupt):
+        migrate.migrate(legacy, 1e9)
+
+    assert tables(legacy) == before
+
+    # a rerun migrates it all
+    monkeypatch.setattr(migrate, 'legacy_row', legacy_row)
+    migrate.migrate(legacy, 1e9)
+    assert tables(legacy)['tracks'] == before['tracks']
+
+def test_migrate_resumes_from_a_leftover_source(legacy):
+    # a partial copy next to the renamed source, as an older migrate left it on a crash
+    db = sqlite3.connect(legacy)
+    db.execute("ALTER TABLE tracks RENAME TO tracks_v1")
+    db.execute("CREATE TABLE tracks (tracker INTEGER, x INTEGER)")
+    db.execute("INSERT INTO tracks VALUES (1, 2)")
+    db.execute("PRAGMA user_version=2")
+    db.commit()
+    db.close()
+    rows = tables(legacy)['tracks_v1']
+
+    migrate.migrate(legacy, 1e9)
+    after = tables(legacy)
+
+    assert after['version'] == SCHEMA_VERSION
+    assert after['tracks'] == rows
+    assert 'tracks_v1' not in after
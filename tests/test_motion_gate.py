@@ -0,0 +1,89 @@
+import numpy as np
+
+from mot.Detections import Detections
+from mot.Detector import MotionGate
+from utils.Grid import Grid
+from utils.Motion import Motion
+
+HEIGHT, WIDTH = 240, 320
+
+class RecordingDetector:
+    """ Records the frames sent to the detector, one detection in the corner of each crop """
+
+    compact = True
+
+    def __init__(self):
+        self.calls = []
+
+    def detect(self, frame):
+        self.calls.append(('full', frame.shape[:2]))
+        return Detections()
+
+    def detect_batch(self, frames: list):
+        self.calls.append(('crops', [frame.shape[:2] for frame in frames]))
+        return [Detections(np.array([[1., 1., 11., 11.]], dtype=np.float32), np.ones(1, dtype=np.float32), np.zeros(1, dtype=int)) for _ in frames]
+
+def frame(square: tuple = None) -> np.ndarray:
+    image = np.full((HEIGHT, WIDTH, 3), 60, dtype=np.uint8)
+    if square is not None:
+        x, y = square
+        image[y:y + 40, x:x + 40] = 255
+    return image
+
+def gate(refresh: int = 0, max_area: float = 0.5):
+    grid = Grid(32)
+    grid.divide(frame())
+    motion = Motion(grid)
+    detector = RecordingDetector()
+
+    return MotionGate(detector, motion, threshold=4., margin=1, max_area=max_area, refresh=refresh), motion, detector
+
+def test_static_frames_skip_detection():
+    motion_gate, motion, detector = gate()
+
+    for _ in range(6):
+        motion.update(frame((100, 100)))
+        assert len(motion_gate.detect(frame((100, 100)))) == 0
+
+    assert detector.calls == []
+    assert motion_gate.counts == {'skipped': 6, 'cropped': 0, 'full': 0}
+
+def test_moving_frames_detect_around_the_motion():
+    motion_gate, motion, detector = gate()
+    motion.update(frame((100, 100)))
+
+    image = frame((140, 100))
+    motion.update(image)
+    detections = motion_gate.detect(image)
+
+    # one crop around the cells the square left and entered, its detection back in frame coordinates
+    [(kind, crops)] = detector.calls
+    assert kind == 'crops' and len(crops) == 1
+    assert motion_gate.counts == {'skipped': 0, 'cropped': 1, 'full': 0}
+    assert 0 < motion_gate.area <= 0.5
+
+    x1, y1 = detections.boxes[0, :2] - 1
+    assert x1 <= 100 and y1 <= 100
+    assert x1 % 32 == 0 and y1 % 32 == 0
+
+def test_wide_motion_detects_the_whole_frame():
+    motion_gate, motion, detector = gate(max_area=0.1)
+    motion.update(frame())
+
+    image = frame()
+    image[:, :WIDTH // 2] = 255
+    motion.update(image)
+    motion_gate.detect(image)
+
+    assert detector.calls == [('full', (HEIGHT, WIDTH))]
+    assert motion_gate.area == 1.
+
+def test_refresh_detects_the_whole_frame_on_static_frames():
+    motion_gate, motion, detector = gate(refresh=3)
+
+    for _ in range(7):
+        motion.update(frame((100, 100)))
+        motion_gate.detect(frame((100, 100)))
+
+    assert detector.calls == [('full', (HEIGHT, WIDTH))] * 3
+    assert motion_gate.counts == {'skipped': 4, 'cropped': 0, 'full': 3}
@@ -0,0 +1,106 @@
+import numpy as np
+
+from motpy.core import Detection
+from mot.Engines import ParticleEngine, slot_runs
+from mot.Trackers import FastParticleTracker, ParticleTracker
+
+MODEL_SPEC = {'dt': 1 / 25, 'particles': 500}
+
+def make_engine(seed: int, capacity: int = 4) -> ParticleEngine:
+    engine = ParticleEngine(MODEL_SPEC, capacity)
+    engine._rng = np.random.default_rng(seed)
+    return engine
+
+def box(step: int, start=(100., 50.), velocity=(3., 2.)) -> np.ndarray:
+    x, y = start[0] + velocity[0] * step, start[1] + velocity[1] * step
+    return np.array([x, y, x + 30, y + 60])
+
+def test_particles_start_around_the_box():
+    engine = make_engine(0)
+    slot = engine.allocate(box(0))
+    particles = engine.particles[slot]
+
+    # unit gaussian around (x, y, 0, 0), as ParticleTracker._create_gaussian_particles
+    np.testing.assert_allclose(particles.mean(axis=0), [115, 80, 0, 0], atol=4 / np.sqrt(len(particles)))
+    np.testing.assert_allclose(particles.std(axis=0), 1, atol=0.1)
+    np.testing.assert_allclose(engine.weights[slot], 1 / len(particles))
+
+def test_fast_particle_tracker_follows_the_reference():
+    np.random.seed(0)
+    engine = make_engine(0)
+    reference = ParticleTracker(MODEL_SPEC, box0=box(0))
+    tracker = FastParticleTracker(MODEL_SPEC, box0=box(0), engine=engine)
+
+    for step in range(1, 40):
+        reference.predict()
+        tracker.predict()
+        np.testing.assert_allclose(tracker.center, reference._center, atol=0.05)
+
+        reference.update(Detection(box(step)))
+        tracker.update(Detection(box(step)))
+        np.testing.assert_allclose(tracker.center, reference._center, atol=0.05)
+        np.testing.assert_allclose(engine.weights[tracker.slot].sum(), 1)
+        assert abs(tracker.error()[1] - reference.error()[1]) < 0.05
+
+def test_trackers_of_an_engine_are_independent():
+    # the same box followed alone or next to others ends up at the same place
+    alone = make_engine(1)
+    crowd = make_engine(1)
+    single = alone.allocate(box(0, start=(340., 50.), velocity=(3., -3.)))
+    slots = [crowd.allocate(box(0, start=(100. + 80 * i, 50.), velocity=(i, -i))) for i in range(6)]
+
+    for step in range(1, 30):
+        alone.predict([single])
+        crowd.predict(slots)
+        alone.update([single], [box(step, start=(340., 50.), velocity=(3., -3.))])
+        crowd.update(slots, [box(step, start=(100. + 80 * i, 50.), velocity=(i, -i)) for i in range(6)])
+
+        np.testing.assert_allclose(crowd.centers[slots], [box(step, (100. + 80 * i, 50.), (i, -i))[:2] + (15, 30) for i in range(6)], atol=0.05)
+        np.testing.assert_allclose(crowd.centers[slots[3]], alone.centers[single], atol=0.05)
+
+def test_systematic_resampling_keeps_each_particle_in_proportion():
+    engine = make_engine(2, capacity=1)
+    slot = engine.allocate(box(0))
+    n = MODEL_SPEC['particles']
+
+    # skewed weights force a resampling, the particle ids travel in the x velocity
+    weights = np.random.default_rng(3).exponential(size=n) ** 4
+    engine.weights[slot] = weights / weights.sum()
+    engine.particles[slot, :, 2] = np.arange(n)
+    engine.particles[slot, :, 3] = 0
+    error = (box(0)[:2] + (15, 30) - engine.centers[slot]).astype(int)
+
+    engine.update([slot], [box(0)])
+
+    ids = np.rint(engine.particles[slot, :, 2] - error[0] / MODEL_SPEC['dt']).astype(int)
+    counts = np.bincount(ids, minlength=n)
+    expected = weights / weights.sum() * n
+
+    np.testing.assert_allclose(engine.weights[slot], 1 / n)
+    assert np.all(counts >= np.floor(expected)) and np.all(counts <= np.ceil(expected))
+    assert counts.sum() == n
+
+def test_slot_runs_cover_the_slots_with_views():
+    slots = np.array([7, 2, 3, 9, 1, 8])
+    runs = list(slot_runs(slots))
+
+    assert [(run.start, run.stop) for run, _ in runs] == [(1, 4), (7, 10)]
+    assert [slots[rows].tolist() for _, rows in runs] == [[1, 2, 3], [7, 8, 9]]
+
+def test_scattered_slots_update_only_themselves():
+    engine = make_engine(0, capacity=8)
+    slots = [engine.allocate(box(0, start=(100. * slot, 50.))) for slot in range(8)]
+    engine.release(slots[2])
+    engine.release(slots[5])
+    still = engine.particles[[2, 5]].copy()
+    particles = engine.particles
+
+    active = [6, 0, 3, 1, 7, 4]
+    for step in range(1, 10):
+        engine.predict(active)
+        engine.update(active, [box(step, start=(100. * slot, 50.)) for slot in active])
+
+    assert engine.particles is particles
+    np.testing.assert_array_equal(engine.particles[[2, 5]], still)
+    for slot in active:
+        np.testing.assert_allclose(engine.centers[slot], box(9, start=(100. * slot, 50.)).reshape(2, 2).mean(axis=0), atol=2)
@@ -0,0 +1,27 @@
+import numpy as np
+
+from mot.Roi import Roi
+from utils.Grid import Grid
+
+def make_roi() -> Roi:
+    grid = Grid(32)
+    grid.divide(np.zeros((128, 128, 3), dtype=np.uint8))
+    return Roi(grid)
+
+def test_overlapping_selections_keep_each_cell_once():
+    roi = make_roi()
+    roi.select((0, 0), (40, 40))
+    roi.select((0, 0), (40, 40))
+    roi.select((30, 30), (70, 70))
+
+    ids = [cell[3] for cell in roi.selected_cells]
+    assert len(ids) == len(set(ids))
+    assert sorted(ids) == np.flatnonzero(roi.mask).tolist()
+
+def test_selected_cell_ids_are_kept_once():
+    roi = make_roi()
+    roi.select((0, 0), (20, 20))
+    roi.select_cells([0, 5, 5, 6, 99])
+
+    assert [cell[3] for cell in roi.selected_cells] == [0, 5, 6]
+    assert roi.in_cells(np.array([[10, 10], [40, 40], [100, 100]])).tolist() == [0, 5, -1]
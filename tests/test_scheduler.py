@@ -0,0 +1,60 @@
+from mot.Scheduler import BUDGET, BUSY, CALM, FIXED, IDLE, DetectionScheduler
+
+def run(scheduler: DetectionScheduler, motions: list, tracks: int = 3, error: float = 5., latency: float = 10.) -> list:
+    # the frame loop of main.py: detection when due, a decision after it, the signals of every frame
+    detected = []
+    for step, motion in enumerate(motions):
+        if scheduler.due(step):
+            detected.append(step)
+            scheduler.decide(step, (0., error, 2 * error), tracks)
+
+        scheduler.observe(latency, 0, motion)
+
+    return detected
+
+def test_fixed_interval_keeps_the_detection_rate():
+    scheduler = DetectionScheduler(3)
+
+    assert run(scheduler, [10.] * 12) == [0, 3, 6, 9]
+    assert scheduler.decisions == {FIXED: 4}
+
+def test_calm_scene_spreads_detections_up_to_max_interval():
+    scheduler = DetectionScheduler(2, adaptive=True, min_interval=1, max_interval=4)
+
+    assert run(scheduler, [0.] * 20) == [0, 3, 7, 11, 15, 19]
+    assert scheduler.interval == 4
+    assert scheduler.decisions == {CALM: 6}
+
+def test_moving_scene_detects_down_to_min_interval():
+    scheduler = DetectionScheduler(4, adaptive=True, min_interval=2, max_interval=6, motion_threshold=4.)
+
+    # nothing is observed before the first detection, the motion halves the interval from the second one
+    assert run(scheduler, [10.] * 12) == [0, 5, 7, 9, 11]
+    assert scheduler.interval == 2
+    assert scheduler.decisions == {CALM: 1, BUSY: 4}
+
+def test_motion_brings_the_next_detection_forward():
+    scheduler = DetectionScheduler(1, adaptive=True, min_interval=1, max_interval=5, motion_threshold=4.)
+    motions = [0.] * 30
+    motions[17] = 8.
+
+    # calm up to the interval of 5, the motion at 17 halves it for the detection at 20
+    assert run(scheduler, motions) == [0, 2, 5, 9, 14, 19, 21, 24, 28]
+
+def test_empty_scene_jumps_to_max_interval():
+    scheduler = DetectionScheduler(1, adaptive=True, min_interval=1, max_interval=8)
+
+    assert run(scheduler, [0.] * 20, tracks=0) == [0, 8, 16]
+    assert scheduler.decisions == {IDLE: 3}
+
+def test_tracking_error_keeps_detections_frequent():
+    scheduler = DetectionScheduler(4, adaptive=True, min_interval=1, max_interval=8, error_threshold=20.)
+
+    assert run(scheduler, [0.] * 8, error=30.) == [0, 2, 3, 4, 5, 6, 7]
+
+def test_latency_over_budget_spreads_detections_whatever_the_scene():
+    scheduler = DetectionScheduler(1, adaptive=True, min_interval=1, max_interval=3, latency_budget=20.)
+
+    assert run(scheduler, [10.] * 12, latency=40.) == [0, 2, 5, 8, 11]
+    assert scheduler.interval == 3
+    assert scheduler.decisions[BUDGET] == 4
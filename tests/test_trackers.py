@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from harness import synthetic
+from motpy.core import Detection
+from mot.Engines import KalmanEngine, UnscentedEngine
+from mot.MultiObjectTracker import MultiObjectTracker
+from mot.Trackers import BatchedKalmanTracker, FastUnscentedKalmanTracker, KalmanTracker, UnscentedKalmanTracker
+
+MODEL_SPEC = {'dt': 1 / 25, 'order_pos': 1, 'dim_pos': 2, 'order_size': 0, 'dim_size': 2, 'q_var_pos': 5000., 'r_var_pos': 0.1}
+
+def walk(steps: int, objects: int, seed: int = 0):
+    # person sized boxes moving at constant velocity with noisy detections
+    rng = np.random.default_rng(seed)
+    starts = rng.uniform(0, 500, (objects, 2))
+    velocities = rng.normal(0, 3, (objects, 2))
+
+    for step in range(steps):
+        positions = starts + velocities * step + rng.normal(0, 1, (objects, 2))
+        yield np.hstack([positions, positions + (30, 60)])
+
+@pytest.mark.parametrize('reference, batched, engine', [
+    (KalmanTracker, BatchedKalmanTracker, KalmanEngine),
+    (UnscentedKalmanTracker, FastUnscentedKalmanTracker, UnscentedEngine),
+])
+def test_engine_trackers_follow_their_reference(reference, batched, engine):
+    boxes = list(walk(50, 8))
+
+    # every batched tracker in one shared engine, the references on their own
+    shared = engine(MODEL_SPEC, capacity=2)
+    references = [reference(model_kwargs=MODEL_SPEC, box0=box) for box in boxes[0]]
+    trackers = [batched(model_kwargs=MODEL_SPEC, box0=box, engine=shared) for box in boxes[0]]
+
+    for step, detections in enumerate(boxes[1:]):
+        for tracker in references + trackers:
+            tracker.predict()
+
+        np.testing.assert_array_equal([t.box() for t in references], [t.box() for t in trackers])
+
+        # detections every other step, as with detection_rate 2
+        if step % 2 == 0:
+            for tracker, box in zip(references + trackers, list(detections) * 2):
+                tracker.update(Detection(box))
+
+            np.testing.assert_array_equal([t.box() for t in references], [t.box() for t in trackers])
+            np.testing.assert_allclose([t.error() for t in references], [t.error() for t in trackers], atol=1e-9)
+
+@pytest.mark.parametrize('reference, batched', [
+    ('KALMAN', 'KALMAN_BATCHED'),
+    ('UNSCENTED', 'UNSCENTED_FAST'),
+    ('UNSCENTED', 'UNSCENTED_BATCHED'),
+])
+def test_presets_track_the_same_boxes(config, reference, batched):
+    scenario = synthetic(20, 200, seed=1)
+    trackers = [MultiObjectTracker.make(reference, scenario['fps']), MultiObjectTracker.make(batched, scenario['fps'])]
+
+    for step, detections in enumerate(scenario['detections']):
+        due = detections if step % 2 == 0 else []
+        boxes = [sorted(tuple(track.box) for track in tracker.step(due)[0]) for tracker in trackers]
+
+        assert len(boxes[0]) == len(boxes[1])
+        np.testing.assert_array_equal(np.reshape(boxes[0], (-1, 4)), np.reshape(boxes[1], (-1, 4)))
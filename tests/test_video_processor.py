@@ -0,0 +1,44 @@
+import threading
+import time
+
+from utils.Video import VideoProcessor
+
+def test_join_waits_for_the_frame_in_flight():
+    processed = []
+    reading = threading.Event()
+
+    def read_frame():
+        reading.set()
+        time.sleep(0.1)
+        return 'frame'
+
+    processor = VideoProcessor(read_frame, lambda frame, step: processed.append(step))
+    processor.start()
+    reading.wait()
+    processor.stop()
+
+    assert processor.join(5)
+    done = len(processed)
+
+    # nothing is processed once joined
+    time.sleep(0.2)
+    assert len(processed) == done
+
+def test_join_times_out_on_a_blocked_frame():
+    release = threading.Event()
+    processor = VideoProcessor(lambda: 'frame', lambda frame, step: release.wait())
+    processor.start()
+    processor.stop()
+
+    assert not processor.join(0.05)
+    release.set()
+    assert processor.join(5)
+
+def test_join_of_an_ended_video():
+    frames = iter(['a', 'b'])
+    processed = []
+    processor = VideoProcessor(lambda: next(frames, None), lambda frame, step: processed.append(frame))
+    processor.start()
+
+    assert processor.join(5)
+    assert processed == ['a', 'b', None]